@@ -0,0 +1,26 @@
+"""Add token usage to messages
+
+Revision ID: 3c1e9a4f6b2d
+Revises: 7790b2352a7a
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1e9a4f6b2d'
+down_revision: Union[str, None] = '7790b2352a7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('messages', sa.Column('usage', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('messages', 'usage')
@@ -0,0 +1,35 @@
+"""Add token usage ledger for per-user and per-tenant budgets
+
+Revision ID: 8f2d5b7c1a94
+Revises: 3c1e9a4f6b2d
+Create Date: 2026-10-17 11:40:03.527311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2d5b7c1a94'
+down_revision: Union[str, None] = '3c1e9a4f6b2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('token_usage',
+    sa.Column('scope', sa.String(length=20), nullable=False),
+    sa.Column('subject_id', sa.String(length=255), nullable=False),
+    sa.Column('period', sa.String(length=10), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('input_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('output_tokens', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('scope', 'subject_id', 'period', 'period_start')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('token_usage')
@@ -0,0 +1,89 @@
+"""Move message thinking steps to their own table
+
+Revision ID: b4e7a2c9d3f1
+Revises: 8f2d5b7c1a94
+Create Date: 2026-10-17 15:21:48.904117
+
+Thinking steps are often larger than the message itself and history pages
+do not show them, so they move to ``message_thinking`` (one row per
+message that has any) and are only read when asked for.
+
+The backfill copies existing rows in batches of ``BATCH_SIZE`` messages
+(keyset on ``messages.id``), each batch committed on its own, so no long
+transaction holds locks or bloats the WAL while it runs. An interrupted
+backfill is resumed by running the upgrade again.
+
+``messages.thinking_steps`` is left in place (and no longer written) so
+pods still running the previous release keep working during the rollout;
+d5f8a1c3e7b9 copies whatever they wrote in the meantime and drops it, and
+is applied once every pod runs this release.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e7a2c9d3f1'
+down_revision: Union[str, None] = '8f2d5b7c1a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Messages without steps (NULL, JSON null or []) get no row
+COPY_STEPS = """
+    INSERT INTO message_thinking (message_id, steps)
+    SELECT id, thinking_steps FROM {source}
+    WHERE CASE WHEN json_typeof(thinking_steps) = 'array'
+               THEN json_array_length(thinking_steps) > 0 END
+    ON CONFLICT (message_id) DO NOTHING
+"""
+
+BACKFILL_BATCH = sa.text(f"""
+    WITH batch AS (
+        SELECT id, thinking_steps FROM messages
+        WHERE id > :last_id
+        ORDER BY id
+        LIMIT :batch_size
+    ), copied AS ({COPY_STEPS.format(source='batch')})
+    SELECT max(id) FROM batch
+""")
+
+
+def upgrade() -> None:
+    # The table is committed before the backfill starts; a rerun after an
+    # interrupted backfill finds it already there
+    if op.get_context().as_sql or not sa.inspect(op.get_bind()).has_table('message_thinking'):
+        op.create_table('message_thinking',
+        sa.Column('message_id', sa.String(length=255), nullable=False),
+        sa.Column('steps', sa.JSON(), nullable=False),
+        sa.ForeignKeyConstraint(['message_id'], ['messages.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('message_id')
+        )
+
+    if op.get_context().as_sql:
+        # Offline (--sql) mode cannot loop on results: one statement
+        op.execute(COPY_STEPS.format(source='messages'))
+        return
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        last_id = ''
+        while True:
+            last_id = connection.execute(
+                BACKFILL_BATCH, {"last_id": last_id, "batch_size": BATCH_SIZE}
+            ).scalar()
+            if last_id is None:
+                break
+
+
+def downgrade() -> None:
+    op.execute("""
+        UPDATE messages SET thinking_steps = message_thinking.steps
+        FROM message_thinking
+        WHERE message_thinking.message_id = messages.id
+    """)
+    op.drop_table('message_thinking')
@@ -0,0 +1,72 @@
+"""Drop messages.thinking_steps
+
+Revision ID: d5f8a1c3e7b9
+Revises: b4e7a2c9d3f1
+Create Date: 2026-10-17 18:04:27.531962
+
+Run only after every pod runs the release that reads ``message_thinking``.
+Pods on the previous release kept writing ``messages.thinking_steps``
+after the b4e7a2c9d3f1 backfill, so those leftover rows are copied over
+first (same batched, resumable copy; rows already copied are skipped)
+and the column is dropped afterwards.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f8a1c3e7b9'
+down_revision: Union[str, None] = 'b4e7a2c9d3f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+# Messages without steps (NULL, JSON null or []) get no row
+COPY_STEPS = """
+    INSERT INTO message_thinking (message_id, steps)
+    SELECT id, thinking_steps FROM {source}
+    WHERE CASE WHEN json_typeof(thinking_steps) = 'array'
+               THEN json_array_length(thinking_steps) > 0 END
+    ON CONFLICT (message_id) DO NOTHING
+"""
+
+COPY_BATCH = sa.text(f"""
+    WITH batch AS (
+        SELECT id, thinking_steps FROM messages
+        WHERE id > :last_id
+        ORDER BY id
+        LIMIT :batch_size
+    ), copied AS ({COPY_STEPS.format(source='batch')})
+    SELECT max(id) FROM batch
+""")
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql:
+        # Offline (--sql) mode cannot loop on results: one statement
+        op.execute(COPY_STEPS.format(source='messages'))
+    else:
+        with op.get_context().autocommit_block():
+            connection = op.get_bind()
+            last_id = ''
+            while True:
+                last_id = connection.execute(
+                    COPY_BATCH, {"last_id": last_id, "batch_size": BATCH_SIZE}
+                ).scalar()
+                if last_id is None:
+                    break
+
+    op.drop_column('messages', 'thinking_steps')
+
+
+def downgrade() -> None:
+    op.add_column('messages', sa.Column('thinking_steps', sa.JSON(), nullable=True))
+    op.execute("""
+        UPDATE messages SET thinking_steps = message_thinking.steps
+        FROM message_thinking
+        WHERE message_thinking.message_id = messages.id
+    """)
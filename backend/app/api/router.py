@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import chat, health, rag, agents
+from app.api.v1.endpoints import chat, health, rag, agents, usage
 
 # Create API v1 router
 api_router = APIRouter()
@@ -28,3 +28,9 @@ api_router.include_router(
     prefix="/agents",
     tags=["Agents"]
 )
+
+api_router.include_router(
+    usage.router,
+    prefix="/usage",
+    tags=["Usage"]
+)
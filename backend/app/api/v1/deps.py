@@ -13,6 +13,7 @@ async def get_current_user() -> dict:
     """
     return {
         "user_id": "default-user",
+        "tenant_id": "default-tenant",
         "username": "demo_user",
         "email": "demo@example.com"
     }
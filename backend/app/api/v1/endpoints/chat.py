@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, status, BackgroundTasks
-from fastapi.responses import StreamingResponse
-from typing import AsyncGenerator
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, BackgroundTasks
+from fastapi.responses import Response, StreamingResponse
+from typing import AsyncGenerator, AsyncIterator, Optional, Set, Tuple
 import asyncio
+import json
 import uuid
+from datetime import datetime
+from contextlib import aclosing
 from app.models.schemas import (
     ChatRequest,
     ChatResponse,
@@ -11,9 +14,19 @@ from app.models.schemas import (
     MessageRole,
     ThinkingStep
 )
+from app.api.v1.deps import get_current_user
 from app.graphs.chat_graph import chat_graph
 from app.repositories.factory import get_repository
+from app.services.history_cache import HistoryPage, etag_matches, history_cache
+from app.services.message_writer import message_writer
+from app.services.replay_cache import ReplayEntry, replay_cache, replay_cache_key
+from app.services.stream_registry import stream_registry
+from app.services.token_budget import TokenBudgetExceeded, token_budget
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.utils.helpers import decode_cursor, encode_cursor
+from app.utils.metrics import abandoned_stream_tokens, abandoned_streams, estimate_tokens
+from app.utils.streaming import ThinkingStepCollector, coalesce_chunks, encode_sse
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -21,54 +34,170 @@ router = APIRouter()
 repository = get_repository()
 
 
-async def _save_conversation(
+# Fire-and-forget tasks, referenced until they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def _ensure_conversation(session_id: str, user: dict) -> bool:
+    """Create the conversation row if needed; False if that failed."""
+    try:
+        await repository.ensure_conversation(
+            user_id=user["user_id"],
+            session_id=session_id,
+            title="New Conversation"
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Could not create conversation {session_id}: {e}")
+        return False
+
+
+def _save_conversation(
+    conversation_ready: "asyncio.Task[bool]",
     session_id: str,
+    user: dict,
     user_content: str,
     assistant_content: str,
-    thinking_steps: list | None = None
+    thinking_steps: list | None = None,
+    usage: dict | None = None
 ) -> None:
-    """Save conversation messages to database in background."""
-    try:
-        await repository.save_message(
+    """
+    Queue the turn's messages for the next batched database write.
+    
+    The conversation row is created while the model streams
+    (``conversation_ready``); the messages are queued once it exists.
+    A failed create is retried once here before the turn is dropped.
+    Does not await, so it can be called while a stream is being cancelled.
+    """
+    def enqueue() -> None:
+        message_writer.enqueue(
             conversation_id=session_id,
             role="user",
-            content=user_content
+            content=user_content,
+            user_id=user["user_id"]
         )
-        await repository.save_message(
+        message_writer.enqueue(
             conversation_id=session_id,
             role="assistant",
             content=assistant_content,
-            thinking_steps=thinking_steps
+            thinking_steps=thinking_steps,
+            usage=usage,
+            user_id=user["user_id"]
+        )
+    
+    if conversation_ready.done() and not conversation_ready.cancelled() and conversation_ready.result():
+        enqueue()
+        return
+    
+    async def reconcile() -> None:
+        if not await conversation_ready and not await _ensure_conversation(session_id, user):
+            logger.error(f"Conversation {session_id} could not be created; turn not saved")
+            return
+        enqueue()
+    
+    _spawn(reconcile())
+
+
+def _record_abandoned_stream(
+    conversation_ready: "asyncio.Task[bool]",
+    session_id: str,
+    user: dict,
+    user_content: str,
+    content_parts: list,
+    thinking_steps: list,
+    show_thinking: bool
+) -> None:
+    """
+    Account for a stream the client disconnected from before ``done``.
+    
+    Runs while the generator is being cancelled, so it must not await:
+    the partial answer (if enabled) is queued for the message writer.
+    """
+    partial_content = "".join(content_parts)
+    generated = partial_content + "".join(step["reasoning"] for step in thinking_steps)
+    tokens = estimate_tokens(generated)
+    
+    abandoned_streams.add(1)
+    abandoned_stream_tokens.add(tokens)
+    # No usage event arrives for a cancelled stream: charge the estimate
+    token_budget.charge(user["user_id"], user.get("tenant_id"), 0, tokens)
+    logger.info(
+        f"Client disconnected from chat stream {session_id}; "
+        f"cancelled upstream after ~{tokens} output tokens"
+    )
+    
+    if settings.sse_save_partial_on_disconnect and (partial_content or thinking_steps):
+        _save_conversation(
+            conversation_ready,
+            session_id=session_id,
+            user=user,
+            user_content=user_content,
+            assistant_content=partial_content,
+            thinking_steps=thinking_steps if show_thinking else None
         )
-        logger.info(f"Saved conversation to database: {session_id}")
-    except Exception as e:
-        logger.error(f"Error saving to database: {e}", exc_info=True)
 
 
 async def chat_stream_generator(
-    request: ChatRequest
-) -> AsyncGenerator[str, None]:
+    request: ChatRequest,
+    user: Optional[dict] = None
+) -> AsyncGenerator[bytes, None]:
     """
     Generate Server-Sent Events (SSE) stream for chat with thinking.
     
     Args:
         request: Chat request
+        user: Authenticated user (token usage is charged to their budget)
     
     Yields:
-        SSE formatted strings with thinking and content chunks
+        SSE frames (bytes) with thinking and content chunks
     """
+    # Generate session ID if not provided
+    session_id = request.session_id or str(uuid.uuid4())
+    user = user or {"user_id": "default-user"}
+    
+    # Ensure the conversation exists concurrently with the model call:
+    # only saving the messages depends on it
+    conversation_ready = _spawn(_ensure_conversation(session_id, user))
+    
+    # Collect thinking steps and content for storage
+    thinking = ThinkingStepCollector()
+    content_parts = []
+    usage = None
+    completed = False
+    
     try:
-        # Generate session ID if not provided
-        session_id = request.session_id or str(uuid.uuid4())
-        
         logger.info(f"Starting chat stream for session: {session_id}")
         
-        # Ensure conversation exists (idempotent - won't fail if exists)
-        await repository.create_conversation(
-            user_id="default-user",  # TODO: Replace with actual user_id from auth
-            session_id=session_id,
-            title="New Conversation"
-        )
+        # Replay an identical earlier request without calling Azure OpenAI
+        cache_key = replay_cache_key(request) if settings.replay_cache_enabled else None
+        if cache_key is not None:
+            cached = await replay_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Replaying cached stream for session: {session_id}")
+                done_chunk = StreamChunk(
+                    type="done",
+                    content="",
+                    metadata={**cached.done_metadata, "session_id": session_id, "cached": True}
+                )
+                completed = True  # nothing upstream to cancel
+                yield b"".join(cached.frames) + encode_sse(done_chunk)
+                
+                _save_conversation(
+                    conversation_ready,
+                    session_id=session_id,
+                    user=user,
+                    user_content=request.messages[-1].content,
+                    assistant_content=cached.assistant_content,
+                    thinking_steps=cached.thinking_steps
+                )
+                return
         
         # Convert ChatMessage to dict format for OpenAI
         messages = [
@@ -76,33 +205,59 @@ async def chat_stream_generator(
             for msg in request.messages
         ]
         
-        # Collect thinking steps and content for storage
-        thinking_steps_list = []
-        content_parts = []
+        frames = []
+        failed = False
         
-        # Stream response with thinking (+ optional MCP tool calling)
-        async for chunk in chat_graph.stream_chat(
-            messages=messages,
-            show_thinking=request.show_thinking,
-            reasoning_effort=request.reasoning_effort.value,
-            verbosity=request.verbosity.value,
-            max_tokens=request.max_tokens or 16000,
-            mcp_servers=request.mcp_servers or [],
-            model_id=request.model.value,
-            enable_web_search=request.enable_web_search,
-            conversation_id=session_id,
-        ):
-            # Format as SSE — single-pass JSON serialization
-            yield f"data: {chunk.model_dump_json()}\n\n"
-            
-            # Collect data for storage
-            if chunk.type == "thinking":
-                thinking_steps_list.append({
-                    "step_number": chunk.metadata.get("step_number", 0) if chunk.metadata else 0,
-                    "reasoning": chunk.content
-                })
-            elif chunk.type == "content":
-                content_parts.append(chunk.content)
+        # Stream response with thinking (+ optional MCP tool calling),
+        # coalescing token deltas into fewer SSE frames
+        async with aclosing(coalesce_chunks(
+            chat_graph.stream_chat(
+                messages=messages,
+                show_thinking=request.show_thinking,
+                reasoning_effort=request.reasoning_effort.value,
+                verbosity=request.verbosity.value,
+                max_tokens=request.max_tokens or 16000,
+                mcp_servers=request.mcp_servers or [],
+                model_id=request.model.value,
+                enable_web_search=request.enable_web_search,
+                conversation_id=session_id,
+            ),
+            max_bytes=settings.sse_coalesce_max_bytes,
+            window_ms=settings.sse_coalesce_window_ms,
+        )) as chunks:
+            async for chunk in chunks:
+                # Upstream done carries the model's token usage; the
+                # client gets it on this endpoint's own done event
+                if chunk.type == "done":
+                    usage = (chunk.metadata or {}).get("usage")
+                    if usage:
+                        token_budget.charge(
+                            user["user_id"],
+                            user.get("tenant_id"),
+                            usage.get("input_tokens", 0),
+                            usage.get("output_tokens", 0)
+                        )
+                    continue
+                
+                # Format as SSE — fast-path encoder, no pydantic serialization
+                frame = encode_sse(chunk)
+                
+                if cache_key is not None and chunk.type != "queued":
+                    frames.append(frame)
+                if chunk.type == "error":
+                    failed = True
+                
+                # Collect data for storage
+                if chunk.type == "thinking":
+                    thinking.add(chunk)
+                elif chunk.type == "content":
+                    content_parts.append(chunk.content)
+                
+                # Collected first so a disconnect at this yield keeps the chunk
+                yield frame
+        
+        completed = True
+        thinking_steps_list = thinking.finish()
         
         # Send final done event BEFORE database writes so client gets response faster
         done_chunk = StreamChunk(
@@ -111,18 +266,53 @@ async def chat_stream_generator(
             metadata={
                 "session_id": session_id,
                 "total_thinking_steps": len(thinking_steps_list),
-                "content_length": len("".join(content_parts))
+                "content_length": len("".join(content_parts)),
+                "usage": usage
             }
         )
-        yield f"data: {done_chunk.model_dump_json()}\n\n"
+        yield encode_sse(done_chunk)
         
-        # Save conversation to database in background (non-blocking)
-        asyncio.create_task(_save_conversation(
+        assistant_content = "".join(content_parts)
+        thinking_steps = thinking_steps_list if request.show_thinking else None
+        
+        # Save conversation to database (write-behind, batched across requests)
+        _save_conversation(
+            conversation_ready,
             session_id=session_id,
+            user=user,
             user_content=request.messages[-1].content,
-            assistant_content="".join(content_parts),
-            thinking_steps=thinking_steps_list if request.show_thinking else None
-        ))
+            assistant_content=assistant_content,
+            thinking_steps=thinking_steps,
+            usage=usage
+        )
+        
+        if cache_key is not None and not failed:
+            # A replay consumes no model tokens, so usage is not cached
+            done_metadata = {
+                k: v for k, v in done_chunk.metadata.items() if k not in ("session_id", "usage")
+            }
+            await replay_cache.put(cache_key, ReplayEntry(
+                frames=frames,
+                done_metadata=done_metadata,
+                assistant_content=assistant_content,
+                thinking_steps=thinking_steps
+            ))
+    
+    except (asyncio.CancelledError, GeneratorExit):
+        # Client disconnected: Starlette cancels this generator, and closing
+        # the coalescer closes chat_graph.stream_chat, which closes the
+        # Azure OpenAI stream and cancels any in-flight tool calls
+        if not completed:
+            _record_abandoned_stream(
+                conversation_ready,
+                session_id=session_id,
+                user=user,
+                user_content=request.messages[-1].content,
+                content_parts=content_parts,
+                thinking_steps=thinking.finish(),
+                show_thinking=request.show_thinking
+            )
+        raise
     
     except Exception as e:
         logger.error(f"Error in chat stream: {e}", exc_info=True)
@@ -132,11 +322,69 @@ async def chat_stream_generator(
             content=str(e),
             metadata={"error_type": type(e).__name__}
         )
-        yield f"data: {error_chunk.model_dump_json()}\n\n"
+        yield encode_sse(error_chunk)
+
+
+async def _check_token_budget(user: dict) -> None:
+    """Reject with 429 a caller whose token budget is used up."""
+    try:
+        await token_budget.check(user["user_id"], user.get("tenant_id"))
+    except TokenBudgetExceeded as exc:
+        logger.warning(f"Token budget exceeded for user {user['user_id']}: {exc}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after_seconds)}
+        )
+
+
+async def resumable_chat_stream(
+    request: ChatRequest,
+    last_event_id: Optional[str],
+    user: dict
+) -> AsyncIterator[bytes]:
+    """
+    Attach to a resumable chat stream.
+    
+    A request carrying the ``Last-Event-ID`` of a stream that is still
+    buffered for this session re-attaches to it; anything else starts a new
+    detached generation (replacing a previous one for the session), which
+    is subject to the caller's token budget like any new completion.
+    
+    Args:
+        request: Chat request (session_id must be set)
+        last_event_id: Value of the ``Last-Event-ID`` header, if any
+        user: Authenticated user
+    
+    Returns:
+        Reader over the session's id-tagged SSE frames
+    
+    Raises:
+        HTTPException: 429 if a new generation would exceed the token budget
+    """
+    if last_event_id:
+        resumed = stream_registry.resume(request.session_id, last_event_id)
+        if resumed is not None:
+            session, seq = resumed
+            logger.info(f"Resuming chat stream for session {request.session_id} after event {seq}")
+            return session.subscribe(after_seq=seq)
+        logger.info(
+            f"Stream for session {request.session_id} is no longer buffered; "
+            f"starting a new completion"
+        )
+    
+    # Only a reconnect to a stream already under way is not charged again
+    await _check_token_budget(user)
+    session = stream_registry.start(request.session_id, chat_stream_generator(request, user))
+    return session.subscribe()
 
 
 @router.post("/completions", response_class=StreamingResponse)
-async def stream_chat_completion(request: ChatRequest):
+async def stream_chat_completion(
+    request: ChatRequest,
+    last_event_id: Optional[str] = Header(default=None),
+    user: dict = Depends(get_current_user)
+):
     """
     Stream chat completion with GPT-5.2 thinking process.
     
@@ -156,8 +404,18 @@ async def stream_chat_completion(request: ChatRequest):
     data: {"type": "done", "content": "", "metadata": {"session_id": "..."}}
     ```
     
+    **Resuming** (`SSE_RESUME_ENABLED=true`): every frame carries an `id:`.
+    After a dropped connection, repeat the request with the same `session_id`
+    (returned in the `X-Session-ID` header) and a `Last-Event-ID` header to
+    receive the missed frames and then the live tail.
+    
+    **Token budgets** (`TOKEN_BUDGET_ENABLED=true`): a caller whose user or
+    tenant budget is used up gets 429 with `Retry-After` until the period resets.
+    
     Args:
         request: Chat request with messages and options
+        last_event_id: Last SSE event id received, when reconnecting
+        user: Authenticated user
     
     Returns:
         StreamingResponse: SSE stream with thinking and content
@@ -168,13 +426,24 @@ async def stream_chat_completion(request: ChatRequest):
             detail="This endpoint only supports streaming. Set stream=true"
         )
     
+    # Fix the session id up front so a reconnect can find this stream
+    if not request.session_id:
+        request = request.model_copy(update={"session_id": str(uuid.uuid4())})
+    
+    if settings.sse_resume_enabled:
+        body = await resumable_chat_stream(request, last_event_id, user)
+    else:
+        await _check_token_budget(user)
+        body = chat_stream_generator(request, user)
+    
     return StreamingResponse(
-        chat_stream_generator(request),
+        body,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
+            "X-Accel-Buffering": "no",  # Disable nginx buffering
+            "X-Session-ID": request.session_id
         }
     )
 
@@ -227,20 +496,114 @@ async def create_chat_completion(request: ChatRequest):
         )
 
 
+def _page_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, str]]:
+    """Keyset ``(timestamp, id)`` from a page cursor (400 if malformed)."""
+    if cursor is None:
+        return None
+    try:
+        timestamp, item_id = decode_cursor(cursor, 2)
+        return datetime.fromisoformat(timestamp), item_id
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _next_cursor(items: list, limit: int, time_key: str) -> Optional[str]:
+    """Trim the look-ahead row; cursor for the next page, or None on the last page."""
+    if len(items) <= limit:
+        return None
+    del items[limit:]
+    return encode_cursor(items[-1][time_key], items[-1]["id"])
+
+
+def _not_supported(exc: NotImplementedError) -> HTTPException:
+    """501 for reads the configured repository backend cannot serve."""
+    return HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(exc))
+
+
+@router.get("/conversations")
+async def list_conversations(
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    List the current user's conversations, most recently updated first.
+    
+    Args:
+        limit: Page size
+        cursor: ``next_cursor`` of the previous page
+    
+    Returns:
+        Conversations and the cursor of the next page (None on the last page)
+    """
+    before = _page_cursor(cursor)
+    try:
+        conversations = await repository.get_user_conversations(
+            user["user_id"], limit=limit + 1, before=before
+        )
+        next_cursor = _next_cursor(conversations, limit, "updatedAt")
+        return {"conversations": conversations, "next_cursor": next_cursor}
+    
+    except NotImplementedError as e:
+        raise _not_supported(e)
+    
+    except Exception as e:
+        logger.error(f"Error listing conversations: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.get("/history/{session_id}")
-async def get_chat_history(session_id: str):
+async def get_chat_history(
+    session_id: str,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    include_thinking: bool = False,
+    if_none_match: Optional[str] = Header(default=None)
+):
     """
-    Get chat history for a session.
+    Get chat history for a session, newest messages first.
+    
+    Pages are served from the history cache as pre-serialized JSON with an
+    ``ETag``; a request whose ``If-None-Match`` still matches gets 304.
+    Thinking steps are left out unless ``include_thinking`` is set; a
+    single message with its steps is served by ``get_chat_message``.
     
     Args:
         session_id: Session ID
+        limit: Page size
+        cursor: ``next_cursor`` of the previous page (older messages)
+        include_thinking: Include each message's ``thinkingSteps``
+        if_none_match: ETag of the copy the client already has
     
     Returns:
-        List of messages with thinking steps
+        List of messages and the cursor of the next page
     """
+    before = _page_cursor(cursor)
+    
+    async def load() -> bytes:
+        # Messages arrive as a ready JSON array (built by PostgreSQL)
+        messages, last_key = await repository.get_conversation_messages_json(
+            session_id, limit=limit, before=before, include_thinking=include_thinking
+        )
+        next_cursor = encode_cursor(*last_key) if last_key else None
+        return b"".join((
+            b'{"session_id":', json.dumps(session_id).encode("utf-8"),
+            b',"messages":', messages,
+            b',"next_cursor":', json.dumps(next_cursor).encode("utf-8"),
+            b"}"
+        ))
+    
     try:
-        messages = await repository.get_conversation_messages(session_id)
-        return {"session_id": session_id, "messages": messages}
+        if settings.history_cache_enabled:
+            page = await history_cache.get_or_load(session_id, f"{limit}:{int(include_thinking)}:{cursor or ''}", load)
+        else:
+            page = HistoryPage.from_body(await load())
+    
+    except NotImplementedError as e:
+        raise _not_supported(e)
     
     except Exception as e:
         logger.error(f"Error getting chat history: {e}", exc_info=True)
@@ -248,6 +611,45 @@ async def get_chat_history(session_id: str):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    
+    # Revalidate on every use; unchanged history costs a 304 with no body
+    headers = {"ETag": page.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=page.body, media_type="application/json", headers=headers)
+
+
+@router.get("/history/{session_id}/messages/{message_id}")
+async def get_chat_message(session_id: str, message_id: str):
+    """
+    Get one message of a session, with its thinking steps.
+    
+    Args:
+        session_id: Session ID
+        message_id: Message ID
+    
+    Returns:
+        The message
+    """
+    try:
+        message = await repository.get_message(session_id, message_id)
+    
+    except NotImplementedError as e:
+        raise _not_supported(e)
+    
+    except Exception as e:
+        logger.error(f"Error getting chat message: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+    
+    if message is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Message {message_id} not found"
+        )
+    return message
 
 
 @router.delete("/{session_id}")
@@ -264,6 +666,7 @@ async def delete_conversation(session_id: str):
     try:
         # Delete conversation using repository
         await repository.delete_conversation(session_id)
+        await history_cache.invalidate(session_id)
         logger.info(f"Deleting conversation: {session_id}")
         return {"message": f"Conversation {session_id} deleted"}
     
@@ -1,9 +1,9 @@
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from app.models.schemas import RAGQueryRequest, RAGQueryResponse
+from app.models.schemas import IndexBatchRequest, RAGQueryRequest, RAGQueryResponse
 from app.graphs.rag_graph import rag_graph
 from app.core.logging import get_logger
-import json
+from app.utils.streaming import encode_sse
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -29,7 +29,7 @@ async def stream_rag_query(request: RAGQueryRequest):
             query=request.query,
             show_thinking=request.show_thinking
         ):
-            yield f"data: {json.dumps(chunk.model_dump())}\n\n"
+            yield encode_sse(chunk)
     
     return StreamingResponse(
         generate(),
@@ -67,3 +67,26 @@ async def index_document(
     )
     
     return {"success": success, "doc_id": doc_id}
+
+
+@router.post("/index/batch")
+async def index_documents(request: IndexBatchRequest):
+    """
+    Index many documents for RAG search in one call.
+    
+    Contents are embedded with batched embedding requests rather than one
+    request per document.
+    
+    Args:
+        request: Documents to index
+    
+    Returns:
+        Success status per document
+    """
+    from app.services.search_service import search_service
+    
+    results = await search_service.index_documents(
+        [doc.model_dump() for doc in request.documents]
+    )
+    
+    return {"success": all(results.values()), "results": results}
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from app.api.v1.deps import get_current_user
+from app.models.schemas import TokenBudget, TokenBudgetResponse
+from app.services.token_budget import token_budget
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+router = APIRouter()
+
+
+@router.get("/budget", response_model=TokenBudgetResponse)
+async def get_token_budget(user: dict = Depends(get_current_user)):
+    """
+    Remaining token budget for the current user and their tenant.
+    
+    Each configured budget (user/tenant, daily/monthly) is listed with its
+    input and output limits, the tokens used so far this period and when
+    the period resets. Usage written by other pods may lag by up to
+    ``TOKEN_BUDGET_FLUSH_INTERVAL_SECONDS``.
+    
+    Returns:
+        TokenBudgetResponse: Budgets that apply to the caller
+    """
+    budgets = await token_budget.remaining(user["user_id"], user.get("tenant_id"))
+    return TokenBudgetResponse(
+        enabled=token_budget.enabled,
+        budgets=[TokenBudget(**budget) for budget in budgets]
+    )
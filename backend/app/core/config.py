@@ -58,6 +58,57 @@ class Settings(BaseSettings):
     # GPT-5-mini deployment (lighter/faster model)
     azure_openai_mini_deployment_name: str = "gpt-5-mini"
     azure_openai_mini_model: str = "gpt-5-mini"
+    # Deployment pool: JSON list of {"model", "endpoint", "deployment", "region",
+    # "weight", "priority", "api_key"?} for weighted, 429-aware routing and
+    # spillover across deployments/regions. Empty = the single endpoint above.
+    azure_openai_backends: str = ""
+    azure_openai_backend_cooldown_seconds: float = 5.0  # Base backoff after a failed call (doubles per failure)
+    # Chain tool rounds with previous_response_id (store=true) instead of
+    # re-sending the whole transcript on every round
+    responses_chain_tool_rounds: bool = False
+
+    # Tool calling (MCP function calls requested by the model)
+    tool_call_max_concurrency: int = 4  # Max tool calls executed in parallel per round
+    tool_call_timeout_seconds: float = 30.0  # Per-tool execution timeout
+    tool_call_eager_dispatch: bool = False  # Start tool calls while the model is still streaming
+
+    # Admission control: per-pod cap on concurrent model calls, with a
+    # bounded priority queue (chat > rag > agents) in front of it
+    admission_max_in_flight: int = 32  # Per logical model
+    admission_model_limits: str = ""  # JSON overrides, e.g. {"gpt-5-mini": 64}
+    admission_max_queue: int = 128  # Waiting calls per model before rejecting
+    admission_queue_timeout_seconds: float = 30.0  # Give up waiting after this long
+    
+    # Semantic response cache (opt-in; skipped for MCP tools and web search)
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.95  # Minimum cosine similarity for a hit
+    semantic_cache_max_entries: int = 1000
+    semantic_cache_ttl_seconds: float = 3600.0
+    
+    # Exact-match SSE replay cache for /chat/completions (opt-in)
+    replay_cache_enabled: bool = False
+    replay_cache_max_bytes: int = 64 * 1024 * 1024  # In-memory tier size bound
+    replay_cache_ttl_seconds: float = 3600.0
+    replay_cache_dir: Optional[str] = None  # Optional on-disk tier
+    
+    # Embedding cache keyed by content hash (float32 vectors)
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 4096  # In-memory LRU size (~6 KB per 1536-d vector)
+    embedding_cache_dir: Optional[str] = None  # Optional memory-mapped, append-only disk tier
+    # Embedding batching: request packing for bulk calls, and coalescing of
+    # concurrent single-query calls into one request
+    embedding_batch_max_inputs: int = 2048  # Max inputs per embeddings request
+    embedding_batch_max_tokens: int = 200000  # Max (estimated) tokens per embeddings request
+    embedding_coalesce_window_ms: float = 5.0  # Wait for concurrent queries; 0 disables coalescing
+    embedding_coalesce_max_batch: int = 64  # Dispatch a coalesced batch at this size
+    
+    # SSE streaming: coalesce token deltas into fewer frames
+    sse_coalesce_window_ms: float = 20.0  # Max time a delta waits; 0 disables coalescing
+    sse_coalesce_max_bytes: int = 1024  # Flush a merged frame at this size
+    sse_save_partial_on_disconnect: bool = False  # Persist the partial answer of an abandoned stream
+    sse_resume_enabled: bool = False  # Resumable streams: id-tagged frames + Last-Event-ID replay
+    sse_resume_buffer_frames: int = 2048  # Recent frames kept per session for replay
+    sse_resume_grace_seconds: float = 30.0  # Keep generating this long after the client drops
     
     # Azure AI Search
     azure_search_endpoint: Optional[str] = None
@@ -84,6 +135,28 @@ class Settings(BaseSettings):
             f"/{self.postgresql_database}?sslmode={self.postgresql_ssl_mode}"
         )
     
+    # Connection pool per worker process. Also the size of the thread pool
+    # that runs database calls off the event loop (one connection per thread).
+    # Keep db_pool_size x uvicorn workers x replicas below max_connections.
+    db_pool_size: int = 10
+    db_max_overflow: int = 0  # Extra connections beyond db_pool_size (unused by the thread pool)
+    
+    # Write-behind persistence of chat messages (multi-row inserts)
+    message_write_batch_size: int = 200  # Flush once this many messages are queued
+    message_write_flush_interval_ms: float = 100.0  # Max time a message waits in the queue
+    message_write_max_pending: int = 10000  # Queue bound while the database is unavailable
+    
+    # Conversation ids known to exist; repeat turns skip the database before streaming
+    conversation_cache_max_entries: int = 10000
+    
+    # Serialized chat history pages (ETag / 304), invalidated on writes
+    history_cache_enabled: bool = True
+    history_cache_max_bytes: int = 32 * 1024 * 1024  # In-process tier size bound
+    history_cache_local_ttl_seconds: float = 10.0  # Bounds staleness from other pods' writes
+    history_cache_backend: str = "memory"  # memory (per pod) or redis (shared across pods)
+    history_cache_redis_url: Optional[str] = None
+    history_cache_ttl_seconds: float = 300.0  # Lifetime of pages in the shared backend
+    
     # Database Selection (PostgreSQL only)
     database_type: str = "postgresql"
     
@@ -134,9 +207,29 @@ class Settings(BaseSettings):
     gpt_thinking_effort: str = "high"  # low, medium, high
     gpt_include_reasoning: bool = True
     
-    # Rate Limiting
+    # Rate Limiting (token bucket per client and route group: chat, rag, agents)
+    rate_limit_enabled: bool = True
     rate_limit_per_minute: int = 60
     rate_limit_burst: int = 100
+    rate_limit_backend: str = "memory"  # memory (per pod) or redis (shared across pods)
+    rate_limit_redis_url: Optional[str] = None  # e.g. rediss://:key@name.redis.cache.windows.net:6380/0
+    rate_limit_trusted_proxies: str = ""  # Comma-separated IPs/CIDRs (e.g. the ingress) whose X-Forwarded-For is used
+    
+    # Token budgets per user and tenant, in tokens per UTC day / calendar month
+    # (0 = unlimited). Usage is aggregated in memory and flushed to the
+    # PostgreSQL token_usage ledger in batches.
+    token_budget_enabled: bool = False
+    token_budget_user_daily_input: int = 0
+    token_budget_user_daily_output: int = 0
+    token_budget_user_monthly_input: int = 0
+    token_budget_user_monthly_output: int = 0
+    token_budget_tenant_daily_input: int = 0
+    token_budget_tenant_daily_output: int = 0
+    token_budget_tenant_monthly_input: int = 0
+    token_budget_tenant_monthly_output: int = 0
+    token_budget_flush_interval_seconds: float = 5.0  # Ledger write interval
+    token_budget_flush_max_pending: int = 500  # Flush early once this many ledger rows are dirty
+    token_budget_refresh_seconds: float = 30.0  # Re-read totals (other pods' usage) after this long
 
 
 # Global settings instance
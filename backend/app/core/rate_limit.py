@@ -0,0 +1,252 @@
+"""
+Inbound rate limiting.
+
+Token-bucket limiter applied as ASGI middleware to the model-backed route
+groups (POSTs to chat completions, rag, agents); reads such as history and
+conversation listing are not limited. Each client gets one bucket per
+group holding up to ``rate_limit_burst`` tokens, refilled at
+``rate_limit_per_minute``; every request takes one token. Clients are
+identified by the ``sub`` of a valid bearer token, then by IP address;
+``X-Forwarded-For`` is only read when the connection comes from one of
+``rate_limit_trusted_proxies``.
+Unvalidated credentials (such as a raw ``X-API-Key``) are never used: a
+caller could pick a fresh one per request and get a fresh bucket.
+
+Bucket state lives in a pluggable backend: ``InMemoryRateLimitBackend``
+limits per pod, ``RedisRateLimitBackend`` shares buckets across pods via
+any Redis-compatible store (Redis, Azure Cache for Redis, Valkey).
+"""
+
+import ipaddress
+import json
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, Union
+
+from jose import JWTError, jwt
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Rate-limited route groups: (method, path prefix) -> group
+ROUTE_GROUPS: Dict[Tuple[str, str], str] = {
+    ("POST", "/api/v1/chat/completions"): "chat",
+    ("POST", "/api/v1/rag"): "rag",
+    ("POST", "/api/v1/agents"): "agents",
+}
+
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets."""
+
+    @abstractmethod
+    async def acquire(self, key: str, rate_per_second: float, capacity: int) -> Tuple[bool, float]:
+        """
+        Take one token from the bucket ``key``.
+
+        Returns:
+            (allowed, retry_after_seconds); retry_after is 0 when allowed
+        """
+
+    async def close(self) -> None:
+        """Release connections held by the backend."""
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets, LRU-bounded so idle clients don't accumulate."""
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, rate_per_second: float, capacity: int) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(capacity), now))
+        tokens = min(float(capacity), tokens + (now - updated) * rate_per_second)
+
+        if tokens >= 1.0:
+            allowed, retry_after = True, 0.0
+            tokens -= 1.0
+        else:
+            allowed, retry_after = False, (1.0 - tokens) / rate_per_second
+
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+# Atomic token bucket: KEYS[1] = bucket, ARGV = rate/s, capacity, now (s)
+_REDIS_TOKEN_BUCKET = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+  allowed = 1
+  tokens = tokens - 1
+else
+  retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Buckets shared by all pods through a Redis-compatible store.
+
+    Each check is one atomic Lua script call. If the store is unreachable
+    the request is allowed (fail open) rather than taking the API down.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:") -> None:
+        # Imported lazily: only needed when the shared backend is configured
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def acquire(self, key: str, rate_per_second: float, capacity: int) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._script(
+                keys=[self.prefix + key],
+                args=[rate_per_second, capacity, time.time()],
+            )
+        except Exception as exc:
+            logger.warning(f"Rate limit store unavailable, allowing request: {exc}")
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def build_rate_limit_backend() -> RateLimitBackend:
+    """Create the backend selected by ``RATE_LIMIT_BACKEND``."""
+    if settings.rate_limit_backend == "redis":
+        if not settings.rate_limit_redis_url:
+            raise ValueError("RATE_LIMIT_REDIS_URL is required when RATE_LIMIT_BACKEND=redis")
+        return RedisRateLimitBackend(settings.rate_limit_redis_url)
+    return InMemoryRateLimitBackend()
+
+
+def _route_group(method: str, path: str) -> Optional[str]:
+    for (group_method, prefix), group in ROUTE_GROUPS.items():
+        if method == group_method and (path == prefix or path.startswith(prefix + "/")):
+            return group
+    return None
+
+
+@lru_cache(maxsize=8)
+def _parse_networks(value: str) -> Tuple[Union[ipaddress.IPv4Network, ipaddress.IPv6Network], ...]:
+    return tuple(
+        ipaddress.ip_network(item.strip(), strict=False)
+        for item in value.split(",") if item.strip()
+    )
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _parse_networks(settings.rate_limit_trusted_proxies))
+
+
+def client_identity(scope: Scope) -> str:
+    """Identify the caller: verified bearer-token subject, then IP."""
+    headers = {name: value for name, value in scope.get("headers", [])}
+
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+        try:
+            payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
+            subject = payload.get("sub") or payload.get("user_id")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            pass
+
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+
+    # Anyone can send X-Forwarded-For; only a trusted proxy's is believed.
+    # The client is the last hop not appended by a trusted proxy.
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded and _is_trusted_proxy(peer):
+        hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not _is_trusted_proxy(hop):
+                return f"ip:{hop}"
+        if hops:
+            return f"ip:{hops[0]}"
+    return f"ip:{peer}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing per-client token buckets per route group."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: Optional[RateLimitBackend] = None,
+        per_minute: Optional[int] = None,
+        burst: Optional[int] = None,
+    ) -> None:
+        self.app = app
+        self.backend = backend or build_rate_limit_backend()
+        self.per_minute = per_minute or settings.rate_limit_per_minute
+        self.burst = burst or settings.rate_limit_burst
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        group = _route_group(scope["method"], scope["path"])
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        identity = client_identity(scope)
+        allowed, retry_after = await self.backend.acquire(
+            f"{group}:{identity}", self.per_minute / 60.0, self.burst
+        )
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        retry_seconds = max(1, math.ceil(retry_after))
+        logger.warning(f"Rate limit exceeded for {identity} on {group} (retry in {retry_seconds}s)")
+        body = json.dumps({
+            "error": "Too Many Requests",
+            "message": f"Rate limit exceeded for {group} endpoints",
+            "retry_after": retry_seconds,
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", str(retry_seconds).encode("ascii")),
+                (b"x-ratelimit-limit", str(self.per_minute).encode("ascii")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
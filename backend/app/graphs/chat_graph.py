@@ -1,8 +1,11 @@
+import asyncio
 from typing import TypedDict, List, Dict, Any, AsyncGenerator, Optional
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from app.core.config import settings
 from app.core.logging import get_logger
 from app.services.openai_service import openai_service
+from app.services.semantic_cache import semantic_cache, semantic_cache_key
 from app.models.schemas import ThinkingStep, StreamChunk, StreamChunkType, MCPServerConfig
 from app.utils.tracing import trace_graph_execution, trace_tool_call
 
@@ -124,7 +127,33 @@ class ChatGraph:
             verbosity=verbosity,
             web_search=enable_web_search,
             mcp_servers_count=len(mcp_servers) if mcp_servers else 0,
-        ):
+        ) as graph_span:
+            # Semantic cache lookup (tool-free requests only)
+            cache_partition = None
+            cache_vector = None
+            if settings.semantic_cache_enabled and not mcp_servers and not enable_web_search:
+                cache_partition, query_text = semantic_cache_key(
+                    messages,
+                    model_id=model_id,
+                    reasoning_effort=reasoning_effort,
+                    verbosity=verbosity,
+                    show_thinking=show_thinking,
+                    max_tokens=max_tokens,
+                )
+                try:
+                    cache_vector = await semantic_cache.embed(query_text)
+                except Exception as exc:
+                    logger.warning(f"Semantic cache embedding failed, bypassing cache: {exc}")
+
+                if cache_vector is not None:
+                    cached_chunks = semantic_cache.lookup(cache_partition, cache_vector)
+                    if graph_span and graph_span.is_recording():
+                        graph_span.set_attribute("graph.semantic_cache", "hit" if cached_chunks else "miss")
+                    if cached_chunks is not None:
+                        for chunk in cached_chunks:
+                            yield chunk
+                        return
+
             tools = None
             tool_executor = None
 
@@ -134,8 +163,7 @@ class ChatGraph:
 
                 mcp = MCPService(mcp_servers)
                 try:
-                    await mcp.initialize_all()
-                    tools = await mcp.get_openai_tools()
+                    tools = await mcp.discover_tools()
                     tool_executor = mcp.execute_tool_call
                     logger.info(f"MCP tools available: {[t['name'] for t in tools]}")
                 except Exception as exc:
@@ -161,6 +189,9 @@ class ChatGraph:
                     tools = [web_search_tool] + tools
                 logger.info("Web search (web_search_preview) enabled for this request")
 
+            response_chunks: List[StreamChunk] = []
+            failed = False
+
             try:
                 # Use OpenAI service to stream with thinking (+ optional tools)
                 async for chunk in openai_service.stream_chat_with_thinking(
@@ -173,10 +204,19 @@ class ChatGraph:
                     tool_executor=tool_executor,
                     model_id=model_id,
                 ):
+                    if cache_vector is not None and chunk.type not in (StreamChunkType.QUEUED, StreamChunkType.DONE):
+                        if chunk.type == StreamChunkType.ERROR:
+                            failed = True
+                        response_chunks.append(chunk)
                     yield chunk
             finally:
                 if mcp is not None:
-                    await mcp.close_all()
+                    # Shielded: also runs when the client disconnected mid-stream
+                    await asyncio.shield(mcp.close_all())
+
+            # Only complete, error-free responses are cached
+            if cache_vector is not None and not failed and response_chunks:
+                semantic_cache.store(cache_partition, cache_vector, response_chunks)
     
     async def invoke(self, messages: List[BaseMessage]) -> Dict[str, Any]:
         """
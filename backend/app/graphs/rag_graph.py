@@ -3,6 +3,7 @@ from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage
 from app.core.logging import get_logger
 from app.services.search_service import search_service
+from app.services.admission import Priority
 from app.services.openai_service import openai_service
 from app.models.schemas import StreamChunk, StreamChunkType
 
@@ -91,7 +92,7 @@ class RAGGraph:
         ]
         
         # Generate response (non-streaming for workflow)
-        result = await openai_service.create_completion(messages=messages)
+        result = await openai_service.create_completion(messages=messages, priority=Priority.RAG)
         state["response"] = result["content"]
         
         return state
@@ -163,7 +164,8 @@ class RAGGraph:
         # Stream the actual GPT-5.2 response with thinking
         async for chunk in openai_service.stream_chat_with_thinking(
             messages=messages,
-            show_thinking=show_thinking
+            show_thinking=show_thinking,
+            priority=Priority.RAG
         ):
             yield chunk
 
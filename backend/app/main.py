@@ -7,6 +7,7 @@ import uuid
 from app.core.config import settings
 from app.core.logging import get_logger, setup_logging
 from app.api.router import api_router
+from app.services.admission import AdmissionRejected
 
 # Setup logging
 setup_logging()
@@ -27,6 +28,9 @@ async def lifespan(app: FastAPI):
         from app.services.openai_service import openai_service
         from app.repositories.factory import get_repository
         repository = get_repository()
+        
+        from app.services.token_budget import token_budget
+        token_budget.start()
         logger.info("✅ Services initialized successfully")
     except Exception as e:
         logger.error(f"❌ Error initializing services: {e}")
@@ -35,6 +39,28 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info(f"Shutting down {settings.app_name}")
+    
+    # Cancel detached (resumable) chat generations
+    from app.services.stream_registry import stream_registry
+    await stream_registry.close()
+    
+    # Write chat messages still queued for persistence
+    from app.services.message_writer import message_writer
+    await message_writer.close()
+    
+    # Write token usage still aggregated in memory
+    from app.services.token_budget import token_budget
+    await token_budget.close()
+    
+    if settings.rate_limit_enabled:
+        await rate_limit_backend.close()
+    
+    from app.services.history_cache import history_cache
+    await history_cache.close()
+    
+    # Last: the steps above may still write to the database
+    from app.models.db_engine import db_engine
+    db_engine.dispose()
 
 
 # Create FastAPI application
@@ -52,6 +78,13 @@ from app.utils.tracing import setup_tracing
 setup_tracing(app)
 
 
+# Middleware: rate limiting (added before CORS so 429s still carry CORS headers)
+if settings.rate_limit_enabled:
+    from app.core.rate_limit import RateLimitMiddleware, build_rate_limit_backend
+    rate_limit_backend = build_rate_limit_backend()
+    app.add_middleware(RateLimitMiddleware, backend=rate_limit_backend)
+
+
 # Middleware: CORS
 app.add_middleware(
     CORSMiddleware,
@@ -95,6 +128,22 @@ async def add_request_id_and_timing(request: Request, call_next):
 
 
 # Exception handlers
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """A model call that was not admitted (non-streaming endpoints)."""
+    logger.warning(f"Admission rejected: {exc}")
+    
+    return JSONResponse(
+        status_code=503,
+        content={
+            "error": "Service Unavailable",
+            "message": str(exc),
+            "request_id": getattr(request.state, "request_id", None)
+        },
+        headers={"Retry-After": str(exc.retry_after_seconds)}
+    )
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler."""
@@ -147,6 +196,10 @@ app.openapi_tags = [
     {
         "name": "Agents",
         "description": "AI Agent orchestration endpoints"
+    },
+    {
+        "name": "Usage",
+        "description": "Token budgets and usage"
     }
 ]
 
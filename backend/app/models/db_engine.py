@@ -1,21 +1,34 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Callable, Generator, Optional, TypeVar
+import asyncio
+import functools
 from app.core.config import settings
 from app.core.logging import get_logger
 from app.models.db_models import Base
 
 logger = get_logger(__name__)
 
+T = TypeVar("T")
+
 
 class DatabaseEngine:
-    """PostgreSQL database engine manager."""
+    """
+    PostgreSQL database engine manager.
+    
+    Sessions are synchronous. Async code must not use them on the event
+    loop: ``run()`` executes a blocking function on a dedicated thread
+    pool sized like the connection pool, so every DB thread always has a
+    connection and a slow query never stalls other streams.
+    """
     
     def __init__(self):
         self.engine = None
         self.SessionLocal = None
+        self._executor: Optional[ThreadPoolExecutor] = None
     
     def initialize(self):
         """Initialize database engine and session factory."""
@@ -29,8 +42,8 @@ class DatabaseEngine:
         self.engine = create_engine(
             settings.postgresql_url,
             poolclass=QueuePool,
-            pool_size=10,
-            max_overflow=20,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
             pool_pre_ping=True,
             echo=settings.debug,
         )
@@ -43,6 +56,34 @@ class DatabaseEngine:
         
         logger.info("✅ PostgreSQL engine initialized")
     
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool reserved for database calls."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.db_pool_size,
+                thread_name_prefix="db"
+            )
+        return self._executor
+    
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run a blocking database function off the event loop.
+        
+        Usage:
+            conversation = await db_engine.run(load_conversation, session_id)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+    
+    def dispose(self):
+        """Shut down the DB thread pool and close pooled connections."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.engine is not None:
+            self.engine.dispose()
+    
     def create_tables(self):
         """Create all tables (for development only)."""
         if self.engine is None:
@@ -76,3 +117,20 @@ class DatabaseEngine:
 
 
 db_engine = DatabaseEngine()
+
+
+def run_in_db_thread(fn: Callable[..., T]) -> Callable[..., Any]:
+    """
+    Turn a blocking repository method into a coroutine run by ``db_engine.run``.
+    
+    Usage:
+        @run_in_db_thread
+        def get_conversation(self, session_id): ...
+        
+        conversation = await repository.get_conversation(session_id)
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        return await db_engine.run(fn, *args, **kwargs)
+    
+    return wrapper
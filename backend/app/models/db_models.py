@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, JSON, Index
+from sqlalchemy import Column, String, Integer, BigInteger, Date, DateTime, Text, JSON, Index
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy import ForeignKey
 from datetime import datetime
@@ -45,25 +45,52 @@ class Message(Base):
     conversation_id = Column(String(255), ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
     role = Column(String(50), nullable=False)
     content = Column(Text, nullable=False)
-    thinking_steps = Column(JSON, nullable=True)
+    usage = Column(JSON, nullable=True)  # Model token usage (assistant messages)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     
     conversation = relationship("Conversation", back_populates="messages")
+    # Reasoning steps live in their own table, loaded only when asked for
+    thinking = relationship(
+        "MessageThinking",
+        back_populates="message",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True
+    )
     
     __table_args__ = (
         Index('ix_messages_conversation_timestamp', 'conversation_id', 'timestamp'),
     )
     
-    def to_dict(self):
-        """Convert model to dictionary matching CosmosDB format."""
-        return {
+    def to_dict(self, include_thinking: bool = False):
+        """
+        Convert model to dictionary matching CosmosDB format.
+        
+        ``thinkingSteps`` is only present with ``include_thinking`` (which
+        loads the ``thinking`` relationship if it is not loaded yet).
+        """
+        data = {
             "id": self.id,
             "conversationId": self.conversation_id,
             "role": self.role,
             "content": self.content,
-            "thinkingSteps": self.thinking_steps or [],
-            "timestamp": self.timestamp.isoformat()
         }
+        if include_thinking:
+            data["thinkingSteps"] = self.thinking.steps if self.thinking is not None else []
+        data["usage"] = self.usage
+        # Always with microseconds, as the history JSON built in PostgreSQL
+        data["timestamp"] = self.timestamp.isoformat(timespec="microseconds")
+        return data
+
+
+class MessageThinking(Base):
+    """SQLAlchemy model for the reasoning steps of a message."""
+    __tablename__ = "message_thinking"
+    
+    message_id = Column(String(255), ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True)
+    steps = Column(JSON, nullable=False)
+    
+    message = relationship("Message", back_populates="thinking")
 
 
 class User(Base):
@@ -85,3 +112,16 @@ class User(Base):
             "createdAt": self.created_at.isoformat(),
             "updatedAt": self.updated_at.isoformat()
         }
+
+
+class TokenUsage(Base):
+    """SQLAlchemy model for aggregated token usage per budget period."""
+    __tablename__ = "token_usage"
+    
+    scope = Column(String(20), primary_key=True)  # user | tenant
+    subject_id = Column(String(255), primary_key=True)
+    period = Column(String(10), primary_key=True)  # day | month
+    period_start = Column(Date, primary_key=True)
+    input_tokens = Column(BigInteger, default=0, nullable=False)
+    output_tokens = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -17,6 +17,7 @@ class StreamChunkType(str, Enum):
     CONTENT = "content"
     DONE = "done"
     ERROR = "error"
+    QUEUED = "queued"  # waiting for admission; metadata carries the queue position
 
 
 class ThinkingStep(BaseModel):
@@ -206,6 +207,21 @@ class RAGQueryResponse(BaseModel):
     session_id: str = Field(..., description="Session ID")
 
 
+class IndexDocument(BaseModel):
+    """Document to index for RAG search."""
+    id: str = Field(..., description="Document ID")
+    content: str = Field(..., description="Document content")
+    title: str = Field(..., description="Document title")
+    metadata: Optional[Dict[str, Any]] = Field(default=None, description="Additional metadata")
+
+
+class IndexBatchRequest(BaseModel):
+    """Bulk RAG indexing request."""
+    documents: List[IndexDocument] = Field(
+        ..., min_length=1, max_length=1000, description="Documents to index (at most 1000)"
+    )
+
+
 class AgentRequest(BaseModel):
     """Agent execution request."""
     task: str = Field(..., description="Task description")
@@ -221,3 +237,23 @@ class AgentResponse(BaseModel):
     result: Optional[str] = Field(default=None, description="Task result")
     thinking_steps: Optional[List[ThinkingStep]] = Field(default=None, description="Agent reasoning")
     metadata: Optional[Dict[str, Any]] = Field(default=None, description="Additional metadata")
+
+
+class TokenBudget(BaseModel):
+    """Token budget of one subject for the current period."""
+    scope: str = Field(..., description="Budget scope: user or tenant")
+    subject_id: str = Field(..., description="User or tenant ID")
+    period: str = Field(..., description="Budget period: day or month (UTC)")
+    input_limit: Optional[int] = Field(default=None, description="Input token limit (null = unlimited)")
+    input_used: int = Field(..., description="Input tokens used this period")
+    input_remaining: Optional[int] = Field(default=None, description="Input tokens left (null = unlimited)")
+    output_limit: Optional[int] = Field(default=None, description="Output token limit (null = unlimited)")
+    output_used: int = Field(..., description="Output tokens used this period")
+    output_remaining: Optional[int] = Field(default=None, description="Output tokens left (null = unlimited)")
+    resets_at: datetime = Field(..., description="Start of the next period (UTC)")
+
+
+class TokenBudgetResponse(BaseModel):
+    """Remaining token budgets for the current caller."""
+    enabled: bool = Field(..., description="Whether token budgets are enforced")
+    budgets: List[TokenBudget] = Field(default_factory=list, description="Budgets that apply to the caller")
@@ -1,5 +1,7 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
 
 
 class BaseRepository(ABC):
@@ -15,33 +17,123 @@ class BaseRepository(ABC):
         """Create a new conversation."""
         pass
     
+    async def ensure_conversation(
+        self,
+        user_id: str,
+        session_id: str,
+        title: str = "New Conversation"
+    ) -> None:
+        """
+        Make sure a conversation exists before messages are written to it.
+        
+        Called before every chat turn; backends override this with a cheaper
+        path than ``create_conversation`` (no read-back, cached ids).
+        """
+        await self.create_conversation(user_id=user_id, session_id=session_id, title=title)
+    
     @abstractmethod
     async def save_message(
         self,
         conversation_id: str,
         role: str,
         content: str,
-        thinking_steps: Optional[List[Dict[str, Any]]] = None
+        thinking_steps: Optional[List[Dict[str, Any]]] = None,
+        usage: Optional[Dict[str, int]] = None
     ) -> Dict[str, Any]:
-        """Save a message with optional thinking steps."""
+        """Save a message with optional thinking steps and token usage."""
         pass
     
+    async def save_messages(
+        self,
+        messages: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Save a batch of messages, possibly from several conversations.
+        
+        Each item has ``id``, ``conversation_id``, ``role``, ``content``,
+        ``thinking_steps``, ``usage``, ``timestamp`` and optionally the
+        conversation owner's ``user_id``. Backends override this with a
+        bulk write; the default saves one message at a time.
+        
+        Returns:
+            Number of messages saved
+        """
+        for message in messages:
+            await self.save_message(
+                conversation_id=message["conversation_id"],
+                role=message["role"],
+                content=message["content"],
+                thinking_steps=message.get("thinking_steps"),
+                usage=message.get("usage")
+            )
+        return len(messages)
+    
     @abstractmethod
     async def get_conversation_messages(
         self,
         conversation_id: str,
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[Tuple[datetime, str]] = None,
+        include_thinking: bool = False
     ) -> List[Dict[str, Any]]:
-        """Get messages for a conversation."""
+        """
+        Get messages for a conversation, newest first.
+        
+        ``before`` is the ``(timestamp, id)`` of the last message of the
+        previous page; only older messages are returned (keyset paging).
+        ``thinkingSteps`` is only loaded and returned with ``include_thinking``.
+        """
+        pass
+    
+    async def get_conversation_messages_json(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        before: Optional[Tuple[datetime, str]] = None,
+        include_thinking: bool = False
+    ) -> Tuple[bytes, Optional[Tuple[str, str]]]:
+        """
+        A page of ``get_conversation_messages`` as a serialized JSON array.
+        
+        Backends that can build the JSON in the database override this;
+        the default serializes ``get_conversation_messages``.
+        
+        Returns:
+            (JSON array of the messages, ``(timestamp, id)`` of the last
+            message if older messages exist, else None)
+        """
+        messages = await self.get_conversation_messages(
+            conversation_id, limit=limit + 1, before=before, include_thinking=include_thinking
+        )
+        last_key = None
+        if len(messages) > limit:
+            del messages[limit:]
+            last_key = (messages[-1]["timestamp"], messages[-1]["id"])
+        body = json.dumps(messages, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return body, last_key
+    
+    @abstractmethod
+    async def get_message(
+        self,
+        conversation_id: str,
+        message_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Get one message of a conversation, with its thinking steps."""
         pass
     
     @abstractmethod
     async def get_user_conversations(
         self,
         user_id: str,
-        limit: int = 20
+        limit: int = 20,
+        before: Optional[Tuple[datetime, str]] = None
     ) -> List[Dict[str, Any]]:
-        """Get conversations for a user."""
+        """
+        Get conversations for a user, most recently updated first.
+        
+        ``before`` is the ``(updated_at, id)`` of the last conversation of
+        the previous page (keyset paging).
+        """
         pass
     
     @abstractmethod
@@ -1,4 +1,5 @@
-from typing import Dict, Any, Optional, List
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
 from app.repositories.base_repository import BaseRepository
 from app.models.database import CosmosDBClient
 
@@ -22,7 +23,8 @@ class CosmosDBRepository(BaseRepository):
         conversation_id: str,
         role: str,
         content: str,
-        thinking_steps: Optional[List[Dict[str, Any]]] = None
+        thinking_steps: Optional[List[Dict[str, Any]]] = None,
+        usage: Optional[Dict[str, int]] = None
     ) -> Dict[str, Any]:
         return await self.client.save_message(
             conversation_id, role, content, thinking_steps
@@ -31,15 +33,33 @@ class CosmosDBRepository(BaseRepository):
     async def get_conversation_messages(
         self,
         conversation_id: str,
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[Tuple[datetime, str]] = None,
+        include_thinking: bool = False
     ) -> List[Dict[str, Any]]:
-        return await self.client.get_conversation_messages(conversation_id, limit)
+        if before is not None:
+            raise NotImplementedError("Cursor pagination requires the PostgreSQL repository")
+        messages = await self.client.get_conversation_messages(conversation_id, limit)
+        if not include_thinking:
+            for message in messages:
+                message.pop("thinkingSteps", None)
+        return messages
+    
+    async def get_message(
+        self,
+        conversation_id: str,
+        message_id: str
+    ) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError("Single message reads require the PostgreSQL repository")
     
     async def get_user_conversations(
         self,
         user_id: str,
-        limit: int = 20
+        limit: int = 20,
+        before: Optional[Tuple[datetime, str]] = None
     ) -> List[Dict[str, Any]]:
+        if before is not None:
+            raise NotImplementedError("Cursor pagination requires the PostgreSQL repository")
         return await self.client.get_user_conversations(user_id, limit)
     
     async def update_conversation(
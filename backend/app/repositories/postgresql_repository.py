@@ -1,63 +1,141 @@
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set, Tuple
+from collections import Counter, OrderedDict
 from datetime import datetime
 import uuid
+from sqlalchemy import Text, bindparam, cast, func, insert, literal_column, select, tuple_, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlalchemy.orm import selectinload
+from app.core.config import settings
 from app.repositories.base_repository import BaseRepository
-from app.models.db_engine import db_engine
-from app.models.db_models import Conversation, Message
+from app.models.db_engine import db_engine, run_in_db_thread
+from app.models.db_models import Conversation, Message, MessageThinking
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+# Message.to_dict() timestamp layout: isoformat(timespec="microseconds")
+_ISO_TIMESTAMP = 'YYYY-MM-DD"T"HH24:MI:SS.US'
+_EMPTY_JSON_ARRAY = literal_column("'[]'::json")
+
 
 class PostgreSQLRepository(BaseRepository):
-    """PostgreSQL implementation of repository using SQLAlchemy ORM."""
+    """
+    PostgreSQL implementation of repository using SQLAlchemy ORM.
+    
+    Queries use synchronous sessions; every query runs on the database
+    thread pool so it never blocks the event loop.
+    """
     
-    def __init__(self):
+    def __init__(self, known_conversations_max: Optional[int] = None):
         db_engine.initialize()
+        # Conversation ids known to exist (LRU); lets repeat turns of a
+        # session skip the database in ensure_conversation()
+        self._known_conversations: "OrderedDict[str, None]" = OrderedDict()
+        self._known_conversations_max = (
+            known_conversations_max
+            if known_conversations_max is not None
+            else settings.conversation_cache_max_entries
+        )
     
-    async def create_conversation(
+    def _remember_conversation(self, session_id: str) -> None:
+        self._known_conversations[session_id] = None
+        self._known_conversations.move_to_end(session_id)
+        while len(self._known_conversations) > self._known_conversations_max:
+            self._known_conversations.popitem(last=False)
+    
+    @run_in_db_thread
+    def _insert_conversation(
         self,
         user_id: str,
         session_id: str,
-        title: str = "New Conversation"
-    ) -> Dict[str, Any]:
-        """Create a new conversation or return existing one."""
-        with db_engine.get_session() as session:
-            # Check if conversation already exists
-            existing = session.query(Conversation).filter_by(
-                id=session_id
-            ).first()
-            
-            if existing:
-                logger.info(f"Conversation already exists: {session_id}")
-                return existing.to_dict()
-            
-            # Create new conversation
-            conversation = Conversation(
+        title: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Insert a conversation unless it already exists.
+        
+        One ``INSERT ... ON CONFLICT DO NOTHING RETURNING`` round trip, safe
+        against concurrent first turns of the same session.
+        
+        Returns:
+            The new conversation, or None if it already existed
+        """
+        now = datetime.utcnow()
+        statement = (
+            pg_insert(Conversation)
+            .values(
                 id=session_id,
                 user_id=user_id,
                 session_id=session_id,
                 title=title,
                 message_count=0,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
+                created_at=now,
+                updated_at=now
             )
-            
-            session.add(conversation)
+            .on_conflict_do_nothing()
+            .returning(Conversation)
+        )
+        with db_engine.get_session() as session:
+            conversation = session.execute(statement).scalars().first()
+            created = conversation.to_dict() if conversation is not None else None
             session.commit()
-            session.refresh(conversation)
-            
+        
+        if created is not None:
             logger.info(f"Created conversation: {session_id}")
-            return conversation.to_dict()
+        return created
+    
+    @run_in_db_thread
+    def _get_conversation(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with db_engine.get_session() as session:
+            conversation = session.get(Conversation, session_id)
+            return conversation.to_dict() if conversation is not None else None
     
-    async def save_message(
+    async def create_conversation(
+        self,
+        user_id: str,
+        session_id: str,
+        title: str = "New Conversation"
+    ) -> Dict[str, Any]:
+        """Create a new conversation or return existing one."""
+        conversation = await self._insert_conversation(user_id, session_id, title)
+        if conversation is None:
+            logger.info(f"Conversation already exists: {session_id}")
+            conversation = await self._get_conversation(session_id)
+            if conversation is None:
+                # Deleted between the insert and the read
+                raise ValueError(f"Conversation not found: {session_id}")
+        
+        self._remember_conversation(session_id)
+        return conversation
+    
+    async def ensure_conversation(
+        self,
+        user_id: str,
+        session_id: str,
+        title: str = "New Conversation"
+    ) -> None:
+        """
+        Make sure a conversation exists, without reading it back.
+        
+        Ids this process has already created or seen are answered from
+        memory, so only the first turn of a session touches the database.
+        """
+        if session_id in self._known_conversations:
+            self._known_conversations.move_to_end(session_id)
+            return
+        
+        await self._insert_conversation(user_id, session_id, title)
+        self._remember_conversation(session_id)
+    
+    @run_in_db_thread
+    def save_message(
         self,
         conversation_id: str,
         role: str,
         content: str,
-        thinking_steps: Optional[List[Dict[str, Any]]] = None
+        thinking_steps: Optional[List[Dict[str, Any]]] = None,
+        usage: Optional[Dict[str, int]] = None
     ) -> Dict[str, Any]:
-        """Save a message with optional thinking steps."""
+        """Save a message with optional thinking steps and token usage."""
         with db_engine.get_session() as session:
             # Check if conversation exists
             conversation = session.query(Conversation).filter_by(
@@ -76,9 +154,11 @@ class PostgreSQLRepository(BaseRepository):
                 conversation_id=conversation_id,
                 role=role,
                 content=content,
-                thinking_steps=thinking_steps,
+                usage=usage,
                 timestamp=datetime.utcnow()
             )
+            if thinking_steps:
+                message.thinking = MessageThinking(steps=thinking_steps)
             
             session.add(message)
             
@@ -90,39 +170,277 @@ class PostgreSQLRepository(BaseRepository):
             session.refresh(message)
             
             logger.info(f"Saved message for conversation: {conversation_id}")
-            return message.to_dict()
+            return message.to_dict(include_thinking=True)
+    
+    async def save_messages(
+        self,
+        messages: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Save a batch of messages in one transaction.
+        
+        One multi-row INSERT for all messages (and one for their thinking
+        steps) and one executemany UPDATE adding to each conversation's
+        ``message_count``, instead of a query, insert, update and refresh
+        per message.
+        
+        A conversation that no longer exists (e.g. deleted through another
+        pod, while this one still had its id cached as known) is recreated
+        when its messages carry the owner's ``user_id``; other messages for
+        it are skipped and its id is forgotten, so the next turn recreates it.
+        """
+        if not messages:
+            return 0
+        
+        saved, skipped = await self._save_messages(messages)
+        for conversation_id in skipped:
+            self._known_conversations.pop(conversation_id, None)
+        return saved
     
-    async def get_conversation_messages(
+    @run_in_db_thread
+    def _save_messages(
+        self,
+        messages: List[Dict[str, Any]]
+    ) -> Tuple[int, Set[str]]:
+        with db_engine.get_session() as session:
+            conversation_ids = {m["conversation_id"] for m in messages}
+            existing = {
+                row.id for row in session.query(Conversation.id).filter(
+                    Conversation.id.in_(conversation_ids)
+                )
+            }
+            
+            owners = {
+                m["conversation_id"]: m["user_id"] for m in messages
+                if m["conversation_id"] not in existing and m.get("user_id")
+            }
+            if owners:
+                now = datetime.utcnow()
+                session.execute(
+                    pg_insert(Conversation).values([
+                        {
+                            "id": conversation_id,
+                            "user_id": user_id,
+                            "session_id": conversation_id,
+                            "title": "New Conversation",
+                            "message_count": 0,
+                            "created_at": now,
+                            "updated_at": now,
+                        }
+                        for conversation_id, user_id in owners.items()
+                    ]).on_conflict_do_nothing()
+                )
+                logger.warning(f"Recreated missing conversations: {sorted(owners)}")
+                existing |= owners.keys()
+            
+            rows = [m for m in messages if m["conversation_id"] in existing]
+            skipped = conversation_ids - existing
+            if skipped:
+                logger.warning(
+                    f"Skipped {len(messages) - len(rows)} messages for unknown conversations: "
+                    f"{sorted(skipped)}"
+                )
+            if not rows:
+                return 0, skipped
+            
+            session.execute(insert(Message), [
+                {
+                    "id": m["id"],
+                    "conversation_id": m["conversation_id"],
+                    "role": m["role"],
+                    "content": m["content"],
+                    "usage": m.get("usage"),
+                    "timestamp": m["timestamp"],
+                }
+                for m in rows
+            ])
+            thinking = [
+                {"message_id": m["id"], "steps": m["thinking_steps"]}
+                for m in rows if m.get("thinking_steps")
+            ]
+            if thinking:
+                session.execute(insert(MessageThinking), thinking)
+            
+            # Aggregated counter update: one parameter set per conversation
+            added = Counter(m["conversation_id"] for m in rows)
+            latest: Dict[str, datetime] = {}
+            for m in rows:
+                latest[m["conversation_id"]] = max(m["timestamp"], latest.get(m["conversation_id"], m["timestamp"]))
+            conversations = Conversation.__table__
+            session.execute(
+                update(conversations)
+                .where(conversations.c.id == bindparam("b_id"))
+                .values(
+                    message_count=func.coalesce(conversations.c.message_count, 0) + bindparam("b_added"),
+                    updated_at=bindparam("b_updated_at")
+                ),
+                [
+                    {"b_id": conversation_id, "b_added": count, "b_updated_at": latest[conversation_id]}
+                    for conversation_id, count in added.items()
+                ]
+            )
+            
+            session.commit()
+            
+            logger.info(f"Saved {len(rows)} messages for {len(added)} conversations")
+            return len(rows), skipped
+    
+    @run_in_db_thread
+    def get_conversation_messages(
         self,
         conversation_id: str,
-        limit: int = 50
+        limit: int = 50,
+        before: Optional[Tuple[datetime, str]] = None,
+        include_thinking: bool = False
     ) -> List[Dict[str, Any]]:
-        """Get messages for a conversation."""
+        """Get messages for a conversation, newest first (keyset paging)."""
         with db_engine.get_session() as session:
-            messages = session.query(Message).filter_by(
+            query = session.query(Message).filter_by(
                 conversation_id=conversation_id
-            ).order_by(
-                Message.timestamp.desc()
+            )
+            if include_thinking:
+                query = query.options(selectinload(Message.thinking))
+            if before is not None:
+                # Range scan on ix_messages_conversation_timestamp; id breaks ties
+                query = query.filter(tuple_(Message.timestamp, Message.id) < tuple_(*before))
+            
+            messages = query.order_by(
+                Message.timestamp.desc(),
+                Message.id.desc()
             ).limit(limit).all()
             
-            return [msg.to_dict() for msg in messages]
+            return [msg.to_dict(include_thinking) for msg in messages]
+    
+    async def get_conversation_messages_json(
+        self,
+        conversation_id: str,
+        limit: int = 50,
+        before: Optional[Tuple[datetime, str]] = None,
+        include_thinking: bool = False
+    ) -> Tuple[bytes, Optional[Tuple[str, str]]]:
+        """
+        A page of messages as a JSON array built by PostgreSQL.
+        
+        One query returns the page as ``json_agg`` of ``json_build_object``
+        rows with the keys ``Message.to_dict()`` produces, so no ORM objects
+        or per-row dicts are created and the bytes go straight into the
+        response. Other dialects use the generic path.
+        """
+        if db_engine.engine is None or db_engine.engine.dialect.name != "postgresql":
+            return await super().get_conversation_messages_json(
+                conversation_id, limit, before, include_thinking
+            )
+        return await self._get_conversation_messages_json(conversation_id, limit, before, include_thinking)
+    
+    @run_in_db_thread
+    def _get_conversation_messages_json(
+        self,
+        conversation_id: str,
+        limit: int,
+        before: Optional[Tuple[datetime, str]],
+        include_thinking: bool
+    ) -> Tuple[bytes, Optional[Tuple[str, str]]]:
+        columns = [
+            Message.id,
+            Message.conversation_id,
+            Message.role,
+            Message.content,
+            Message.usage,
+            func.to_char(Message.timestamp, _ISO_TIMESTAMP).label("ts"),
+            func.row_number().over(
+                order_by=(Message.timestamp.desc(), Message.id.desc())
+            ).label("n")
+        ]
+        query = select(*columns)
+        if include_thinking:
+            query = query.add_columns(MessageThinking.steps).outerjoin(
+                MessageThinking, MessageThinking.message_id == Message.id
+            )
+        query = query.where(Message.conversation_id == conversation_id)
+        if before is not None:
+            query = query.where(tuple_(Message.timestamp, Message.id) < tuple_(*before))
+        # One look-ahead row tells whether an older page exists
+        page = query.order_by(
+            Message.timestamp.desc(),
+            Message.id.desc()
+        ).limit(limit + 1).subquery()
+        
+        fields = [
+            "id", page.c.id,
+            "conversationId", page.c.conversation_id,
+            "role", page.c.role,
+            "content", page.c.content,
+        ]
+        if include_thinking:
+            fields += ["thinkingSteps", func.coalesce(page.c.steps, _EMPTY_JSON_ARRAY)]
+        fields += [
+            "usage", page.c.usage,
+            "timestamp", page.c.ts
+        ]
+        message = func.json_build_object(*fields)
+        is_last = page.c.n == limit
+        statement = select(
+            # Cast to text so the driver hands back the string unparsed
+            cast(
+                func.coalesce(
+                    func.json_agg(aggregate_order_by(message, page.c.n)).filter(page.c.n <= limit),
+                    _EMPTY_JSON_ARRAY
+                ),
+                Text
+            ),
+            func.count(),
+            func.max(page.c.ts).filter(is_last),
+            func.max(page.c.id).filter(is_last)
+        )
+        
+        with db_engine.get_session() as session:
+            body, rows, last_timestamp, last_id = session.execute(statement).one()
+        
+        last_key = (last_timestamp, last_id) if rows > limit else None
+        return body.encode("utf-8"), last_key
+    
+    @run_in_db_thread
+    def get_message(
+        self,
+        conversation_id: str,
+        message_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Get one message with its thinking steps."""
+        with db_engine.get_session() as session:
+            message = session.query(Message).options(
+                selectinload(Message.thinking)
+            ).filter_by(
+                id=message_id,
+                conversation_id=conversation_id
+            ).first()
+            
+            return message.to_dict(include_thinking=True) if message else None
     
-    async def get_user_conversations(
+    @run_in_db_thread
+    def get_user_conversations(
         self,
         user_id: str,
-        limit: int = 20
+        limit: int = 20,
+        before: Optional[Tuple[datetime, str]] = None
     ) -> List[Dict[str, Any]]:
-        """Get conversations for a user."""
+        """Get conversations for a user, most recently updated first (keyset paging)."""
         with db_engine.get_session() as session:
-            conversations = session.query(Conversation).filter_by(
+            query = session.query(Conversation).filter_by(
                 user_id=user_id
-            ).order_by(
-                Conversation.updated_at.desc()
+            )
+            if before is not None:
+                # Range scan on ix_conversations_user_updated; id breaks ties
+                query = query.filter(tuple_(Conversation.updated_at, Conversation.id) < tuple_(*before))
+            
+            conversations = query.order_by(
+                Conversation.updated_at.desc(),
+                Conversation.id.desc()
             ).limit(limit).all()
             
             return [conv.to_dict() for conv in conversations]
     
-    async def update_conversation(
+    @run_in_db_thread
+    def update_conversation(
         self,
         session_id: str,
         updates: Dict[str, Any]
@@ -156,6 +474,12 @@ class PostgreSQLRepository(BaseRepository):
         session_id: str
     ) -> bool:
         """Delete a conversation and all its messages."""
+        # On the loop, like every other use of the known-id LRU
+        self._known_conversations.pop(session_id, None)
+        return await self._delete_conversation(session_id)
+    
+    @run_in_db_thread
+    def _delete_conversation(self, session_id: str) -> bool:
         with db_engine.get_session() as session:
             conversation = session.query(Conversation).filter_by(
                 session_id=session_id
@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, Tuple
+from datetime import date, datetime
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from app.models.db_engine import db_engine, run_in_db_thread
+from app.models.db_models import TokenUsage
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# (scope, subject_id, period, period_start)
+UsageKey = Tuple[str, str, str, date]
+
+
+class TokenUsageRepository:
+    """
+    Token usage ledger in PostgreSQL, one row per subject and budget period.
+
+    Methods run on the database thread pool.
+    """
+
+    def __init__(self):
+        db_engine.initialize()
+
+    @run_in_db_thread
+    def add_usage(self, deltas: Dict[UsageKey, Tuple[int, int]]) -> Dict[UsageKey, Tuple[int, int]]:
+        """
+        Add (input, output) token counts to the ledger in one multi-row upsert.
+
+        Returns:
+            New totals of the touched rows, including other pods' usage
+        """
+        if not deltas:
+            return {}
+
+        now = datetime.utcnow()
+        stmt = insert(TokenUsage).values([
+            {
+                "scope": scope,
+                "subject_id": subject_id,
+                "period": period,
+                "period_start": period_start,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "updated_at": now,
+            }
+            for (scope, subject_id, period, period_start), (input_tokens, output_tokens) in deltas.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["scope", "subject_id", "period", "period_start"],
+            set_={
+                "input_tokens": TokenUsage.input_tokens + stmt.excluded.input_tokens,
+                "output_tokens": TokenUsage.output_tokens + stmt.excluded.output_tokens,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ).returning(
+            TokenUsage.scope,
+            TokenUsage.subject_id,
+            TokenUsage.period,
+            TokenUsage.period_start,
+            TokenUsage.input_tokens,
+            TokenUsage.output_tokens,
+        )
+
+        with db_engine.get_session() as session:
+            rows = session.execute(stmt).all()
+
+        logger.debug(f"Flushed {len(deltas)} token usage rows")
+        return {
+            (row.scope, row.subject_id, row.period, row.period_start): (row.input_tokens, row.output_tokens)
+            for row in rows
+        }
+
+    @run_in_db_thread
+    def get_usage(self, keys: Iterable[UsageKey]) -> Dict[UsageKey, Tuple[int, int]]:
+        """Read ledger totals; keys without a row count as zero."""
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        with db_engine.get_session() as session:
+            rows = session.query(TokenUsage).filter(
+                tuple_(
+                    TokenUsage.scope,
+                    TokenUsage.subject_id,
+                    TokenUsage.period,
+                    TokenUsage.period_start,
+                ).in_(keys)
+            ).all()
+            totals = {
+                (row.scope, row.subject_id, row.period, row.period_start): (row.input_tokens, row.output_tokens)
+                for row in rows
+            }
+
+        return {key: totals.get(key, (0, 0)) for key in keys}
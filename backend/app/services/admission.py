@@ -0,0 +1,188 @@
+"""
+Per-pod admission control for model calls.
+
+Each logical model has a maximum number of in-flight calls on this pod.
+Calls beyond that wait in a bounded queue ordered by priority class
+(interactive chat before RAG, FIFO within a class) and give
+up after a deadline. Rejecting early keeps a burst from turning into a pile
+of upstream 429s with exploding tail latency for everyone.
+"""
+
+import asyncio
+import itertools
+import json
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class Priority(IntEnum):
+    """Admission priority classes; lower values are admitted first."""
+    CHAT = 0
+    RAG = 1
+
+
+class AdmissionRejected(Exception):
+    """The call was not admitted: the wait queue is full or the deadline passed."""
+
+    # Suggested back-off for the client (503 Retry-After)
+    retry_after_seconds = 5
+
+
+class Ticket:
+    """A caller's place in line and, once admitted, its in-flight slot."""
+
+    __slots__ = ("gate", "priority", "seq", "admitted", "released", "_granted")
+
+    def __init__(self, gate: "_ModelGate", priority: Priority, seq: int) -> None:
+        self.gate = gate
+        self.priority = priority
+        self.seq = seq
+        self.admitted = False
+        self.released = False
+        self._granted: Optional[asyncio.Future] = None
+
+    @property
+    def position(self) -> int:
+        """1-based position in the wait queue (0 once admitted)."""
+        return self.gate.position(self)
+
+    async def wait(self, timeout: float) -> None:
+        """
+        Wait until admitted.
+
+        Raises:
+            AdmissionRejected: if not admitted within ``timeout`` seconds
+        """
+        if self.admitted:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._granted), timeout)
+        except asyncio.TimeoutError:
+            if self.gate.withdraw(self):
+                raise AdmissionRejected(
+                    f"Model '{self.gate.model}' is busy; not admitted within {timeout:.0f}s"
+                ) from None
+        except asyncio.CancelledError:
+            # Caller went away while queued; give the slot back if we just got it
+            self.cancel()
+            raise
+
+    def release(self) -> None:
+        """Free the in-flight slot (idempotent)."""
+        if self.admitted and not self.released:
+            self.released = True
+            self.gate.release()
+
+    def cancel(self) -> None:
+        """
+        Give up the ticket whatever its state (idempotent).
+
+        Leaves the wait queue if still waiting, otherwise frees the slot.
+        Use this when the caller may go away before ``wait()`` returns.
+        """
+        if not self.gate.withdraw(self):
+            self.release()
+
+
+class _ModelGate:
+    """In-flight counter and priority wait queue for one model."""
+
+    def __init__(self, model: str, limit: int, max_queue: int) -> None:
+        self.model = model
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiting: List[Ticket] = []
+
+    def enqueue(self, ticket: Ticket) -> None:
+        if self.in_flight < self.limit and not self._waiting:
+            self.in_flight += 1
+            ticket.admitted = True
+            return
+        if len(self._waiting) >= self.max_queue:
+            raise AdmissionRejected(f"Model '{self.model}' is at capacity; wait queue is full")
+        ticket._granted = asyncio.get_running_loop().create_future()
+        self._waiting.append(ticket)
+        self._waiting.sort(key=lambda t: (t.priority, t.seq))
+
+    def position(self, ticket: Ticket) -> int:
+        if ticket.admitted:
+            return 0
+        for index, waiting in enumerate(self._waiting):
+            if waiting is ticket:
+                return index + 1
+        return 0
+
+    def withdraw(self, ticket: Ticket) -> bool:
+        """Remove a still-waiting ticket; False if it was admitted meanwhile."""
+        for index, waiting in enumerate(self._waiting):
+            if waiting is ticket:
+                del self._waiting[index]
+                return True
+        return False
+
+    def release(self) -> None:
+        # Hand the slot straight to the next waiter, if any
+        if self._waiting:
+            ticket = self._waiting.pop(0)
+            ticket.admitted = True
+            ticket._granted.set_result(None)
+        else:
+            self.in_flight -= 1
+
+
+class AdmissionController:
+    """Per-model admission gates for this process."""
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        max_queue: int = 128,
+        queue_timeout_seconds: float = 30.0,
+        model_limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.model_limits = model_limits or {}
+        self._gates: Dict[str, _ModelGate] = {}
+        self._seq = itertools.count()
+
+    def enqueue(self, model: str, priority: Priority = Priority.CHAT) -> Ticket:
+        """
+        Take a slot for ``model`` or a place in its wait queue.
+
+        Check ``ticket.admitted``; if False, ``await ticket.wait(...)``.
+        Always ``ticket.cancel()`` when the call finishes (or is abandoned).
+
+        Raises:
+            AdmissionRejected: if the wait queue is full
+        """
+        gate = self._gates.get(model)
+        if gate is None:
+            gate = _ModelGate(model, self.model_limits.get(model, self.max_in_flight), self.max_queue)
+            self._gates[model] = gate
+        ticket = Ticket(gate, priority, next(self._seq))
+        gate.enqueue(ticket)
+        return ticket
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Current in-flight and queued counts per model."""
+        return {
+            model: {"in_flight": gate.in_flight, "queued": len(gate._waiting), "limit": gate.limit}
+            for model, gate in self._gates.items()
+        }
+
+
+# Global instance
+admission_controller = AdmissionController(
+    max_in_flight=settings.admission_max_in_flight,
+    max_queue=settings.admission_max_queue,
+    queue_timeout_seconds=settings.admission_queue_timeout_seconds,
+    model_limits=json.loads(settings.admission_model_limits) if settings.admission_model_limits else None,
+)
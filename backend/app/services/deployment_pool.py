@@ -0,0 +1,273 @@
+"""
+Weighted, health-aware routing across Azure OpenAI deployments.
+
+Each logical model (``gpt-5.2``, ``gpt-5-mini``) can be served by several
+endpoint/deployment pairs, e.g. a PTU deployment plus pay-as-you-go
+deployments in other regions. For every call the pool picks a backend:
+
+1. Backends cooling down after a 429 (for the server's ``retry-after``) or
+   after a connection/5xx failure (exponential backoff) are skipped.
+2. Among the rest, the lowest ``priority`` tier wins, so traffic spills over
+   to the next tier (another region, PAYG) only while the preferred one is
+   throttled or down.
+3. Within a tier, the backend with the least in-flight requests per unit
+   of ``weight`` is chosen.
+
+A throttled or failed call is retried on the next backend before anything
+has been streamed to the client.
+"""
+
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from openai import APIConnectionError, AsyncAzureOpenAI, InternalServerError, RateLimitError
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# Fallback cooldown when a 429 carries no usable retry-after header
+DEFAULT_RETRY_AFTER_SECONDS = 10.0
+MAX_COOLDOWN_SECONDS = 60.0
+
+
+@dataclass(eq=False)
+class Backend:
+    """One Azure OpenAI deployment serving a logical model."""
+    model: str
+    deployment: str
+    client: Any
+    endpoint: str = ""
+    region: Optional[str] = None
+    weight: float = 1.0
+    priority: int = 0
+
+    # Live state
+    in_flight: int = 0
+    cooldown_until: float = 0.0
+    failures: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.region or self.endpoint}/{self.deployment}"
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    @property
+    def load(self) -> float:
+        """In-flight requests per unit of weight, counting the one being placed."""
+        return (self.in_flight + 1) / max(self.weight, 1e-6)
+
+
+def retry_after_seconds(exc: Exception) -> float:
+    """Read ``retry-after-ms`` / ``retry-after`` from a throttled response."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return DEFAULT_RETRY_AFTER_SECONDS
+
+
+class DeploymentPool:
+    """Routes calls for a logical model to the best available backend."""
+
+    def __init__(self, backends: Sequence[Backend], failure_cooldown_seconds: float = 5.0) -> None:
+        self.backends = list(backends)
+        self.failure_cooldown_seconds = failure_cooldown_seconds
+
+    def models(self) -> List[str]:
+        return sorted({backend.model for backend in self.backends})
+
+    def has_model(self, model: str) -> bool:
+        return any(backend.model == model for backend in self.backends)
+
+    def select(
+        self,
+        model: str,
+        exclude: Sequence[Backend] = (),
+        preferred: Optional[Backend] = None,
+    ) -> Optional[Backend]:
+        """
+        Pick the backend for the next call.
+
+        Args:
+            model: Logical model name
+            exclude: Backends already tried for this call
+            preferred: Backend to keep using while it is healthy (e.g. the
+                one holding a chained ``previous_response_id``)
+
+        Returns:
+            The chosen backend, or None if every backend was excluded
+        """
+        candidates = [
+            backend for backend in self.backends
+            if backend.model == model and not any(backend is ex for ex in exclude)
+        ]
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        healthy = [backend for backend in candidates if backend.available(now)]
+        if not healthy:
+            # Everything is cooling down: try whichever recovers first
+            return min(candidates, key=lambda backend: backend.cooldown_until)
+
+        if preferred is not None and any(backend is preferred for backend in healthy):
+            return preferred
+
+        tier = min(backend.priority for backend in healthy)
+        return min(
+            (backend for backend in healthy if backend.priority == tier),
+            key=lambda backend: (backend.load, random.random()),
+        )
+
+    async def call(
+        self,
+        model: str,
+        fn: Callable[[Backend], Awaitable[T]],
+        preferred: Optional[Backend] = None,
+    ) -> Tuple[Backend, T]:
+        """
+        Run ``fn(backend)``, failing over on throttling and outages.
+
+        The chosen backend stays counted as in flight until ``release()`` is
+        called, so streaming callers release it when the stream closes.
+
+        Raises:
+            The last backend error if every backend failed, or LookupError
+            if no backend serves ``model``
+        """
+        tried: List[Backend] = []
+        last_error: Optional[Exception] = None
+
+        while True:
+            backend = self.select(model, exclude=tried, preferred=preferred)
+            if backend is None:
+                if last_error is not None:
+                    raise last_error
+                raise LookupError(f"No Azure OpenAI deployment configured for model '{model}'")
+            tried.append(backend)
+
+            backend.in_flight += 1
+            try:
+                result = await fn(backend)
+            except RateLimitError as exc:
+                self.release(backend)
+                self.mark_throttled(backend, retry_after_seconds(exc))
+                last_error = exc
+                continue
+            except (APIConnectionError, InternalServerError) as exc:
+                self.release(backend)
+                self.mark_failed(backend)
+                last_error = exc
+                continue
+            except BaseException:
+                self.release(backend)
+                raise
+
+            backend.failures = 0
+            return backend, result
+
+    def release(self, backend: Backend) -> None:
+        backend.in_flight = max(0, backend.in_flight - 1)
+
+    def mark_throttled(self, backend: Backend, retry_after: float) -> None:
+        backend.cooldown_until = time.monotonic() + min(retry_after, MAX_COOLDOWN_SECONDS)
+        logger.warning(f"Azure OpenAI backend {backend.name} throttled; cooling down {retry_after:.1f}s")
+
+    def mark_failed(self, backend: Backend) -> None:
+        backend.failures += 1
+        cooldown = min(
+            self.failure_cooldown_seconds * (2 ** (backend.failures - 1)),
+            MAX_COOLDOWN_SECONDS,
+        )
+        backend.cooldown_until = time.monotonic() + cooldown
+        logger.warning(
+            f"Azure OpenAI backend {backend.name} failed ({backend.failures}x); "
+            f"cooling down {cooldown:.1f}s"
+        )
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current routing state, for health/diagnostics."""
+        now = time.monotonic()
+        return [
+            {
+                "model": backend.model,
+                "backend": backend.name,
+                "priority": backend.priority,
+                "weight": backend.weight,
+                "in_flight": backend.in_flight,
+                "available": backend.available(now),
+            }
+            for backend in self.backends
+        ]
+
+
+def build_deployment_pool(token_provider: Callable[[], str], default_client: Any) -> DeploymentPool:
+    """
+    Build the pool from ``AZURE_OPENAI_BACKENDS``.
+
+    Without that setting the pool holds the single configured endpoint with
+    its main and mini deployments, i.e. the previous behaviour.
+    """
+    if not settings.azure_openai_backends:
+        return DeploymentPool(
+            [
+                Backend(
+                    model=settings.azure_openai_model,
+                    deployment=settings.azure_openai_deployment_name,
+                    client=default_client,
+                    endpoint=settings.azure_openai_endpoint or "",
+                ),
+                Backend(
+                    model=settings.azure_openai_mini_model,
+                    deployment=settings.azure_openai_mini_deployment_name,
+                    client=default_client,
+                    endpoint=settings.azure_openai_endpoint or "",
+                ),
+            ],
+            failure_cooldown_seconds=settings.azure_openai_backend_cooldown_seconds,
+        )
+
+    # One client per endpoint/credential. SDK retries are disabled so a
+    # 429 fails over to another backend instead of sleeping on this one.
+    clients: Dict[Tuple[str, Optional[str]], AsyncAzureOpenAI] = {}
+    backends: List[Backend] = []
+    for entry in json.loads(settings.azure_openai_backends):
+        endpoint = entry["endpoint"].rstrip("/")
+        api_key = entry.get("api_key")
+        client = clients.get((endpoint, api_key))
+        if client is None:
+            auth = {"api_key": api_key} if api_key else {"azure_ad_token_provider": token_provider}
+            client = AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                api_version=settings.azure_openai_api_version,
+                max_retries=0,
+                **auth,
+            )
+            clients[(endpoint, api_key)] = client
+        backends.append(Backend(
+            model=entry["model"],
+            deployment=entry["deployment"],
+            client=client,
+            endpoint=endpoint,
+            region=entry.get("region"),
+            weight=float(entry.get("weight", 1.0)),
+            priority=int(entry.get("priority", 0)),
+        ))
+
+    pool = DeploymentPool(backends, failure_cooldown_seconds=settings.azure_openai_backend_cooldown_seconds)
+    logger.info(f"Azure OpenAI deployment pool: {[b.name for b in backends]}")
+    return pool
@@ -0,0 +1,109 @@
+"""
+Batching for embedding requests.
+
+``pack_batches`` splits a list of inputs into as few requests as the
+deployment allows (max inputs and max tokens per request), for bulk work
+such as indexing.
+
+``EmbeddingCoalescer`` does the same for concurrent single-query calls
+from different requests: calls arriving within a few milliseconds of each
+other are merged into one API call, so a burst of RAG queries costs one
+round trip instead of one per query.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.logging import get_logger
+from app.utils.metrics import estimate_tokens
+
+logger = get_logger(__name__)
+
+EmbedBatch = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+def pack_batches(texts: List[str], max_inputs: int, max_tokens: int) -> List[List[str]]:
+    """
+    Split inputs into request-sized batches, preserving order.
+
+    Token counts are estimated (~4 characters per token); an input larger
+    than ``max_tokens`` on its own still gets a batch of its own.
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    batch_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class EmbeddingCoalescer:
+    """Merges concurrent single-text embedding calls into batched API calls."""
+
+    def __init__(self, embed_batch: EmbedBatch, window_ms: float = 5.0, max_batch: int = 64) -> None:
+        """
+        Args:
+            embed_batch: Embeds a list of texts, returning vectors in order
+            window_ms: How long the first call of a batch waits for company
+            max_batch: Dispatch immediately once this many texts are waiting
+        """
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._waiting: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed one text as part of the next batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiting.append((text, future))
+
+        if len(self._waiting) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+
+        # A cancelled caller only cancels its own future, never the shared batch
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        waiting, self._waiting = self._waiting, []
+        if not waiting:
+            return
+        task = asyncio.create_task(self._run(waiting))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, waiting: List[Tuple[str, asyncio.Future]]) -> None:
+        # Identical concurrent queries are embedded once
+        texts = list(dict.fromkeys(text for text, future in waiting if not future.done()))
+        if not texts:
+            return
+
+        try:
+            vectors = await self.embed_batch(texts)
+        except Exception as exc:
+            for _, future in waiting:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        by_text: Dict[str, List[float]] = dict(zip(texts, vectors))
+        for text, future in waiting:
+            if not future.done():
+                future.set_result(by_text[text])
+        if len(waiting) > 1:
+            logger.debug(f"Coalesced {len(waiting)} embedding calls into one request")
@@ -0,0 +1,276 @@
+"""
+Content-addressed cache for embedding vectors.
+
+Vectors are keyed by the SHA-256 of the input text and kept as float32
+NumPy arrays (4 bytes per dimension, versus ~32 for a list of Python
+floats). The in-memory tier is an LRU bounded by entry count.
+
+The optional disk tier is one append-only file per embedding deployment
+(``<dir>/<deployment>/embeddings.f32``): an 8-byte header (magic + dimension)
+followed by fixed-size records of ``digest || float32[dim]``. The file is
+memory-mapped for reads, so a lookup is a dict probe plus one copy out of
+the page cache. Records appended by other workers sharing the directory
+are picked up on the next miss.
+"""
+
+import asyncio
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.utils.metrics import embedding_cache_hits, embedding_cache_misses
+
+logger = get_logger(__name__)
+
+_MAGIC = b"EMB1"
+_HEADER = struct.Struct("<4sI")
+_DIGEST_SIZE = 32
+
+
+def embedding_key(text: str) -> bytes:
+    """Content hash of an embedding input."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingDiskStore:
+    """Append-only, memory-mapped file of (digest, float32 vector) records."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.dim: Optional[int] = None
+        self._offsets: Dict[bytes, int] = {}
+        self._indexed_size = _HEADER.size
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._open()
+
+    @property
+    def record_size(self) -> int:
+        return _DIGEST_SIZE + 4 * self.dim
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _open(self) -> None:
+        if not self.path.exists() or self.path.stat().st_size < _HEADER.size:
+            return
+        with open(self.path, "rb") as f:
+            magic, dim = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or dim <= 0:
+            logger.warning(f"Ignoring embedding cache file with unknown format: {self.path}")
+            return
+        self.dim = dim
+
+        # Drop a torn record left behind by a crash mid-append
+        size = self.path.stat().st_size
+        whole = _HEADER.size + (size - _HEADER.size) // self.record_size * self.record_size
+        if whole != size:
+            logger.warning(f"Truncating partial record at end of {self.path}")
+            os.truncate(self.path, whole)
+        self._catch_up()
+
+    def _catch_up(self) -> None:
+        """Map the file and index records appended since the last scan."""
+        if self.dim is None:
+            return
+        size = self.path.stat().st_size
+        size = _HEADER.size + (size - _HEADER.size) // self.record_size * self.record_size
+        if size <= self._indexed_size:
+            return
+
+        if self._map is not None:
+            self._map.close()
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+        for offset in range(self._indexed_size, size, self.record_size):
+            digest = self._map[offset:offset + _DIGEST_SIZE]
+            self._offsets.setdefault(digest, offset + _DIGEST_SIZE)
+        self._indexed_size = size
+
+    def get(self, digest: bytes) -> Optional[np.ndarray]:
+        with self._lock:
+            offset = self._offsets.get(digest)
+            if offset is None:
+                if self.dim is None:
+                    self._open()  # another worker may have created the file
+                self._catch_up()
+                offset = self._offsets.get(digest)
+                if offset is None:
+                    return None
+            return np.frombuffer(self._map, dtype=np.float32, count=self.dim, offset=offset).copy()
+
+    def append(self, digest: bytes, vector: np.ndarray) -> None:
+        self.append_many([(digest, vector)])
+
+    def append_many(self, records: List[Tuple[bytes, np.ndarray]]) -> None:
+        """Append a batch of records in a single write (blocking file I/O)."""
+        if not records:
+            return
+        with self._lock:
+            if self.dim is None:
+                self._create(int(records[0][1].shape[0]))
+                if self.dim is None:
+                    return
+
+            data = bytearray()
+            seen = set()
+            for digest, vector in records:
+                if vector.shape[0] != self.dim:
+                    logger.warning(f"Not persisting {vector.shape[0]}-d embedding to {self.dim}-d cache {self.path}")
+                    continue
+                if digest in self._offsets or digest in seen:
+                    continue
+                seen.add(digest)
+                data += digest
+                data += vector.astype("<f4", copy=False).tobytes()
+            if not data:
+                return
+
+            # One write per batch with O_APPEND, so concurrent workers never interleave
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, bytes(data))
+            finally:
+                os.close(fd)
+
+    def _create(self, dim: int) -> None:
+        """Write the header of a new file (or adopt one another worker just created)."""
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            self._open()
+            return
+        try:
+            os.write(fd, _HEADER.pack(_MAGIC, dim))
+        finally:
+            os.close(fd)
+        self.dim = dim
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+
+
+class EmbeddingCache:
+    """LRU of float32 embedding vectors with an optional memory-mapped disk tier."""
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = 4096,
+        disk_dir: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            namespace: Embedding deployment the vectors come from
+            max_entries: In-memory LRU capacity
+            disk_dir: Root directory for the persistent tier (None = memory only)
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._attributes = {"deployment": namespace}
+
+        self.disk: Optional[EmbeddingDiskStore] = None
+        if disk_dir:
+            safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", namespace)
+            try:
+                self.disk = EmbeddingDiskStore(Path(disk_dir) / safe_name / "embeddings.f32")
+                logger.info(f"Embedding cache disk tier: {self.disk.path} ({len(self.disk)} vectors)")
+            except OSError as exc:
+                logger.warning(f"Embedding cache disk tier unavailable: {exc}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Cached vector for ``text`` (memory first, then disk), or None."""
+        digest = embedding_key(text)
+        vector = self._entries.get(digest)
+        if vector is not None:
+            self._entries.move_to_end(digest)
+            embedding_cache_hits.add(1, {**self._attributes, "tier": "memory"})
+            return vector
+
+        if self.disk is not None:
+            try:
+                vector = self.disk.get(digest)
+            except (OSError, ValueError) as exc:
+                logger.warning(f"Embedding cache disk read failed: {exc}")
+                vector = None
+            if vector is not None:
+                self._insert(digest, vector)
+                embedding_cache_hits.add(1, {**self._attributes, "tier": "disk"})
+                return vector
+
+        embedding_cache_misses.add(1, self._attributes)
+        return None
+
+    def put(self, text: str, embedding) -> np.ndarray:
+        """Store a vector for ``text``; returns it as a float32 array."""
+        digest = embedding_key(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector.setflags(write=False)
+        self._insert(digest, vector)
+
+        if self.disk is not None:
+            try:
+                self.disk.append(digest, vector)
+            except OSError as exc:
+                logger.warning(f"Embedding cache disk write failed: {exc}")
+        return vector
+
+    async def put_many(self, items: Sequence[Tuple[str, Any]]) -> List[np.ndarray]:
+        """
+        Store vectors for many texts; returns them as float32 arrays.
+
+        The disk tier gets the whole batch in one append, written off the
+        event loop.
+        """
+        records = []
+        for text, embedding in items:
+            digest = embedding_key(text)
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector.setflags(write=False)
+            self._insert(digest, vector)
+            records.append((digest, vector))
+
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.append_many, records)
+            except OSError as exc:
+                logger.warning(f"Embedding cache disk write failed: {exc}")
+        return [vector for _, vector in records]
+
+    def clear(self) -> None:
+        """Drop the in-memory tier."""
+        self._entries.clear()
+
+    def _insert(self, digest: bytes, vector: np.ndarray) -> None:
+        self._entries[digest] = vector
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Global instance
+embedding_cache = EmbeddingCache(
+    namespace=settings.azure_openai_embedding_deployment,
+    max_entries=settings.embedding_cache_max_entries,
+    disk_dir=settings.embedding_cache_dir,
+)
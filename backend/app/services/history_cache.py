@@ -0,0 +1,260 @@
+"""
+Read-through cache of chat history pages.
+
+A history page (one conversation, one ``limit``/``cursor``) is cached as
+the exact JSON body the endpoint returns, together with its ETag, so a hit
+costs neither a query nor ``Message.to_dict()`` / JSON encoding, and a
+client holding the same ETag gets a 304.
+
+Pages live in an in-process LRU bounded by total body size. An optional
+shared backend (``RedisHistoryCacheBackend``, one hash per conversation)
+lets pods serve each other's pages. Writes to a conversation (message
+batches flushed by ``message_writer``, conversation deletes) invalidate
+all of its pages locally and in the shared backend, whatever the
+repository backend. Other pods'
+local copies are not notified: they expire after
+``history_cache_local_ttl_seconds``.
+"""
+
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class HistoryPage:
+    """Serialized history page and its entity tag."""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_body(cls, body: bytes) -> "HistoryPage":
+        return cls(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+    def to_bytes(self) -> bytes:
+        return self.etag.encode("ascii") + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HistoryPage":
+        etag, body = data.split(b"\n", 1)
+        return cls(body=body, etag=etag.decode("ascii"))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class HistoryCacheBackend(ABC):
+    """Shared storage for history pages, grouped by conversation."""
+
+    @abstractmethod
+    async def get(self, conversation_id: str, page: str) -> Optional[bytes]:
+        """Stored page, or None."""
+
+    @abstractmethod
+    async def set(self, conversation_id: str, page: str, value: bytes, ttl_seconds: float) -> None:
+        """Store a page; all pages of a conversation expire together."""
+
+    @abstractmethod
+    async def invalidate(self, conversation_id: str) -> None:
+        """Drop every page of a conversation."""
+
+    async def close(self) -> None:
+        """Release connections held by the backend."""
+
+
+class RedisHistoryCacheBackend(HistoryCacheBackend):
+    """
+    Pages shared by all pods through a Redis-compatible store.
+
+    One hash per conversation (field = page), so invalidation is a single
+    DEL. Store errors are logged and treated as misses.
+    """
+
+    def __init__(self, url: str, prefix: str = "history:") -> None:
+        # Imported lazily: only needed when the shared backend is configured
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+
+    async def get(self, conversation_id: str, page: str) -> Optional[bytes]:
+        try:
+            return await self._client.hget(self.prefix + conversation_id, page)
+        except Exception as exc:
+            logger.warning(f"History cache store unavailable: {exc}")
+            return None
+
+    async def set(self, conversation_id: str, page: str, value: bytes, ttl_seconds: float) -> None:
+        key = self.prefix + conversation_id
+        try:
+            async with self._client.pipeline(transaction=True) as pipe:
+                pipe.hset(key, page, value)
+                pipe.expire(key, max(1, int(ttl_seconds)))
+                await pipe.execute()
+        except Exception as exc:
+            logger.warning(f"History cache store unavailable: {exc}")
+
+    async def invalidate(self, conversation_id: str) -> None:
+        try:
+            await self._client.delete(self.prefix + conversation_id)
+        except Exception as exc:
+            logger.warning(f"History cache invalidation failed for {conversation_id}: {exc}")
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class HistoryCache:
+    """Size-bounded LRU of serialized history pages with an optional shared tier."""
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        local_ttl_seconds: float = 10.0,
+        ttl_seconds: float = 300.0,
+        shared: Optional[HistoryCacheBackend] = None,
+    ) -> None:
+        """
+        Args:
+            max_bytes: In-process tier size bound
+            local_ttl_seconds: Lifetime of in-process pages (bounds staleness
+                from writes made by other pods)
+            ttl_seconds: Lifetime of pages in the shared backend
+            shared: Shared backend (None = in-process only)
+        """
+        self.max_bytes = max_bytes
+        self.local_ttl_seconds = local_ttl_seconds
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[HistoryPage, float]]" = OrderedDict()
+        self._pages: Dict[str, Set[str]] = {}
+        self.total_bytes = 0
+
+        # Conversations being loaded, and those written to meanwhile: a
+        # load that raced a write must not be cached
+        self._loading: Dict[str, int] = {}
+        self._stale: Set[str] = set()
+
+    async def get(self, conversation_id: str, page: str) -> Optional[HistoryPage]:
+        """Cached page from memory, then the shared backend."""
+        cached = self._entries.get((conversation_id, page))
+        if cached is not None:
+            entry, expires_at = cached
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end((conversation_id, page))
+                return entry
+            self._remove(conversation_id, page)
+
+        if self.shared is None:
+            return None
+        data = await self.shared.get(conversation_id, page)
+        if data is None:
+            return None
+        try:
+            entry = HistoryPage.from_bytes(data)
+        except (ValueError, UnicodeDecodeError):
+            logger.warning(f"Discarding malformed history cache entry for {conversation_id}")
+            return None
+        self._insert(conversation_id, page, entry)
+        return entry
+
+    async def get_or_load(
+        self,
+        conversation_id: str,
+        page: str,
+        load: Callable[[], Awaitable[bytes]],
+    ) -> HistoryPage:
+        """Cached page, or ``load()`` it (the serialized body) and cache it."""
+        entry = await self.get(conversation_id, page)
+        if entry is not None:
+            return entry
+
+        self._loading[conversation_id] = self._loading.get(conversation_id, 0) + 1
+        try:
+            entry = HistoryPage.from_body(await load())
+            if conversation_id not in self._stale:
+                self._insert(conversation_id, page, entry)
+                if self.shared is not None:
+                    await self.shared.set(conversation_id, page, entry.to_bytes(), self.ttl_seconds)
+        finally:
+            self._loading[conversation_id] -= 1
+            if not self._loading[conversation_id]:
+                del self._loading[conversation_id]
+                self._stale.discard(conversation_id)
+        return entry
+
+    async def invalidate(self, conversation_id: str) -> None:
+        """Drop every cached page of a conversation (call after writing to it)."""
+        if conversation_id in self._loading:
+            self._stale.add(conversation_id)
+        for page in list(self._pages.get(conversation_id, ())):
+            self._remove(conversation_id, page)
+        if self.shared is not None:
+            await self.shared.invalidate(conversation_id)
+
+    def clear(self) -> None:
+        """Drop the in-process tier."""
+        self._entries.clear()
+        self._pages.clear()
+        self.total_bytes = 0
+
+    async def close(self) -> None:
+        if self.shared is not None:
+            await self.shared.close()
+
+    def _insert(self, conversation_id: str, page: str, entry: HistoryPage) -> None:
+        if len(entry.body) > self.max_bytes:
+            return
+        self._remove(conversation_id, page)
+        self._entries[(conversation_id, page)] = (entry, time.monotonic() + self.local_ttl_seconds)
+        self._pages.setdefault(conversation_id, set()).add(page)
+        self.total_bytes += len(entry.body)
+
+        while self.total_bytes > self.max_bytes:
+            oldest_conversation, oldest_page = next(iter(self._entries))
+            self._remove(oldest_conversation, oldest_page)
+
+    def _remove(self, conversation_id: str, page: str) -> None:
+        cached = self._entries.pop((conversation_id, page), None)
+        if cached is None:
+            return
+        self.total_bytes -= len(cached[0].body)
+        pages = self._pages[conversation_id]
+        pages.discard(page)
+        if not pages:
+            del self._pages[conversation_id]
+
+
+def build_history_cache_backend() -> Optional[HistoryCacheBackend]:
+    """Create the shared backend selected by ``HISTORY_CACHE_BACKEND``."""
+    if settings.history_cache_backend == "redis":
+        if not settings.history_cache_redis_url:
+            raise ValueError("HISTORY_CACHE_REDIS_URL is required when HISTORY_CACHE_BACKEND=redis")
+        return RedisHistoryCacheBackend(settings.history_cache_redis_url)
+    return None
+
+
+# Global instance
+history_cache = HistoryCache(
+    max_bytes=settings.history_cache_max_bytes,
+    local_ttl_seconds=settings.history_cache_local_ttl_seconds,
+    ttl_seconds=settings.history_cache_ttl_seconds,
+    shared=build_history_cache_backend() if settings.history_cache_enabled else None,
+)
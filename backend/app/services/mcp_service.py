@@ -182,8 +182,7 @@ class MCPService:
 
     Usage in chat_graph:
         mcp = MCPService(request.mcp_servers or [])
-        await mcp.initialize_all()
-        tools = await mcp.get_openai_tools()
+        tools = await mcp.discover_tools()
         # pass tools to Azure OpenAI call
         result = await mcp.execute_tool_call(tool_call)
         await mcp.close_all()
@@ -203,6 +202,18 @@ class MCPService:
             if isinstance(result, Exception):
                 logger.error(f"Failed to initialize MCP server {cfg.url}: {result}")
 
+    async def discover_tools(self) -> List[Dict[str, Any]]:
+        """
+        Initialize all servers and list their tools, servers in parallel.
+
+        Each server goes from its handshake straight to ``tools/list``, so
+        discovery takes as long as the slowest server rather than the
+        slowest handshake plus the slowest listing.
+        """
+        self._clients = [MCPServerClient(c) for c in self._configs]
+        # list_tools() performs the initialize handshake first
+        return await self.get_openai_tools()
+
     async def close_all(self) -> None:
         await asyncio.gather(*[c.aclose() for c in self._clients], return_exceptions=True)
         self._clients = []
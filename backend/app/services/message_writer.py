@@ -0,0 +1,190 @@
+"""
+Write-behind persistence for chat messages.
+
+Chat turns enqueue their messages here instead of writing them one by
+one. Queued messages from all requests are written together - one
+multi-row insert plus one counter update per conversation - when
+``message_write_batch_size`` messages are waiting or
+``message_write_flush_interval_ms`` after the first one was queued,
+whichever comes first. The queue is drained on shutdown.
+
+Messages are stamped with their id and timestamp when queued, so history
+order does not depend on when the batch is written. A message becomes
+visible to history reads once its batch is flushed, which also drops the
+cached history pages of the conversations it touched (for any repository
+backend).
+
+A batch that fails for a transient reason (database unavailable) is
+retried as a whole. A batch the database rejects because of its data
+(e.g. a NUL character in the content) is split until the offending
+messages are isolated; those are logged and dropped so they cannot block
+everything queued behind them.
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.repositories.base_repository import BaseRepository
+from app.repositories.factory import get_repository
+from app.services.history_cache import history_cache
+
+logger = get_logger(__name__)
+
+
+class MessageWriter:
+    """Queues message writes and flushes them to the repository in batches."""
+
+    def __init__(
+        self,
+        repository: BaseRepository,
+        batch_size: int = 200,
+        flush_interval_ms: float = 100.0,
+        max_pending: int = 10000,
+    ) -> None:
+        """
+        Args:
+            repository: Where batches are written (``save_messages``)
+            batch_size: Flush as soon as this many messages are queued
+            flush_interval_ms: Maximum time a message waits in the queue
+            max_pending: Queue bound; the oldest messages are dropped beyond
+                it (only reachable while the database keeps failing)
+        """
+        self.repository = repository
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending = max_pending
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def enqueue(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        thinking_steps: Optional[List[Dict[str, Any]]] = None,
+        usage: Optional[Dict[str, int]] = None,
+        user_id: Optional[str] = None,
+    ) -> None:
+        """
+        Queue a message for the next batch.
+
+        ``user_id`` (the conversation's owner) lets the repository recreate
+        the conversation if it was deleted before the batch is written.
+        Does not await, so it can be called while a stream is being cancelled.
+        """
+        self._queue.append({
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+            "role": role,
+            "content": content,
+            "thinking_steps": thinking_steps,
+            "usage": usage,
+            "timestamp": datetime.utcnow(),
+        })
+        self._trim()
+
+        if len(self._queue) >= self.batch_size:
+            self._schedule(0)
+        elif self._timer is None:
+            self._schedule(self.flush_interval)
+
+    async def flush(self) -> None:
+        """Write everything queued so far, in batches of ``batch_size``."""
+        async with self._lock:
+            while self._queue:
+                count = min(len(self._queue), self.batch_size)
+                batch = [self._queue.popleft() for _ in range(count)]
+                try:
+                    saved = await self._write(batch)
+                except Exception as exc:
+                    logger.error(f"Failed to write {len(batch)} messages, will retry: {exc}", exc_info=True)
+                    # Back to the front so order is kept; retried on the next trigger
+                    self._queue.extendleft(reversed(batch))
+                    self._trim()
+                    self._schedule(self.flush_interval)
+                    return
+                logger.debug(f"Wrote {saved} of {len(batch)} queued messages")
+                for conversation_id in {m["conversation_id"] for m in batch}:
+                    await history_cache.invalidate(conversation_id)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> int:
+        """
+        Save a batch, bisecting it to drop messages the database rejects.
+
+        Transient errors propagate (the caller retries the batch). Halves
+        already written before such an error are rejected as duplicates on
+        the retry and dropped here, so they are not written twice.
+        """
+        try:
+            return await self.repository.save_messages(batch)
+        # psycopg2 rejects NUL characters client-side with a plain ValueError
+        except (DataError, IntegrityError, ValueError) as exc:
+            if len(batch) == 1:
+                message = batch[0]
+                logger.error(
+                    f"Dropping message {message['id']} ({message['role']}) for conversation "
+                    f"{message['conversation_id']}: rejected by the database: {exc}"
+                )
+                return 0
+            middle = len(batch) // 2
+            return await self._write(batch[:middle]) + await self._write(batch[middle:])
+
+    def _schedule(self, delay: float) -> None:
+        if delay <= 0:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._start_flush()
+
+    def _start_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+        # A running flush keeps draining until the queue is empty
+
+    def _trim(self) -> None:
+        dropped = 0
+        while len(self._queue) > self.max_pending:
+            self._queue.popleft()
+            dropped += 1
+        if dropped:
+            logger.error(f"Message write queue full; dropped {dropped} oldest messages")
+
+    async def close(self) -> None:
+        """Drain the queue (call on shutdown)."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None:
+            await asyncio.shield(self._flush_task)
+        await self.flush()
+        if self._queue:
+            logger.error(f"Shutting down with {len(self._queue)} unwritten messages")
+
+
+# Global instance
+message_writer = MessageWriter(
+    get_repository(),
+    batch_size=settings.message_write_batch_size,
+    flush_interval_ms=settings.message_write_flush_interval_ms,
+    max_pending=settings.message_write_max_pending,
+)
@@ -1,10 +1,17 @@
-from openai import AsyncAzureOpenAI
+from openai import AsyncAzureOpenAI, BadRequestError, NotFoundError
 from azure.identity import DefaultAzureCredential, get_bearer_token_provider
-from typing import AsyncGenerator, Callable, List, Dict, Any, Optional
+from typing import AsyncGenerator, Callable, List, Dict, Any, Optional, Tuple
+import asyncio
 import json
+import time
 from app.core.config import settings
 from app.core.logging import get_logger
 from app.models.schemas import ThinkingStep, StreamChunk, StreamChunkType
+from app.services.admission import Priority, Ticket, admission_controller
+from app.services.deployment_pool import Backend, build_deployment_pool
+from app.services.embedding_batcher import EmbeddingCoalescer, pack_batches
+from app.services.embedding_cache import embedding_cache
+from app.utils.streaming import FastChunk
 from app.utils.tracing import trace_llm_call, trace_tool_call, set_gen_ai_content_attributes
 
 logger = get_logger(__name__)
@@ -35,6 +42,16 @@ class OpenAIService:
         self.mini_deployment_name = settings.azure_openai_mini_deployment_name
         self.mini_model = settings.azure_openai_mini_model
 
+        # Routes each call to a healthy, least-loaded deployment of the model
+        self.pool = build_deployment_pool(token_provider, default_client=self.client)
+
+        # Merges concurrent single-query embedding calls into one request
+        self.embedding_coalescer = EmbeddingCoalescer(
+            self._embed_uncached,
+            window_ms=settings.embedding_coalesce_window_ms,
+            max_batch=settings.embedding_coalesce_max_batch,
+        )
+
         logger.info(f"OpenAI Service initialized (Responses API) with managed identity, model: {self.model}")
         logger.info(f"Mini model: {self.mini_model}, Endpoint: {azure_endpoint}, API Version: {settings.azure_openai_api_version}")
 
@@ -60,11 +77,11 @@ class OpenAIService:
     # Streaming (Responses API)
     # ------------------------------------------------------------------
 
-    def _resolve_deployment(self, model_id: str) -> str:
-        """Map a model ID string to the correct Azure deployment name."""
-        if model_id == "gpt-5-mini":
-            return self.mini_deployment_name
-        return self.deployment_name
+    def _resolve_model(self, model_id: str) -> str:
+        """Map a requested model ID to a logical model served by the pool."""
+        if self.pool.has_model(model_id):
+            return model_id
+        return self.model
 
     async def stream_chat_with_thinking(
         self,
@@ -76,6 +93,7 @@ class OpenAIService:
         tools: Optional[List[Dict[str, Any]]] = None,
         tool_executor: Optional[Any] = None,
         model_id: str = "gpt-5.2",
+        priority: Priority = Priority.CHAT,
     ) -> AsyncGenerator[StreamChunk, None]:
         """
         Stream responses with visible thinking/reasoning using the Responses API.
@@ -88,14 +106,31 @@ class OpenAIService:
             max_completion_tokens: Maximum tokens to generate
             tools: Optional list of OpenAI-format tool definitions (from MCP servers)
             tool_executor: Callable[str, Dict] -> str for executing tool calls
+            priority: Admission priority class when the model is at capacity
 
         Yields:
-            StreamChunk: Chunks of type 'thinking', 'content', 'done', or 'error'
+            StreamChunk: Chunks of type 'queued', 'thinking', 'content', 'done', or 'error'
+            (per-token deltas are emitted as lightweight FastChunk objects)
         """
+        tool_tasks: List[asyncio.Task] = []
+        stream = None
+        stream_backend: Optional[Backend] = None
+        ticket: Optional[Ticket] = None
         try:
-            deployment = self._resolve_deployment(model_id)
+            pool_model = self._resolve_model(model_id)
+
+            # Wait for an in-flight slot; tell the client it is queued
+            ticket = admission_controller.enqueue(pool_model, priority)
+            if not ticket.admitted:
+                yield StreamChunk(
+                    type=StreamChunkType.QUEUED,
+                    content="",
+                    metadata={"position": ticket.position, "model": model_id},
+                )
+                await ticket.wait(admission_controller.queue_timeout_seconds)
+
             logger.info(
-                f"Starting Responses API stream: model={model_id} ({deployment}), "
+                f"Starting Responses API stream: model={model_id} ({pool_model}), "
                 f"thinking={show_thinking}, effort={reasoning_effort}, "
                 f"verbosity={verbosity}, tools={len(tools) if tools else 0}"
             )
@@ -117,9 +152,30 @@ class OpenAIService:
                     for t in tools
                 ]
 
+            # Eager mode starts each tool call as soon as the model finishes
+            # emitting it, overlapping tool latency with the rest of the stream
+            eager_tools = settings.tool_call_eager_dispatch and tool_executor is not None
+
+            # Chained mode stores each response server-side and sends only the
+            # new tool outputs with previous_response_id on later rounds.
+            # input_items always keeps the full transcript for fallback.
+            chain_rounds = settings.responses_chain_tool_rounds
+            previous_response_id: Optional[str] = None
+            chain_backend: Optional[Backend] = None
+
+            # Real token usage from each round's response.usage, summed
+            usage_totals = self._empty_usage()
+            round_input = input_items
+
+            # Reasoning summary parts seen so far, across all rounds
+            step_number = 0
+
             # Tool-call loop: run until model stops requesting tools
             max_tool_rounds = 10
             for _round in range(max_tool_rounds):
+                semaphore = asyncio.Semaphore(max(1, settings.tool_call_max_concurrency))
+                tool_tasks = []
+
                 # Trace LLM API call
                 with trace_llm_call(
                     model=model_id,
@@ -132,8 +188,7 @@ class OpenAIService:
                     round=_round + 1,
                 ) as llm_span:
                     create_kwargs: Dict[str, Any] = dict(
-                        model=deployment,
-                        input=input_items,
+                        input=round_input,
                         stream=True,
                         max_output_tokens=max_completion_tokens,
                         reasoning=reasoning,
@@ -141,6 +196,10 @@ class OpenAIService:
                     )
                     if openai_tools:
                         create_kwargs["tools"] = openai_tools
+                    if chain_rounds:
+                        create_kwargs["store"] = True
+                        if previous_response_id:
+                            create_kwargs["previous_response_id"] = previous_response_id
 
                     # Set opt-in input attributes before the API call
                     set_gen_ai_content_attributes(
@@ -149,13 +208,20 @@ class OpenAIService:
                         tools=openai_tools,
                     )
 
-                    stream = await self.client.responses.create(**create_kwargs)
+                    stream_backend, stream = await self._create_response_stream(
+                        pool_model, create_kwargs, input_items, chain_backend
+                    )
+                    chain_backend = stream_backend
+                    if llm_span and llm_span.is_recording():
+                        llm_span.set_attribute("llm.backend", stream_backend.name)
 
-                    step_number = 0
+                    thinking_steps = 0
+                    summary_part = None
                     tool_calls_this_round: List[Dict[str, Any]] = []
                     current_tool_call: Optional[Dict[str, Any]] = None
-                    total_thinking_tokens = 0
-                    total_content_tokens = 0
+                    thinking_chars = 0
+                    content_chars = 0
+                    round_usage: Optional[Dict[str, int]] = None
                     full_response_content = ""  # accumulated for gen_ai.output.messages
 
                     async for event in stream:
@@ -163,22 +229,24 @@ class OpenAIService:
 
                         # Reasoning / thinking tokens
                         if event_type == "response.reasoning_summary_text.delta":
-                            step_number += 1
-                            total_thinking_tokens += len(event.delta)
+                            thinking_chars += len(event.delta)
                             
-                            yield StreamChunk(
-                                type=StreamChunkType.THINKING,
-                                content=event.delta,
-                            )
+                            # Only the first delta of each summary part carries
+                            # its step number; the rest stay mergeable
+                            part = (getattr(event, "item_id", None), getattr(event, "summary_index", 0))
+                            if part != summary_part:
+                                summary_part = part
+                                step_number += 1
+                                thinking_steps += 1
+                                yield FastChunk(StreamChunkType.THINKING, event.delta, {"step_number": step_number})
+                            else:
+                                yield FastChunk(StreamChunkType.THINKING, event.delta)
 
                         # Output text tokens
                         elif event_type == "response.output_text.delta":
-                            total_content_tokens += len(event.delta)
+                            content_chars += len(event.delta)
                             full_response_content += event.delta
-                            yield StreamChunk(
-                                type=StreamChunkType.CONTENT,
-                                content=event.delta,
-                            )
+                            yield FastChunk(StreamChunkType.CONTENT, event.delta)
 
                         # Tool call accumulation
                         elif event_type == "response.output_item.added":
@@ -199,18 +267,39 @@ class OpenAIService:
                             if item and getattr(item, "type", None) == "function_call" and current_tool_call:
                                 current_tool_call["arguments"] = getattr(item, "arguments", current_tool_call["arguments"])
                                 tool_calls_this_round.append(current_tool_call)
+                                if eager_tools:
+                                    tool_tasks.append(asyncio.create_task(
+                                        self._execute_tool_call(current_tool_call, tool_executor, semaphore)
+                                    ))
                                 current_tool_call = None
 
-                        # Stream complete
-                        elif event_type == "response.completed":
+                        # Stream complete (incomplete = stopped at max_output_tokens)
+                        elif event_type in ("response.completed", "response.incomplete"):
+                            response = getattr(event, "response", None)
+                            previous_response_id = getattr(response, "id", None)
+                            round_usage = self._usage_from_response(response)
                             break
+
+                    self.pool.release(stream_backend)
+                    await self._close_stream(stream)
+                    stream = None
                     
-                    # Add token counts to span
+                    if round_usage is not None:
+                        for key, value in round_usage.items():
+                            usage_totals[key] += value
+
+                    # Add token usage and stream sizes to span
                     if llm_span and llm_span.is_recording():
-                        llm_span.set_attribute("llm.thinking_tokens", total_thinking_tokens)
-                        llm_span.set_attribute("llm.content_tokens", total_content_tokens)
-                        llm_span.set_attribute("llm.thinking_steps", step_number)
+                        if round_usage is not None:
+                            llm_span.set_attribute("gen_ai.usage.input_tokens", round_usage["input_tokens"])
+                            llm_span.set_attribute("gen_ai.usage.output_tokens", round_usage["output_tokens"])
+                            llm_span.set_attribute("llm.usage.reasoning_tokens", round_usage["reasoning_tokens"])
+                            llm_span.set_attribute("llm.usage.cached_input_tokens", round_usage["cached_input_tokens"])
+                        llm_span.set_attribute("llm.thinking_chars", thinking_chars)
+                        llm_span.set_attribute("llm.content_chars", content_chars)
+                        llm_span.set_attribute("llm.thinking_steps", thinking_steps)
                         llm_span.set_attribute("llm.tool_calls", len(tool_calls_this_round))
+                        llm_span.set_attribute("llm.chained", "previous_response_id" in create_kwargs)
 
                     # Set opt-in output attributes after the stream completes
                     finish_reason = "tool_calls" if tool_calls_this_round else "stop"
@@ -225,57 +314,240 @@ class OpenAIService:
                 if not tool_calls_this_round or not tool_executor:
                     break
 
-                # Execute all tool calls and feed results back
-                for tc in tool_calls_this_round:
-                    fn_name = tc["name"]
-                    try:
-                        fn_args = json.loads(tc["arguments"]) if tc["arguments"] else {}
-                    except json.JSONDecodeError:
-                        fn_args = {}
-
-                    logger.info(f"Executing tool call: {fn_name}({fn_args})")
-
-                    # Emit a thinking chunk so the user sees tool activity
-                    yield StreamChunk(
-                        type=StreamChunkType.THINKING,
-                        content=f"[Tool call] {fn_name}({json.dumps(fn_args)})",
-                        metadata={"tool_name": fn_name, "tool_call_id": tc["id"]},
-                    )
-
-                    # Trace tool execution
-                    with trace_tool_call(fn_name, **fn_args) as tool_span:
-                        try:
-                            tool_result = await tool_executor(fn_name, fn_args)
-                            if tool_span and tool_span.is_recording():
-                                result_preview = str(tool_result)[:200] if tool_result else ""
-                                tool_span.set_attribute("tool.result_preview", result_preview)
-                                tool_span.set_attribute("tool.success", True)
-                        except Exception as exc:
-                            tool_result = f"Error: {exc}"
-                            if tool_span and tool_span.is_recording():
-                                tool_span.set_attribute("tool.success", False)
-                                tool_span.set_attribute("tool.error", str(exc))
-
-                    # Append assistant tool_call + tool result to input for next round
+                # Execute this round's tool calls concurrently (unless already
+                # dispatched eagerly) and feed results back
+                if not eager_tools:
+                    tool_tasks = [
+                        asyncio.create_task(self._execute_tool_call(tc, tool_executor, semaphore))
+                        for tc in tool_calls_this_round
+                    ]
+
+                # Report progress in completion order
+                for completed, next_done in enumerate(asyncio.as_completed(tool_tasks), start=1):
+                    outcome = await next_done
+                    yield self._tool_progress_chunk(outcome, completed, len(tool_tasks))
+
+                # Append tool_call + tool result to input in the original call order
+                tool_outputs: List[Dict[str, Any]] = []
+                for tc, task in zip(tool_calls_this_round, tool_tasks):
+                    outcome = task.result()
                     input_items.append({
                         "type": "function_call",
                         "call_id": tc["id"],
-                        "name": fn_name,
+                        "name": tc["name"],
                         "arguments": tc["arguments"],
                     })
-                    input_items.append({
+                    tool_output = {
                         "type": "function_call_output",
                         "call_id": tc["id"],
-                        "output": str(tool_result),
-                    })
+                        "output": str(outcome["output"]),
+                    }
+                    input_items.append(tool_output)
+                    tool_outputs.append(tool_output)
+
+                # The stored response already holds the function_call items
+                round_input = tool_outputs if chain_rounds and previous_response_id else input_items
+
+            # Summed usage for the whole call (all tool rounds)
+            yield StreamChunk(
+                type=StreamChunkType.DONE,
+                content="",
+                metadata={"usage": usage_totals},
+            )
 
         except Exception as e:
             logger.error(f"Error in Responses API streaming: {e}", exc_info=True)
+            if stream is not None:
+                # Broke mid-stream: steer the next requests elsewhere for a while
+                self.pool.mark_failed(stream_backend)
             yield StreamChunk(
                 type=StreamChunkType.ERROR,
                 content=str(e),
                 metadata={"error_type": type(e).__name__},
             )
+        finally:
+            # Don't leave tool calls running once the stream is abandoned
+            for task in tool_tasks:
+                if not task.done():
+                    task.cancel()
+            # Closing the HTTP response is what makes Azure OpenAI stop
+            # generating (and billing) when the client has gone away
+            if ticket is not None:
+                ticket.cancel()
+            if stream is not None:
+                self.pool.release(stream_backend)
+                await self._close_stream(stream)
+
+    @staticmethod
+    def _empty_usage() -> Dict[str, int]:
+        return {
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "output_tokens": 0,
+            "reasoning_tokens": 0,
+            "total_tokens": 0,
+        }
+
+    @classmethod
+    def _usage_from_response(cls, response: Any) -> Optional[Dict[str, int]]:
+        """Read token usage from a completed Responses API response."""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return None
+        input_details = getattr(usage, "input_tokens_details", None)
+        output_details = getattr(usage, "output_tokens_details", None)
+        counts = cls._empty_usage()
+        counts["input_tokens"] = getattr(usage, "input_tokens", 0) or 0
+        counts["cached_input_tokens"] = getattr(input_details, "cached_tokens", 0) or 0
+        counts["output_tokens"] = getattr(usage, "output_tokens", 0) or 0
+        counts["reasoning_tokens"] = getattr(output_details, "reasoning_tokens", 0) or 0
+        counts["total_tokens"] = (
+            getattr(usage, "total_tokens", 0) or counts["input_tokens"] + counts["output_tokens"]
+        )
+        return counts
+
+    @staticmethod
+    async def _close_stream(stream: Any) -> None:
+        """
+        Close a Responses API stream and release its HTTP connection.
+
+        Shielded so the close completes even when called from a task that
+        is being cancelled (client disconnect).
+        """
+        try:
+            await asyncio.shield(stream.close())
+        except Exception as exc:
+            logger.debug(f"Error closing Responses API stream: {exc}")
+
+    async def _create_response_stream(
+        self,
+        model: str,
+        create_kwargs: Dict[str, Any],
+        full_input: List[Dict[str, Any]],
+        chain_backend: Optional[Backend] = None,
+    ) -> Tuple[Backend, Any]:
+        """
+        Open a Responses API stream on the best backend for ``model``.
+
+        Chained rounds stay on ``chain_backend`` (which stores the previous
+        response) while it is healthy. On another backend, or when the
+        chained ``previous_response_id`` is no longer available (expired or
+        deleted), the full transcript is sent instead.
+
+        Returns:
+            (backend, stream); the backend stays counted as in flight until
+            released via ``self.pool.release``
+        """
+        async def open_stream(backend: Backend) -> Any:
+            kwargs = dict(create_kwargs, model=backend.deployment)
+            previous_response_id = kwargs.get("previous_response_id")
+            if previous_response_id and backend is not chain_backend:
+                logger.info(f"Chained round moved to {backend.name}; resending full transcript")
+                kwargs.pop("previous_response_id")
+                kwargs["input"] = full_input
+                previous_response_id = None
+            try:
+                return await backend.client.responses.create(**kwargs)
+            except (NotFoundError, BadRequestError) as exc:
+                if not previous_response_id:
+                    raise
+                logger.warning(
+                    f"Chained response {previous_response_id} unavailable ({exc}); "
+                    "resending full transcript"
+                )
+                kwargs.pop("previous_response_id")
+                kwargs["input"] = full_input
+                return await backend.client.responses.create(**kwargs)
+
+        return await self.pool.call(model, open_stream, preferred=chain_backend)
+
+    # ------------------------------------------------------------------
+    # Tool execution
+    # ------------------------------------------------------------------
+
+    async def _execute_tool_call(
+        self,
+        tc: Dict[str, Any],
+        tool_executor: Callable,
+        semaphore: asyncio.Semaphore,
+    ) -> Dict[str, Any]:
+        """
+        Execute a single tool call under the round's concurrency cap.
+
+        Never raises: executor errors and timeouts are turned into an
+        ``Error: ...`` output so the model can see what went wrong.
+
+        Returns:
+            Dict with the call, parsed args, output, success flag and duration
+        """
+        fn_name = tc["name"]
+        try:
+            fn_args = json.loads(tc["arguments"]) if tc["arguments"] else {}
+        except json.JSONDecodeError:
+            fn_args = {}
+
+        async with semaphore:
+            logger.info(f"Executing tool call: {fn_name}({fn_args})")
+            timeout = settings.tool_call_timeout_seconds
+            start = time.perf_counter()
+
+            # Trace tool execution
+            with trace_tool_call(fn_name, **fn_args) as tool_span:
+                try:
+                    tool_result = await asyncio.wait_for(
+                        tool_executor(fn_name, fn_args), timeout=timeout
+                    )
+                    success = True
+                    if tool_span and tool_span.is_recording():
+                        result_preview = str(tool_result)[:200] if tool_result else ""
+                        tool_span.set_attribute("tool.result_preview", result_preview)
+                        tool_span.set_attribute("tool.success", True)
+                except asyncio.TimeoutError:
+                    tool_result = f"Error: tool call timed out after {timeout}s"
+                    success = False
+                    logger.warning(f"Tool call {fn_name} timed out after {timeout}s")
+                    if tool_span and tool_span.is_recording():
+                        tool_span.set_attribute("tool.success", False)
+                        tool_span.set_attribute("tool.error", "timeout")
+                except Exception as exc:
+                    tool_result = f"Error: {exc}"
+                    success = False
+                    if tool_span and tool_span.is_recording():
+                        tool_span.set_attribute("tool.success", False)
+                        tool_span.set_attribute("tool.error", str(exc))
+
+            duration_ms = (time.perf_counter() - start) * 1000
+
+        return {
+            "call": tc,
+            "args": fn_args,
+            "output": tool_result,
+            "success": success,
+            "duration_ms": duration_ms,
+        }
+
+    @staticmethod
+    def _tool_progress_chunk(
+        outcome: Dict[str, Any], completed: int, total: int
+    ) -> StreamChunk:
+        """Build the thinking chunk that reports a finished tool call."""
+        tc = outcome["call"]
+        status = "" if outcome["success"] else " failed"
+        return StreamChunk(
+            type=StreamChunkType.THINKING,
+            content=(
+                f"[Tool call] {tc['name']}({json.dumps(outcome['args'])})"
+                f"{status} ({completed}/{total})"
+            ),
+            metadata={
+                "tool_name": tc["name"],
+                "tool_call_id": tc["id"],
+                "tool_success": outcome["success"],
+                "tool_duration_ms": round(outcome["duration_ms"], 1),
+                "tool_calls_completed": completed,
+                "tool_calls_total": total,
+            },
+        )
 
     # ------------------------------------------------------------------
     # Non-streaming (Responses API)
@@ -286,7 +558,8 @@ class OpenAIService:
         messages: List[Dict[str, str]],
         reasoning_effort: str = "medium",
         verbosity: str = "medium",
-        max_completion_tokens: int = 16000
+        max_completion_tokens: int = 16000,
+        priority: Priority = Priority.CHAT
     ) -> Dict[str, Any]:
         """
         Non-streaming completion via the Responses API.
@@ -296,21 +569,30 @@ class OpenAIService:
             reasoning_effort: Reasoning effort level
             verbosity: Text output verbosity
             max_completion_tokens: Maximum tokens
+            priority: Admission priority class when the model is at capacity
 
         Returns:
             Completion response with content and usage
         """
+        ticket: Optional[Ticket] = None
         try:
+            ticket = admission_controller.enqueue(self.model, priority)
+            await ticket.wait(admission_controller.queue_timeout_seconds)
+
             input_items = self._messages_to_response_input(messages)
 
-            response = await self.client.responses.create(
-                model=self.deployment_name,
-                input=input_items,
-                max_output_tokens=max_completion_tokens,
-                stream=False,
-                reasoning={"effort": reasoning_effort, "summary": "auto"},
-                text={"verbosity": verbosity},
-            )
+            async def create(backend: Backend) -> Any:
+                return await backend.client.responses.create(
+                    model=backend.deployment,
+                    input=input_items,
+                    max_output_tokens=max_completion_tokens,
+                    stream=False,
+                    reasoning={"effort": reasoning_effort, "summary": "auto"},
+                    text={"verbosity": verbosity},
+                )
+
+            backend, response = await self.pool.call(self.model, create)
+            self.pool.release(backend)
 
             # Extract the first output message text
             content = ""
@@ -333,6 +615,9 @@ class OpenAIService:
         except Exception as e:
             logger.error(f"Error in Responses API completion: {e}", exc_info=True)
             raise
+        finally:
+            if ticket is not None:
+                ticket.cancel()
 
     # ------------------------------------------------------------------
     # Embeddings (unchanged — no Responses API equivalent)
@@ -342,24 +627,83 @@ class OpenAIService:
         """
         Create embedding vector for text (for RAG).
 
+        Repeated inputs are served from the embedding cache without a call
+        to Azure OpenAI. Concurrent calls (e.g. a burst of RAG queries) are
+        coalesced into one request.
+
         Args:
             text: Text to embed
 
         Returns:
             Embedding vector
         """
-        try:
-            response = await self.client.embeddings.create(
-                model=settings.azure_openai_embedding_deployment,
-                input=text
-            )
+        if settings.embedding_cache_enabled:
+            cached = embedding_cache.get(text)
+            if cached is not None:
+                return cached.tolist()
 
-            return response.data[0].embedding
+        try:
+            if settings.embedding_coalesce_window_ms > 0:
+                return await self.embedding_coalescer.embed(text)
+            return (await self._embed_uncached([text]))[0]
 
         except Exception as e:
             logger.error(f"Error creating embedding: {e}", exc_info=True)
             raise
 
+    async def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Create embedding vectors for many texts (e.g. document chunks).
+
+        Cached and duplicate inputs are not sent; the rest are packed into
+        as few requests as the deployment's input and token limits allow.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding vector per text, in order
+        """
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        for index, text in enumerate(texts):
+            if settings.embedding_cache_enabled and text not in missing:
+                cached = embedding_cache.get(text)
+                if cached is not None:
+                    vectors[index] = cached.tolist()
+                    continue
+            missing.setdefault(text, []).append(index)
+
+        if missing:
+            try:
+                embedded = await self._embed_uncached(list(missing))
+            except Exception as e:
+                logger.error(f"Error creating embeddings: {e}", exc_info=True)
+                raise
+            for (text, indices), vector in zip(missing.items(), embedded):
+                for index in indices:
+                    vectors[index] = vector
+
+        return vectors
+
+    async def _embed_uncached(self, texts: List[str]) -> List[List[float]]:
+        """Call the embeddings API in request-sized batches and cache the results."""
+        vectors: List[List[float]] = []
+        for batch in pack_batches(
+            texts,
+            max_inputs=settings.embedding_batch_max_inputs,
+            max_tokens=settings.embedding_batch_max_tokens,
+        ):
+            response = await self.client.embeddings.create(
+                model=settings.azure_openai_embedding_deployment,
+                input=batch
+            )
+            embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            if settings.embedding_cache_enabled:
+                await embedding_cache.put_many(list(zip(batch, embeddings)))
+            vectors.extend(embeddings)
+        return vectors
+
 
 # Global instance
 openai_service = OpenAIService()
@@ -0,0 +1,246 @@
+"""
+Exact-match SSE replay cache for chat completions.
+
+Deterministic requests (same messages, model, reasoning effort, verbosity,
+max tokens and tool set) are keyed by a canonical SHA-256 hash. A completed
+stream is stored as its ordered list of pre-encoded SSE frames plus the
+final ``done`` metadata, so a repeat request is replayed in a single write
+without touching Azure OpenAI.
+
+The in-memory tier is an LRU bounded by total encoded size. An optional
+on-disk tier (one JSON file per key) survives restarts and memory eviction;
+expired files are deleted when a lookup finds them, and writes sweep the
+directory for files older than the TTL at most every ``DISK_SWEEP_INTERVAL``
+seconds.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.schemas import ChatRequest
+
+logger = get_logger(__name__)
+
+# Minimum seconds between disk sweeps (the TTL caps it for short TTLs)
+DISK_SWEEP_INTERVAL = 300.0
+
+
+@dataclass
+class ReplayEntry:
+    """A completed chat stream ready for replay."""
+    frames: List[bytes]
+    done_metadata: Dict[str, Any]
+    assistant_content: str
+    thinking_steps: Optional[List[Dict[str, Any]]] = None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def size_bytes(self) -> int:
+        """Approximate memory footprint used for capacity accounting."""
+        size = sum(len(frame) for frame in self.frames) + len(self.assistant_content)
+        if self.thinking_steps:
+            size += sum(len(step.get("reasoning", "")) for step in self.thinking_steps)
+        return size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frames": [frame.decode("utf-8") for frame in self.frames],
+            "done_metadata": self.done_metadata,
+            "assistant_content": self.assistant_content,
+            "thinking_steps": self.thinking_steps,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReplayEntry":
+        frames = [frame.encode("utf-8") for frame in data.pop("frames")]
+        return cls(frames=frames, **data)
+
+
+def replay_cache_key(request: ChatRequest) -> str:
+    """Canonical hash of every request field that affects the model output."""
+    mcp_servers = sorted(
+        (
+            {
+                "url": server.url,
+                "transport": server.transport.value,
+                # Different credentials may expose different tools / data
+                "auth": hashlib.sha256(server.api_key.encode("utf-8")).hexdigest()
+                if server.api_key else None,
+            }
+            for server in request.mcp_servers or []
+        ),
+        key=lambda server: (server["url"], server["transport"]),
+    )
+    canonical = {
+        "messages": [
+            {"role": msg.role.value, "content": msg.content} for msg in request.messages
+        ],
+        "model": request.model.value,
+        "reasoning_effort": request.reasoning_effort.value,
+        "verbosity": request.verbosity.value,
+        "max_tokens": request.max_tokens,
+        "show_thinking": request.show_thinking,
+        "web_search": request.enable_web_search,
+        "mcp_servers": mcp_servers,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ReplayCache:
+    """Size-bounded LRU of completed SSE streams with an optional disk tier."""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 3600.0,
+        disk_dir: Optional[str] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+
+        self._entries: "OrderedDict[str, ReplayEntry]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.total_bytes = 0
+        self._last_sweep = 0.0
+
+    async def get(self, key: str) -> Optional[ReplayEntry]:
+        """Return a live entry from memory, falling back to disk."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._expired(entry):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+        if self.disk_dir is None:
+            return None
+
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            await asyncio.to_thread(self._delete_disk, key)
+            return None
+
+        # Promote to the memory tier
+        self._insert(key, entry)
+        return entry
+
+    async def put(self, key: str, entry: ReplayEntry) -> None:
+        """Store a completed stream in memory and (if configured) on disk."""
+        if entry.size_bytes > self.max_bytes:
+            logger.debug(f"Replay entry too large to cache ({entry.size_bytes} bytes)")
+            return
+
+        self._insert(key, entry)
+
+        if self.disk_dir is not None:
+            try:
+                await asyncio.to_thread(self._write_disk, key, entry)
+            except OSError as exc:
+                logger.warning(f"Failed to persist replay cache entry: {exc}")
+
+            now = time.time()
+            if now - self._last_sweep >= min(DISK_SWEEP_INTERVAL, self.ttl_seconds):
+                self._last_sweep = now
+                removed = await asyncio.to_thread(self._sweep_disk)
+                if removed:
+                    logger.debug(f"Swept {removed} expired replay cache files")
+
+    def clear(self) -> None:
+        """Drop the in-memory tier."""
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    # ── memory tier ────────────────────────────
+
+    def _insert(self, key: str, entry: ReplayEntry) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+        size = entry.size_bytes
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self.total_bytes += size
+
+        while self.total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self.total_bytes -= self._sizes.pop(key, 0)
+
+    def _expired(self, entry: ReplayEntry) -> bool:
+        return time.time() - entry.created_at > self.ttl_seconds
+
+    # ── disk tier ──────────────────────────────
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[ReplayEntry]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return ReplayEntry.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as exc:
+            logger.warning(f"Discarding unreadable replay cache file {path}: {exc}")
+            self._delete_disk(key)
+            return None
+
+    def _write_disk(self, key: str, entry: ReplayEntry) -> None:
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry.to_dict(), f, ensure_ascii=False)
+        # Atomic rename so concurrent readers never see a partial file
+        os.replace(tmp_path, path)
+
+    def _delete_disk(self, key: str) -> None:
+        try:
+            self._disk_path(key).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning(f"Failed to delete replay cache file: {exc}")
+
+    def _sweep_disk(self) -> int:
+        """Delete files (including orphaned temp files) older than the TTL."""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for path in self.disk_dir.glob("*/*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                # Already gone (another pod swept it) or not removable
+                continue
+        return removed
+
+
+# Global instance
+replay_cache = ReplayCache(
+    max_bytes=settings.replay_cache_max_bytes,
+    ttl_seconds=settings.replay_cache_ttl_seconds,
+    disk_dir=settings.replay_cache_dir,
+)
@@ -1,13 +1,37 @@
+import json
 from azure.search.documents.aio import SearchClient
 from azure.search.documents.models import VectorizedQuery
 from azure.core.credentials import AzureKeyCredential
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
 from app.core.config import settings
 from app.core.logging import get_logger
 from app.services.openai_service import openai_service
 
 logger = get_logger(__name__)
 
+# Azure AI Search rejects upload batches over 1000 documents or 16 MB
+MAX_UPLOAD_DOCUMENTS = 1000
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+
+
+def upload_chunks(
+    documents: List[Dict[str, Any]],
+    max_documents: int = MAX_UPLOAD_DOCUMENTS,
+    max_bytes: int = MAX_UPLOAD_BYTES
+) -> Iterator[List[Dict[str, Any]]]:
+    """Split documents into upload batches within the service's count and size limits."""
+    chunk: List[Dict[str, Any]] = []
+    size = 0
+    for document in documents:
+        document_size = len(json.dumps(document, separators=(",", ":")).encode("utf-8"))
+        if chunk and (len(chunk) >= max_documents or size + document_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(document)
+        size += document_size
+    if chunk:
+        yield chunk
+
 
 class SearchService:
     """Azure AI Search service for RAG (Retrieval Augmented Generation)."""
@@ -166,6 +190,54 @@ class SearchService:
         except Exception as e:
             logger.error(f"Error indexing document {doc_id}: {e}", exc_info=True)
             return False
+    
+    async def index_documents(
+        self,
+        documents: List[Dict[str, Any]]
+    ) -> Dict[str, bool]:
+        """
+        Index many documents (e.g. the chunks of one file) in bulk.
+        
+        All contents are embedded with batched embedding requests and
+        uploaded in as few calls as the service's batch limits allow; a
+        failed upload only fails the documents it carried.
+        
+        Args:
+            documents: Dicts with ``id``, ``content``, ``title`` and optional ``metadata``
+        
+        Returns:
+            Success status per document ID
+        """
+        try:
+            embeddings = await openai_service.create_embeddings(
+                [doc["content"] for doc in documents]
+            )
+        except Exception as e:
+            logger.error(f"Error embedding {len(documents)} documents: {e}", exc_info=True)
+            return {doc["id"]: False for doc in documents}
+        
+        batch = [
+            {
+                "id": doc["id"],
+                "content": doc["content"],
+                "title": doc["title"],
+                "contentVector": embedding,
+                "metadata": doc.get("metadata") or {}
+            }
+            for doc, embedding in zip(documents, embeddings)
+        ]
+        
+        statuses: Dict[str, bool] = {}
+        for chunk in upload_chunks(batch):
+            try:
+                results = await self.client.upload_documents(documents=chunk)
+                statuses.update({result.key: result.succeeded for result in results})
+            except Exception as e:
+                logger.error(f"Error uploading {len(chunk)} documents: {e}", exc_info=True)
+                statuses.update({doc["id"]: False for doc in chunk})
+        
+        logger.info(f"Indexed {sum(statuses.values())} of {len(batch)} documents")
+        return statuses
 
 
 # Global instance
@@ -0,0 +1,194 @@
+"""
+Semantic response cache for chat completions.
+
+Embeds the last user turn and looks it up in an in-process vector index
+(a float32 NumPy matrix searched by cosine similarity). A hit above the
+configured threshold is replayed as a synthetic StreamChunk sequence
+instead of running a full reasoning call.
+
+Entries are partitioned by an exact key covering the model settings and a
+digest of the preceding conversation context, so only the final user turn
+is matched semantically. Capacity is bounded with TTL expiry and
+least-recently-used eviction.
+"""
+
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.schemas import StreamChunk, StreamChunkType
+
+logger = get_logger(__name__)
+
+
+def semantic_cache_key(
+    messages: List[Dict[str, str]],
+    model_id: str,
+    reasoning_effort: str,
+    verbosity: str,
+    show_thinking: bool,
+    max_tokens: int,
+) -> Tuple[str, str]:
+    """
+    Split a request into an exact partition key and the text to embed.
+
+    Returns:
+        (partition_key, query_text) where query_text is the last user turn
+    """
+    query_text = ""
+    last_user = -1
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i]["role"] == "user":
+            query_text = messages[i]["content"]
+            last_user = i
+            break
+
+    context = messages[:last_user] if last_user >= 0 else messages
+    context_digest = hashlib.sha256(
+        json.dumps(context, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+    partition = json.dumps(
+        {
+            "model": model_id,
+            "effort": reasoning_effort,
+            "verbosity": verbosity,
+            "thinking": show_thinking,
+            "max_tokens": max_tokens,
+            "context": context_digest,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(partition.encode("utf-8")).hexdigest(), query_text
+
+
+def _compact_chunks(chunks: List[StreamChunk]) -> List[StreamChunk]:
+    """Merge consecutive plain thinking/content deltas into single chunks."""
+    compacted: List[StreamChunk] = []
+    for chunk in chunks:
+        prev = compacted[-1] if compacted else None
+        if (
+            prev is not None
+            and prev.type == chunk.type
+            and chunk.type in (StreamChunkType.THINKING, StreamChunkType.CONTENT)
+            and not prev.metadata
+            and not chunk.metadata
+        ):
+            compacted[-1] = StreamChunk(type=prev.type, content=prev.content + chunk.content)
+        else:
+            compacted.append(chunk)
+    return compacted
+
+
+class SemanticCache:
+    """In-process semantic cache over a fixed-capacity NumPy matrix."""
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600.0,
+        threshold: float = 0.95,
+    ) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+
+        # Allocated lazily once the embedding dimension is known
+        self._vectors: Optional[np.ndarray] = None
+        self._partitions: List[Optional[str]] = [None] * self.max_entries
+        self._payloads: List[Optional[List[StreamChunk]]] = [None] * self.max_entries
+        self._expires_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+
+        self.hits = 0
+        self.misses = 0
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed query text and return a unit-length float32 vector."""
+        # Imported lazily so the cache can be used without an OpenAI client
+        from app.services.openai_service import openai_service
+
+        embedding = await openai_service.create_embedding(text)
+        return self._normalize(np.asarray(embedding, dtype=np.float32))
+
+    def lookup(self, partition: str, vector: np.ndarray) -> Optional[List[StreamChunk]]:
+        """
+        Find the most similar live entry in the partition.
+
+        Returns:
+            The cached chunk sequence if its similarity meets the threshold
+        """
+        if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        live = self._expires_at > now
+        candidates = [
+            i for i in np.flatnonzero(live) if self._partitions[i] == partition
+        ]
+        if not candidates:
+            self.misses += 1
+            return None
+
+        idx = np.asarray(candidates)
+        scores = self._vectors[idx] @ self._normalize(vector)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+
+        slot = int(idx[best])
+        self._last_used[slot] = now
+        self.hits += 1
+        logger.info(f"Semantic cache hit (similarity={scores[best]:.4f})")
+        return self._payloads[slot]
+
+    def store(
+        self, partition: str, vector: np.ndarray, chunks: List[StreamChunk]
+    ) -> None:
+        """Insert a completed response, evicting expired or LRU entries if full."""
+        vector = self._normalize(vector)
+        if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+            # First insert (or embedding deployment changed): reset the index
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            self._partitions = [None] * self.max_entries
+            self._payloads = [None] * self.max_entries
+            self._expires_at[:] = 0.0
+            self._last_used[:] = 0.0
+
+        now = time.monotonic()
+        free = np.flatnonzero(self._expires_at <= now)
+        slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+
+        self._vectors[slot] = vector
+        self._partitions[slot] = partition
+        self._payloads[slot] = _compact_chunks(chunks)
+        self._expires_at[slot] = now + self.ttl_seconds
+        self._last_used[slot] = now
+
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._vectors = None
+        self._partitions = [None] * self.max_entries
+        self._payloads = [None] * self.max_entries
+        self._expires_at[:] = 0.0
+        self._last_used[:] = 0.0
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+
+# Global instance
+semantic_cache = SemanticCache(
+    max_entries=settings.semantic_cache_max_entries,
+    ttl_seconds=settings.semantic_cache_ttl_seconds,
+    threshold=settings.semantic_cache_threshold,
+)
@@ -0,0 +1,216 @@
+"""
+Resumable SSE streams.
+
+A resumable chat stream runs its generation in a detached task that writes
+id-tagged SSE frames into a bounded per-session ring buffer. HTTP responses
+only read from that buffer, so a client that drops the connection can
+reconnect with ``Last-Event-ID`` and receive the frames it missed followed
+by the live tail, instead of starting (and paying for) a new completion.
+
+When the last reader detaches, the generation keeps running for a grace
+period. If nobody re-attaches in time, the generation is cancelled (which
+cancels the upstream model stream) and the session is dropped.
+
+Event ids have the form ``<stream-id>-<seq>`` so an id from an earlier turn
+of the same chat session is never mistaken for a position in the current
+stream. Buffers live in process memory: resuming requires reaching the same
+replica (session affinity at the ingress).
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.models.schemas import StreamChunk, StreamChunkType
+from app.utils.streaming import encode_sse
+
+logger = get_logger(__name__)
+
+
+class StreamSession:
+    """One detached generation and the ring buffer of its recent frames."""
+
+    def __init__(
+        self,
+        key: str,
+        registry: "StreamRegistry",
+        buffer_frames: int,
+        grace_seconds: float,
+    ) -> None:
+        self.key = key
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.registry = registry
+        self.grace_seconds = grace_seconds
+
+        self._frames: Deque[Tuple[int, bytes]] = deque(maxlen=max(1, buffer_frames))
+        self._next_seq = 1
+        self._changed = asyncio.Event()
+        self._readers = 0
+        self._expiry: Optional[asyncio.TimerHandle] = None
+
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+
+    # ── generation ─────────────────────────────
+
+    def start(self, frames: AsyncIterator[bytes]) -> None:
+        """Run the frame source in a detached task."""
+        self.task = asyncio.create_task(self._run(frames))
+
+    async def _run(self, frames: AsyncIterator[bytes]) -> None:
+        try:
+            async for frame in frames:
+                self._append(frame)
+        except Exception as exc:
+            logger.error(f"Detached stream {self.key} failed: {exc}", exc_info=True)
+        finally:
+            self.done = True
+            self._notify()
+            if self._readers == 0:
+                self._schedule_expiry()
+
+    def _append(self, frame: bytes) -> None:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._frames.append((seq, f"id: {self.stream_id}-{seq}\n".encode("ascii") + frame))
+        self._notify()
+
+    def _notify(self) -> None:
+        # Wake every reader waiting on the current event, then arm a new one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # ── readers ────────────────────────────────
+
+    def parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        """Return the sequence number of an event id from this stream."""
+        if not event_id:
+            return None
+        stream_id, _, seq = event_id.strip().rpartition("-")
+        if stream_id != self.stream_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncIterator[bytes]:
+        """
+        Yield frames after ``after_seq``, then follow the live tail.
+
+        Frames that accumulated while the reader was busy are joined into
+        a single write. Closing the iterator detaches the reader without
+        affecting the generation.
+        """
+        self._readers += 1
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        try:
+            position = after_seq
+            while True:
+                changed = self._changed
+                pending, gap = self._frames_after(position)
+                if gap:
+                    logger.warning(f"Stream {self.key} can no longer be resumed from seq {position}")
+                    yield encode_sse(StreamChunk(
+                        type=StreamChunkType.ERROR,
+                        content="Missed events are no longer buffered; please retry the request",
+                        metadata={"error_type": "ResumeGap"},
+                    ))
+                    return
+                if pending:
+                    position = pending[-1][0]
+                    yield b"".join(frame for _, frame in pending)
+                    continue
+                if self.done:
+                    return
+                await changed.wait()
+        finally:
+            self._readers -= 1
+            if self._readers == 0:
+                self._schedule_expiry()
+
+    def _frames_after(self, position: int) -> Tuple[List[Tuple[int, bytes]], bool]:
+        """Buffered frames newer than ``position`` and whether any were evicted."""
+        if not self._frames or self._frames[-1][0] <= position:
+            return [], False
+        oldest = self._frames[0][0]
+        if position + 1 < oldest:
+            return [], True
+        return [item for item in self._frames if item[0] > position], False
+
+    # ── expiry ─────────────────────────────────
+
+    def _schedule_expiry(self) -> None:
+        if self._expiry is not None:
+            self._expiry.cancel()
+        self._expiry = asyncio.get_running_loop().call_later(self.grace_seconds, self._expire)
+
+    def _expire(self) -> None:
+        self._expiry = None
+        if self._readers:
+            return
+        if not self.done and self.task is not None:
+            logger.info(f"No reader re-attached to stream {self.key}; cancelling generation")
+            self.task.cancel()
+        self.registry.discard(self)
+
+    def close(self) -> None:
+        """Cancel the generation and any pending expiry."""
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+class StreamRegistry:
+    """Live resumable streams of this process, keyed by chat session id."""
+
+    def __init__(self, buffer_frames: int = 2048, grace_seconds: float = 30.0) -> None:
+        self.buffer_frames = buffer_frames
+        self.grace_seconds = grace_seconds
+        self._sessions: Dict[str, StreamSession] = {}
+
+    def start(self, key: str, frames: AsyncIterator[bytes]) -> StreamSession:
+        """Start a new generation for ``key``, replacing any previous one."""
+        previous = self._sessions.pop(key, None)
+        if previous is not None:
+            previous.close()
+
+        session = StreamSession(key, self, self.buffer_frames, self.grace_seconds)
+        self._sessions[key] = session
+        session.start(frames)
+        return session
+
+    def resume(self, key: str, last_event_id: Optional[str]) -> Optional[Tuple[StreamSession, int]]:
+        """Find the live stream a ``Last-Event-ID`` belongs to."""
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        seq = session.parse_event_id(last_event_id)
+        if seq is None:
+            return None
+        return session, seq
+
+    def discard(self, session: StreamSession) -> None:
+        if self._sessions.get(session.key) is session:
+            del self._sessions[session.key]
+
+    async def close(self) -> None:
+        """Cancel every live generation (application shutdown)."""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            session.close()
+        tasks = [s.task for s in sessions if s.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Global instance
+stream_registry = StreamRegistry(
+    buffer_frames=settings.sse_resume_buffer_frames,
+    grace_seconds=settings.sse_resume_grace_seconds,
+)
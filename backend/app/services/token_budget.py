@@ -0,0 +1,289 @@
+"""
+Per-user and per-tenant token budgets.
+
+Each subject (user, tenant) can have daily and monthly limits on input and
+output tokens. ``check()`` runs before a chat stream starts and rejects a
+caller whose budget for the current period is already spent; ``charge()``
+records the real usage reported by the model once the stream completes.
+
+Charges are aggregated in memory and written to the ``token_usage`` ledger
+in batches - one multi-row upsert per flush interval, not a row update per
+request. The upsert returns the ledger totals, which include other pods'
+usage; totals this pod only reads are refreshed after
+``token_budget_refresh_seconds``. Enforcement across pods is therefore
+approximate by up to one flush interval.
+"""
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.repositories.token_usage_repository import TokenUsageRepository, UsageKey
+
+logger = get_logger(__name__)
+
+SCOPES = ("user", "tenant")
+PERIODS = ("day", "month")
+
+
+def period_start(period: str, today: date) -> date:
+    """First day of the budget period containing ``today``."""
+    return today if period == "day" else today.replace(day=1)
+
+
+def period_end(period: str, start: date) -> date:
+    """First day of the next budget period."""
+    if period == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class TokenBudgetExceeded(Exception):
+    """The caller's token budget for the current period is spent."""
+
+    def __init__(self, scope: str, period: str, kind: str, limit: int, resets_at: datetime) -> None:
+        self.scope = scope
+        self.period = period
+        self.kind = kind
+        self.limit = limit
+        self.resets_at = resets_at
+        label = "daily" if period == "day" else "monthly"
+        super().__init__(f"The {scope}'s {label} {kind} token budget ({limit}) is used up")
+
+    @property
+    def retry_after_seconds(self) -> int:
+        return max(1, int((self.resets_at - datetime.utcnow()).total_seconds()))
+
+
+class TokenBudgetService:
+    """Budget checks and batched usage accounting for this process."""
+
+    def __init__(
+        self,
+        limits: Dict[Tuple[str, str], Tuple[int, int]],
+        ledger: Optional[TokenUsageRepository] = None,
+        flush_interval_seconds: float = 5.0,
+        flush_max_pending: int = 500,
+        refresh_seconds: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            limits: (input, output) limits per (scope, period); 0 = unlimited
+            ledger: Persistent ledger; None keeps usage in memory only
+            flush_interval_seconds: How often pending usage is written
+            flush_max_pending: Flush early once this many ledger rows are dirty
+            refresh_seconds: Re-read ledger totals older than this
+        """
+        self.limits = {key: value for key, value in limits.items() if any(value)}
+        self.ledger = ledger
+        self.flush_interval_seconds = flush_interval_seconds
+        self.flush_max_pending = flush_max_pending
+        self.refresh_seconds = refresh_seconds
+
+        # Last known ledger totals, and local charges not yet in them
+        self._totals: Dict[UsageKey, Tuple[int, int]] = {}
+        self._loaded_at: Dict[UsageKey, float] = {}
+        self._pending: Dict[UsageKey, List[int]] = {}
+        self._flushing: Dict[UsageKey, List[int]] = {}
+
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.limits)
+
+    def _keys(self, user_id: str, tenant_id: Optional[str]) -> List[Tuple[str, str, UsageKey]]:
+        """Ledger keys of the limited (scope, period) pairs for a caller."""
+        today = datetime.utcnow().date()
+        subjects = {"user": user_id, "tenant": tenant_id}
+        return [
+            (scope, period, (scope, subjects[scope], period, period_start(period, today)))
+            for scope in SCOPES
+            for period in PERIODS
+            if subjects[scope] and (scope, period) in self.limits
+        ]
+
+    def _used(self, key: UsageKey) -> Tuple[int, int]:
+        used_input, used_output = self._totals.get(key, (0, 0))
+        for layer in (self._flushing, self._pending):
+            delta = layer.get(key)
+            if delta:
+                used_input += delta[0]
+                used_output += delta[1]
+        return used_input, used_output
+
+    async def _refresh(self, keys: List[UsageKey]) -> None:
+        """Load ledger totals for keys not read recently."""
+        if self.ledger is None:
+            return
+        now = time.monotonic()
+        stale = [
+            key for key in keys
+            if key not in self._loaded_at or now - self._loaded_at[key] >= self.refresh_seconds
+        ]
+        if not stale:
+            return
+        try:
+            totals = await self.ledger.get_usage(stale)
+        except Exception as exc:
+            # Keep serving from what we know rather than failing the request
+            logger.warning(f"Could not read token usage ledger: {exc}")
+            return
+        for key, value in totals.items():
+            self._totals[key] = value
+            self._loaded_at[key] = now
+
+    async def check(self, user_id: str, tenant_id: Optional[str] = None) -> None:
+        """
+        Reject a caller whose budget for the current period is spent.
+
+        Raises:
+            TokenBudgetExceeded: for the first exhausted user/tenant budget
+        """
+        if not self.enabled:
+            return
+        keys = self._keys(user_id, tenant_id)
+        await self._refresh([key for _, _, key in keys])
+
+        for scope, period, key in keys:
+            limit_input, limit_output = self.limits[(scope, period)]
+            used_input, used_output = self._used(key)
+            for kind, limit, used in (("input", limit_input, used_input), ("output", limit_output, used_output)):
+                if limit and used >= limit:
+                    resets_at = datetime.combine(period_end(period, key[3]), datetime.min.time())
+                    raise TokenBudgetExceeded(scope, period, kind, limit, resets_at)
+
+    def charge(self, user_id: str, tenant_id: Optional[str], input_tokens: int, output_tokens: int) -> None:
+        """
+        Record tokens used by a caller.
+
+        Does not await, so it is safe to call while a stream is being
+        cancelled; the ledger write happens on the next flush.
+        """
+        if not self.enabled or not (input_tokens or output_tokens):
+            return
+
+        for _, _, key in self._keys(user_id, tenant_id):
+            if self.ledger is None:
+                used_input, used_output = self._totals.get(key, (0, 0))
+                self._totals[key] = (used_input + input_tokens, used_output + output_tokens)
+                continue
+            delta = self._pending.setdefault(key, [0, 0])
+            delta[0] += input_tokens
+            delta[1] += output_tokens
+
+        if len(self._pending) >= self.flush_max_pending and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def remaining(self, user_id: str, tenant_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Limits, usage and remaining tokens of each budget that applies to a caller."""
+        keys = self._keys(user_id, tenant_id)
+        await self._refresh([key for _, _, key in keys])
+
+        budgets = []
+        for scope, period, key in keys:
+            limit_input, limit_output = self.limits[(scope, period)]
+            used_input, used_output = self._used(key)
+            budgets.append({
+                "scope": scope,
+                "subject_id": key[1],
+                "period": period,
+                "input_limit": limit_input or None,
+                "input_used": used_input,
+                "input_remaining": max(0, limit_input - used_input) if limit_input else None,
+                "output_limit": limit_output or None,
+                "output_used": used_output,
+                "output_remaining": max(0, limit_output - used_output) if limit_output else None,
+                "resets_at": datetime.combine(period_end(period, key[3]), datetime.min.time()),
+            })
+        return budgets
+
+    async def flush(self) -> None:
+        """Write pending usage to the ledger in one batch."""
+        if self.ledger is None:
+            return
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            batch = {key: (delta[0], delta[1]) for key, delta in self._flushing.items()}
+
+            totals = None
+            try:
+                totals = await self.ledger.add_usage(batch)
+            except Exception as exc:
+                logger.error(f"Token usage flush failed; retrying next interval: {exc}")
+            finally:
+                self._flushing = {}
+                if totals is None:
+                    # Not written: keep the batch for the next flush
+                    for key, (input_tokens, output_tokens) in batch.items():
+                        delta = self._pending.setdefault(key, [0, 0])
+                        delta[0] += input_tokens
+                        delta[1] += output_tokens
+
+            if totals is None:
+                return
+            now = time.monotonic()
+            for key, value in totals.items():
+                self._totals[key] = value
+                self._loaded_at[key] = now
+            self._prune()
+
+    def _prune(self) -> None:
+        """Forget totals of periods that have ended."""
+        today = datetime.utcnow().date()
+        current = {period: period_start(period, today) for period in PERIODS}
+        for key in [key for key in self._totals if key[3] < current[key[2]]]:
+            del self._totals[key]
+            self._loaded_at.pop(key, None)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            # Shielded so shutdown never abandons a batch half-written
+            await asyncio.shield(self.flush())
+
+    def start(self) -> None:
+        """Start the periodic ledger flush (call from the running event loop)."""
+        if self.enabled and self.ledger is not None and self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Stop the periodic flush and write whatever is still pending."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        await self.flush()
+
+
+def _limits_from_settings() -> Dict[Tuple[str, str], Tuple[int, int]]:
+    if not settings.token_budget_enabled:
+        return {}
+    return {
+        ("user", "day"): (settings.token_budget_user_daily_input, settings.token_budget_user_daily_output),
+        ("user", "month"): (settings.token_budget_user_monthly_input, settings.token_budget_user_monthly_output),
+        ("tenant", "day"): (settings.token_budget_tenant_daily_input, settings.token_budget_tenant_daily_output),
+        ("tenant", "month"): (settings.token_budget_tenant_monthly_input, settings.token_budget_tenant_monthly_output),
+    }
+
+
+# Global instance
+token_budget = TokenBudgetService(
+    limits=_limits_from_settings(),
+    ledger=TokenUsageRepository() if settings.token_budget_enabled and settings.postgresql_url else None,
+    flush_interval_seconds=settings.token_budget_flush_interval_seconds,
+    flush_max_pending=settings.token_budget_flush_max_pending,
+    refresh_seconds=settings.token_budget_refresh_seconds,
+)
@@ -1,4 +1,6 @@
 from typing import Any, Dict, List
+import base64
+import binascii
 import json
 from datetime import datetime
 
@@ -32,6 +34,44 @@ def format_timestamp(dt: datetime) -> str:
     return dt.isoformat()
 
 
+def encode_cursor(*values: str) -> str:
+    """
+    Encode the sort key of the last item on a page as an opaque cursor.
+    
+    Args:
+        values: Sort key columns (e.g. timestamp, id)
+    
+    Returns:
+        URL-safe cursor string
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[str]:
+    """
+    Decode a cursor produced by ``encode_cursor``.
+    
+    Args:
+        cursor: Cursor string from a previous page
+        size: Expected number of sort key columns
+    
+    Returns:
+        The sort key values
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
 def chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
     """
     Split text into chunks.
@@ -0,0 +1,46 @@
+"""
+OpenTelemetry metric instruments.
+
+Instruments are created from the global meter at import time. Until a
+MeterProvider is configured (see ``setup_tracing``) they are no-ops, so
+recording is always safe.
+"""
+
+import math
+
+from opentelemetry import metrics
+
+meter = metrics.get_meter("app")
+
+# ── Streaming ──────────────────────────────
+
+abandoned_streams = meter.create_counter(
+    "chat.stream.abandoned",
+    unit="{stream}",
+    description="Chat streams cancelled because the client disconnected",
+)
+
+abandoned_stream_tokens = meter.create_counter(
+    "chat.stream.abandoned.tokens",
+    unit="{token}",
+    description="Output tokens generated for chat streams the client abandoned",
+)
+
+# ── Embeddings ─────────────────────────────
+
+embedding_cache_hits = meter.create_counter(
+    "embedding.cache.hits",
+    unit="{lookup}",
+    description="Embedding lookups served from cache (tier=memory|disk)",
+)
+
+embedding_cache_misses = meter.create_counter(
+    "embedding.cache.misses",
+    unit="{lookup}",
+    description="Embedding lookups that required an Azure OpenAI call",
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for when usage is unknown."""
+    return math.ceil(len(text) / 4)
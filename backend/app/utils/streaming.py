@@ -0,0 +1,275 @@
+"""
+Hot-path helpers for Server-Sent Event (SSE) streaming.
+
+Model streams produce one chunk per token delta, often only a few bytes
+each. Writing every delta as its own SSE frame costs a JSON serialization,
+a socket write and an ASGI event per token, so chunks are coalesced here
+before they reach the SSE writer.
+
+Per-delta chunks are FastChunk instances rather than pydantic models, and
+frames are built by encode_sse without a model_dump_json() round trip.
+The StreamChunk schema is still what goes over the wire.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from json.encoder import encode_basestring
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Union
+
+from app.core.logging import get_logger
+from app.models.schemas import StreamChunk, StreamChunkType
+
+logger = get_logger(__name__)
+
+# Chunk types whose consecutive deltas may be merged into a single frame
+_MERGEABLE_TYPES = (StreamChunkType.THINKING, StreamChunkType.CONTENT)
+
+_END = object()
+
+
+class FastChunk:
+    """
+    Lightweight, unvalidated stand-in for StreamChunk on the hot path.
+
+    Exposes the same ``type`` / ``content`` / ``metadata`` attributes, so
+    consumers can treat it like a StreamChunk. Use ``to_model()`` when a
+    validated schema object is actually needed.
+    """
+
+    __slots__ = ("type", "content", "metadata")
+
+    def __init__(
+        self,
+        type: StreamChunkType,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.type = type
+        self.content = content
+        self.metadata = metadata
+
+    def to_model(self) -> StreamChunk:
+        return StreamChunk(type=self.type, content=self.content, metadata=self.metadata)
+
+    def __repr__(self) -> str:
+        return f"FastChunk(type={self.type!r}, content={self.content!r}, metadata={self.metadata!r})"
+
+
+AnyChunk = Union[StreamChunk, FastChunk]
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize the non-JSON types that appear in chunk metadata."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+# Frame prefixes per chunk type, built once
+_FRAME_PREFIX = {
+    chunk_type: f'data: {{"type":"{chunk_type.value}","content":'
+    for chunk_type in StreamChunkType
+}
+
+
+def encode_sse(chunk: AnyChunk) -> bytes:
+    """
+    Encode a chunk as one SSE ``data:`` frame.
+
+    Produces the same compact JSON as ``StreamChunk.model_dump_json()``
+    (``{"type":..,"content":..,"metadata":..}``) but escapes the content
+    with the C JSON string encoder and only runs a full ``json.dumps``
+    when metadata is present.
+    """
+    chunk_type = chunk.type
+    prefix = _FRAME_PREFIX.get(chunk_type)
+    if prefix is None:
+        prefix = _FRAME_PREFIX[StreamChunkType(chunk_type)]
+
+    if chunk.metadata is None:
+        metadata = "null"
+    else:
+        metadata = json.dumps(
+            chunk.metadata, ensure_ascii=False, separators=(",", ":"), default=_json_default
+        )
+    return (
+        prefix + encode_basestring(chunk.content) + ',"metadata":' + metadata + "}\n\n"
+    ).encode("utf-8")
+
+
+class ThinkingStepCollector:
+    """
+    Groups a stream's thinking chunks into the steps that are stored.
+
+    The model's reasoning arrives as many small deltas; only the first
+    delta of each reasoning summary part carries ``step_number`` metadata,
+    and the plain deltas after it belong to the same step, which keeps
+    that ``step_number``. Any other thinking chunk with metadata (tool
+    progress, MCP warnings) is a step of its own, stored without a number.
+    Each step keeps its text once.
+    """
+
+    __slots__ = ("steps", "_parts")
+
+    def __init__(self) -> None:
+        self.steps: List[Dict[str, Any]] = []
+        self._parts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def add(self, chunk: AnyChunk) -> None:
+        """Append a thinking chunk to the current step, or start a new one."""
+        metadata = chunk.metadata
+        if metadata or not self.steps:
+            self._close()
+            step: Dict[str, Any] = {"timestamp": datetime.utcnow().isoformat()}
+            if metadata and "step_number" in metadata:
+                step = {"step_number": metadata["step_number"], **step}
+            self.steps.append(step)
+        self._parts.append(chunk.content)
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        Completed steps (safe to call more than once).
+
+        Each step is ``{"step_number", "timestamp", "reasoning", "chars"}``
+        (``step_number`` only for reasoning steps). No per-step token count
+        is stored: usage is only reported for the whole response.
+        """
+        self._close()
+        return self.steps
+
+    def _close(self) -> None:
+        if not self._parts:
+            return
+        step = self.steps[-1]
+        reasoning = step.get("reasoning", "") + "".join(self._parts)
+        step["reasoning"] = reasoning
+        step["chars"] = len(reasoning)
+        self._parts = []
+
+
+def _is_mergeable(chunk: AnyChunk) -> bool:
+    """Plain text deltas merge; tool events and anything with metadata don't."""
+    return chunk.type in _MERGEABLE_TYPES and not chunk.metadata
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[AnyChunk],
+    max_bytes: int = 1024,
+    window_ms: float = 20.0,
+    queue_size: int = 256,
+) -> AsyncGenerator[AnyChunk, None]:
+    """
+    Merge consecutive same-type text deltas into fewer, larger chunks.
+
+    A buffered run is flushed when it reaches ``max_bytes``, when
+    ``window_ms`` has elapsed since its first delta (even if the source
+    stalls, e.g. during tool calls), or immediately when a chunk of a
+    different type, a chunk with metadata, ``done`` or ``error`` arrives.
+
+    The source is consumed by a single producer task so that its context
+    managers (tracing spans) enter and exit in the same task. Closing this
+    generator cancels the producer, which closes the upstream stream before
+    ``aclose()`` returns.
+
+    Args:
+        source: Upstream chunk stream (e.g. ``chat_graph.stream_chat``)
+        max_bytes: Flush threshold for a buffered run
+        window_ms: Maximum time a delta may wait in the buffer; ``<= 0``
+            disables coalescing entirely
+        queue_size: Bound on chunks read ahead of the consumer
+
+    Yields:
+        Original non-text chunks and merged FastChunk text chunks
+    """
+    if window_ms <= 0:
+        try:
+            async for chunk in source:
+                yield chunk
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        return
+
+    window = window_ms / 1000.0
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def produce() -> None:
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as exc:
+            await queue.put(exc)
+            return
+        finally:
+            # A cancel while blocked on a full queue does not reach the
+            # source; close it here so its cleanup runs in this task
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        await queue.put(_END)
+
+    producer = asyncio.create_task(produce())
+
+    buffer_type: Optional[StreamChunkType] = None
+    parts: List[str] = []
+    size = 0
+    deadline = 0.0
+
+    def flush() -> Optional[FastChunk]:
+        nonlocal buffer_type, parts, size
+        if not parts:
+            return None
+        merged = FastChunk(buffer_type, "".join(parts))
+        buffer_type, parts, size = None, [], 0
+        return merged
+
+    try:
+        while True:
+            if parts:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    yield flush()
+                    continue
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield flush()
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            chunk: AnyChunk = item
+            if _is_mergeable(chunk):
+                if parts and chunk.type != buffer_type:
+                    yield flush()
+                if not parts:
+                    buffer_type = chunk.type
+                    deadline = time.monotonic() + window
+                parts.append(chunk.content)
+                size += len(chunk.content.encode("utf-8"))
+                if size >= max_bytes:
+                    yield flush()
+            else:
+                pending = flush()
+                if pending is not None:
+                    yield pending
+                yield chunk
+
+        pending = flush()
+        if pending is not None:
+            yield pending
+    finally:
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
@@ -3,13 +3,15 @@ import os
 import json
 from contextlib import contextmanager
 from typing import Optional, Dict, Any, List
-from opentelemetry import trace
+from opentelemetry import metrics, trace
 from opentelemetry.sdk.trace import TracerProvider, ReadableSpan
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
 from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanProcessor, SpanExporter
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.semconv.resource import ResourceAttributes
 from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from azure.monitor.opentelemetry.exporter import AzureMonitorTraceExporter
+from azure.monitor.opentelemetry.exporter import AzureMonitorMetricExporter, AzureMonitorTraceExporter
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 from opentelemetry.trace import Status, StatusCode
@@ -390,6 +392,16 @@ def setup_tracing(app: FastAPI) -> None:
             filtering_processor = FilteringSpanProcessor(batch_processor)
             tracer_provider.add_span_processor(filtering_processor)
             
+            # Export app metrics (app.utils.metrics) to Application Insights too
+            metric_reader = PeriodicExportingMetricReader(
+                AzureMonitorMetricExporter(
+                    connection_string=settings.applicationinsights_connection_string
+                )
+            )
+            metrics.set_meter_provider(
+                MeterProvider(resource=resource, metric_readers=[metric_reader])
+            )
+            
             tracer_configured = True
             logger.info("✅ OpenTelemetry tracing configured with Application Insights")
             logger.info("🔇 Filtering out ASGI response body event spans")
@@ -0,0 +1,130 @@
+"""
+Benchmark: event-loop stall caused by repository calls under concurrent chat traffic.
+
+Runs concurrent chat turns (first-turn conversation insert + two save_message calls,
+as chat_stream_generator does) while a probe task measures how late the
+event loop wakes it up. The same workload runs with the repository's
+blocking bodies called inline on the loop (previous behaviour) and through
+the database thread pool.
+
+By default the database is a temporary SQLite file with a simulated
+network round trip added to every statement (--rtt-ms); set
+BENCH_POSTGRESQL_URL to run against a real PostgreSQL server instead.
+
+Usage (from backend/):
+    python -m benchmarks.bench_db_event_loop [--turns 300] [--concurrency 50] [--rtt-ms 2]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.models.db_engine import db_engine  # noqa: E402
+from app.models.db_models import Base  # noqa: E402
+from app.repositories.postgresql_repository import PostgreSQLRepository  # noqa: E402
+
+PROBE_INTERVAL = 0.005
+
+
+def _setup_engine(rtt_ms: float):
+    url = os.environ.get("BENCH_POSTGRESQL_URL")
+    if url:
+        engine = create_engine(url, pool_size=settings.db_pool_size, max_overflow=0)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        engine = create_engine(
+            f"sqlite:///{path}",
+            pool_size=settings.db_pool_size,
+            max_overflow=0,
+            connect_args={"check_same_thread": False, "timeout": 60},
+        )
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _round_trip(*args):
+            time.sleep(rtt_ms / 1000.0)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db_engine.engine = engine
+    db_engine.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return engine
+
+
+async def _turn(repo: PostgreSQLRepository, inline: bool) -> None:
+    session_id = str(uuid.uuid4())
+    calls = [
+        (PostgreSQLRepository._insert_conversation, dict(user_id="bench", session_id=session_id, title="Bench")),
+        (PostgreSQLRepository.save_message, dict(conversation_id=session_id, role="user", content="hi", thinking_steps=None, usage=None)),
+        (PostgreSQLRepository.save_message, dict(conversation_id=session_id, role="assistant", content="hello", thinking_steps=None, usage=None)),
+    ]
+    for method, kwargs in calls:
+        if inline:
+            method.__wrapped__(repo, **kwargs)  # blocking body on the loop
+        else:
+            await method(repo, **kwargs)
+        await asyncio.sleep(0)  # stream some tokens in between
+
+
+async def _run(turns: int, concurrency: int, inline: bool):
+    repo = PostgreSQLRepository.__new__(PostgreSQLRepository)
+    lags = []
+    stop = asyncio.Event()
+
+    async def probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_INTERVAL)
+            lags.append(max(0.0, time.perf_counter() - start - PROBE_INTERVAL))
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            await _turn(repo, inline)
+
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(turns)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    return elapsed, lags
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    engine = _setup_engine(args.rtt_ms)
+    print(
+        f"{args.turns} chat turns, {args.concurrency} concurrent, "
+        f"db pool {settings.db_pool_size}, backend {engine.dialect.name}"
+    )
+    print(f"{'mode':<22} {'turns/s':>9} {'max stall ms':>13} {'p99 stall ms':>13} {'stalled %':>10}")
+
+    for name, inline in (("inline (before)", True), ("db thread pool", False)):
+        elapsed, lags = asyncio.run(_run(args.turns, args.concurrency, inline))
+        p99 = statistics.quantiles(lags, n=100)[98] if len(lags) >= 2 else max(lags, default=0.0)
+        print(
+            f"{name:<22} {args.turns / elapsed:>9,.0f} {max(lags, default=0.0) * 1000:>13.1f} "
+            f"{p99 * 1000:>13.1f} {sum(lags) / elapsed * 100:>9.0f}%"
+        )
+        db_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
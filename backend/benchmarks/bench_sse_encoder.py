@@ -0,0 +1,70 @@
+"""
+Microbenchmark: SSE frames per second for per-delta chunk encoding.
+
+Compares the previous hot path (pydantic StreamChunk + model_dump_json,
+and the RAG endpoint's json.dumps(model_dump())) with FastChunk +
+encode_sse.
+
+Usage (from backend/):
+    python -m benchmarks.bench_sse_encoder [--frames 200000]
+"""
+
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+
+from app.models.schemas import StreamChunk, StreamChunkType  # noqa: E402
+from app.utils.streaming import FastChunk, encode_sse  # noqa: E402
+
+# Typical Responses API deltas: a few bytes each, occasional non-ASCII
+DELTAS = [" the", " answer", " is", " \"42\"", ".\n", " café", " —", " ok"]
+
+
+def chat_before(n: int) -> None:
+    for i in range(n):
+        chunk = StreamChunk(type=StreamChunkType.CONTENT, content=DELTAS[i & 7])
+        f"data: {chunk.model_dump_json()}\n\n".encode("utf-8")
+
+
+def rag_before(n: int) -> None:
+    for i in range(n):
+        chunk = StreamChunk(type=StreamChunkType.CONTENT, content=DELTAS[i & 7])
+        f"data: {json.dumps(chunk.model_dump())}\n\n".encode("utf-8")
+
+
+def after(n: int) -> None:
+    for i in range(n):
+        encode_sse(FastChunk(StreamChunkType.CONTENT, DELTAS[i & 7]))
+
+
+def _measure(fn, n: int, repeats: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(n)
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=200_000)
+    args = parser.parse_args()
+
+    baseline = _measure(chat_before, args.frames)
+    results = [
+        ("chat: StreamChunk + model_dump_json", baseline),
+        ("rag: StreamChunk + json.dumps(model_dump())", _measure(rag_before, args.frames)),
+        ("fast: FastChunk + encode_sse", _measure(after, args.frames)),
+    ]
+
+    print(f"{'path':<48} {'frames/s':>12} {'vs chat':>8}")
+    for name, fps in results:
+        print(f"{name:<48} {fps:>12,.0f} {fps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
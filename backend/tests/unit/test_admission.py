@@ -0,0 +1,77 @@
+# Unit tests for per-pod admission control
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, Priority
+
+
+@pytest.mark.asyncio
+async def test_admits_up_to_limit_then_queues_by_priority():
+    """Over the limit, chat is admitted before RAG, FIFO within a class."""
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    running = controller.enqueue("gpt-5.2")
+    assert running.admitted
+
+    rag = controller.enqueue("gpt-5.2", Priority.RAG)
+    chat_a = controller.enqueue("gpt-5.2", Priority.CHAT)
+    chat_b = controller.enqueue("gpt-5.2", Priority.CHAT)
+    assert [t.position for t in (chat_a, chat_b, rag)] == [1, 2, 3]
+
+    order = []
+
+    async def run(name, ticket):
+        await ticket.wait(1)
+        order.append(name)
+        await asyncio.sleep(0)
+        ticket.release()
+
+    tasks = [asyncio.create_task(run(n, t)) for n, t in
+             (("rag", rag), ("chat_a", chat_a), ("chat_b", chat_b))]
+    await asyncio.sleep(0)
+    running.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["chat_a", "chat_b", "rag"]
+    assert controller.snapshot()["gpt-5.2"]["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_deadline_reject():
+    controller = AdmissionController(max_in_flight=1, max_queue=1)
+    controller.enqueue("gpt-5.2")
+    waiting = controller.enqueue("gpt-5.2")
+
+    with pytest.raises(AdmissionRejected):
+        controller.enqueue("gpt-5.2")
+    with pytest.raises(AdmissionRejected):
+        await waiting.wait(0.01)
+    assert controller.snapshot()["gpt-5.2"]["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_models_are_limited_independently():
+    controller = AdmissionController(max_in_flight=1, model_limits={"gpt-5-mini": 2})
+    assert controller.enqueue("gpt-5.2").admitted
+    assert controller.enqueue("gpt-5-mini").admitted
+    assert controller.enqueue("gpt-5-mini").admitted
+    assert not controller.enqueue("gpt-5.2").admitted
+
+
+def test_rejection_on_a_non_streaming_endpoint_is_503_with_retry_after():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.main import admission_rejected_handler
+
+    app = FastAPI()
+    app.add_exception_handler(AdmissionRejected, admission_rejected_handler)
+
+    @app.post("/answer")
+    async def answer():
+        raise AdmissionRejected("Model 'gpt-5.2' is at capacity; wait queue is full")
+
+    response = TestClient(app).post("/answer")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(AdmissionRejected.retry_after_seconds)
+    assert "at capacity" in response.json()["message"]
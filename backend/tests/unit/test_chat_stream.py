@@ -0,0 +1,218 @@
+# Unit tests for the chat SSE generator
+import asyncio
+import functools
+
+import pytest
+
+from app.api.v1.endpoints import chat as chat_endpoint
+from app.models.schemas import ChatRequest, StreamChunkType
+from app.utils.streaming import FastChunk
+
+
+class FakeRepository:
+    def __init__(self):
+        self.saved = []
+
+    async def create_conversation(self, **kwargs):
+        return kwargs
+
+    async def ensure_conversation(self, **kwargs):
+        pass
+
+    async def save_message(self, **kwargs):
+        self.saved.append(kwargs)
+
+    async def save_messages(self, messages):
+        self.saved.extend(messages)
+        return len(messages)
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    from app.services.message_writer import MessageWriter
+
+    repo = FakeRepository()
+    monkeypatch.setattr(chat_endpoint, "repository", repo)
+    monkeypatch.setattr(chat_endpoint, "message_writer", MessageWriter(repo, flush_interval_ms=1))
+    return repo
+
+
+def _request():
+    return ChatRequest(messages=[{"role": "user", "content": "hi"}], session_id="s1")
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_upstream_and_saves_partial(monkeypatch, repository):
+    """Closing the SSE generator mid-stream tears down the model stream."""
+    from app.core.config import settings
+    from app.utils.streaming import coalesce_chunks
+
+    monkeypatch.setattr(settings, "sse_save_partial_on_disconnect", True)
+    # Coalescing on (the default) with a queue the upstream fills at once
+    monkeypatch.setattr(
+        chat_endpoint, "coalesce_chunks", functools.partial(coalesce_chunks, queue_size=1)
+    )
+    upstream_closed = asyncio.Event()
+
+    async def stream_chat(**kwargs):
+        try:
+            yield FastChunk(StreamChunkType.CONTENT, "partial answer")
+            while True:
+                yield FastChunk(StreamChunkType.CONTENT, ".")
+        finally:
+            upstream_closed.set()
+
+    monkeypatch.setattr(chat_endpoint.chat_graph, "stream_chat", stream_chat)
+
+    frames = chat_endpoint.chat_stream_generator(_request())
+    first = await frames.__anext__()
+    assert b"partial answer" in first
+    for _ in range(5):
+        await asyncio.sleep(0)  # the producer blocks on the full queue
+    await frames.aclose()
+
+    assert upstream_closed.is_set()
+    await asyncio.sleep(0.01)  # let the background save run
+    assert [m["role"] for m in repository.saved] == ["user", "assistant"]
+    assert repository.saved[1]["content"].startswith("partial answer")
+
+
+@pytest.mark.asyncio
+async def test_disconnect_does_not_save_partial_by_default(monkeypatch, repository):
+    """Without the opt-in, an abandoned stream leaves no history behind."""
+    async def stream_chat(**kwargs):
+        yield FastChunk(StreamChunkType.CONTENT, "partial")
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(chat_endpoint.chat_graph, "stream_chat", stream_chat)
+
+    frames = chat_endpoint.chat_stream_generator(_request())
+    await frames.__anext__()
+    await frames.aclose()
+    await asyncio.sleep(0.01)
+
+    assert repository.saved == []
+
+
+@pytest.mark.asyncio
+async def test_usage_is_reported_on_done_and_saved(monkeypatch, repository):
+    """The model's token usage reaches the client's done event and the stored message."""
+    from app.models.schemas import StreamChunk
+
+    usage = {"input_tokens": 12, "output_tokens": 5, "total_tokens": 17}
+
+    async def stream_chat(**kwargs):
+        yield FastChunk(StreamChunkType.CONTENT, "answer")
+        yield StreamChunk(type=StreamChunkType.DONE, content="", metadata={"usage": usage})
+
+    monkeypatch.setattr(chat_endpoint.chat_graph, "stream_chat", stream_chat)
+
+    frames = [frame async for frame in chat_endpoint.chat_stream_generator(_request())]
+    await asyncio.sleep(0.01)
+
+    assert sum(b'"type":"done"' in frame for frame in frames) == 1
+    assert b'"input_tokens"' in frames[-1]
+    assert repository.saved[1]["usage"] == usage
+
+
+@pytest.mark.asyncio
+async def test_model_call_does_not_wait_for_conversation_create(monkeypatch, repository):
+    """The conversation row is created alongside the stream; a failed create is retried before saving."""
+    attempts = []
+    release = asyncio.Event()
+
+    async def ensure_conversation(**kwargs):
+        attempts.append(kwargs["session_id"])
+        if len(attempts) == 1:
+            await release.wait()
+            raise RuntimeError("database unavailable")
+
+    async def stream_chat(**kwargs):
+        yield FastChunk(StreamChunkType.CONTENT, "answer")
+
+    monkeypatch.setattr(repository, "ensure_conversation", ensure_conversation)
+    monkeypatch.setattr(chat_endpoint.chat_graph, "stream_chat", stream_chat)
+
+    frames = [frame async for frame in chat_endpoint.chat_stream_generator(_request())]
+    assert b"answer" in frames[0]
+    assert repository.saved == []  # not queued before the conversation exists
+
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert attempts == ["s1", "s1"]
+    assert [m["role"] for m in repository.saved] == ["user", "assistant"]
+
+
+@pytest.mark.asyncio
+async def test_reasoning_deltas_are_stored_as_whole_steps(monkeypatch, repository):
+    """Deltas of one summary part become one stored step; tool progress is its own."""
+    async def stream_chat(**kwargs):
+        yield FastChunk(StreamChunkType.THINKING, "Compare ", {"step_number": 1})
+        yield FastChunk(StreamChunkType.THINKING, "the two ")
+        yield FastChunk(StreamChunkType.THINKING, "options.")
+        yield FastChunk(StreamChunkType.THINKING, "[Tool call] lookup({})", {"tool_name": "lookup"})
+        yield FastChunk(StreamChunkType.THINKING, "Pick ", {"step_number": 2})
+        yield FastChunk(StreamChunkType.THINKING, "the cheaper one.")
+        yield FastChunk(StreamChunkType.CONTENT, "answer")
+
+    monkeypatch.setattr(chat_endpoint.chat_graph, "stream_chat", stream_chat)
+
+    frames = [frame async for frame in chat_endpoint.chat_stream_generator(_request())]
+    await asyncio.sleep(0.01)
+
+    steps = repository.saved[1]["thinking_steps"]
+    # Stored numbers match the step_number streamed to the client
+    assert [(s.get("step_number"), s["reasoning"]) for s in steps] == [
+        (1, "Compare the two options."),
+        (None, "[Tool call] lookup({})"),
+        (2, "Pick the cheaper one."),
+    ]
+    assert steps[0]["chars"] == len("Compare the two options.")
+    assert all(s["timestamp"] for s in steps)
+    assert b'"total_thinking_steps":3' in frames[-1]
+
+
+@pytest.mark.asyncio
+async def test_unknown_last_event_id_is_charged_like_a_new_stream(monkeypatch, repository):
+    """A Last-Event-ID that cannot be resumed starts a paid completion, so the budget applies."""
+    from datetime import datetime, timedelta
+    from fastapi import HTTPException
+    from app.core.config import settings
+    from app.services.token_budget import TokenBudgetExceeded
+
+    async def check(user_id, tenant_id=None):
+        raise TokenBudgetExceeded("user", "day", "output", 100, datetime.utcnow() + timedelta(hours=1))
+
+    started = []
+    monkeypatch.setattr(settings, "sse_resume_enabled", True)
+    monkeypatch.setattr(chat_endpoint.token_budget, "check", check)
+    monkeypatch.setattr(chat_endpoint.stream_registry, "start", lambda *args: started.append(args))
+
+    with pytest.raises(HTTPException) as exc_info:
+        await chat_endpoint.stream_chat_completion(
+            _request(), last_event_id="made-up-7", user={"user_id": "u1"}
+        )
+    assert exc_info.value.status_code == 429
+    assert started == []
+
+
+@pytest.mark.asyncio
+async def test_reads_the_backend_cannot_serve_return_501(monkeypatch, repository):
+    """Cursor paging and single-message reads on a backend without them are 501, not 500."""
+    from fastapi import HTTPException
+
+    async def unsupported(*args, **kwargs):
+        raise NotImplementedError("Cursor pagination requires the PostgreSQL repository")
+
+    monkeypatch.setattr(repository, "get_user_conversations", unsupported, raising=False)
+    monkeypatch.setattr(repository, "get_message", unsupported, raising=False)
+    cursor = chat_endpoint.encode_cursor("2026-01-01T00:00:00", "c1")
+
+    for call in (
+        chat_endpoint.list_conversations(limit=20, cursor=cursor, user={"user_id": "u1"}),
+        chat_endpoint.get_chat_message("s1", "m1"),
+    ):
+        with pytest.raises(HTTPException) as exc_info:
+            await call
+        assert exc_info.value.status_code == 501
@@ -0,0 +1,34 @@
+# Unit tests for running blocking database calls off the event loop
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.models.db_engine import run_in_db_thread
+
+
+class SlowRepository:
+    @run_in_db_thread
+    def query(self, delay):
+        time.sleep(delay)
+        return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_blocking_repository_calls_do_not_stall_the_loop():
+    """A slow query runs on the DB thread pool while the loop keeps ticking."""
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.005)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    thread_name = await SlowRepository().query(0.1)
+    task.cancel()
+
+    assert thread_name.startswith("db")
+    assert ticks >= 5
@@ -0,0 +1,93 @@
+# Unit tests for Azure OpenAI deployment routing
+import httpx
+import pytest
+from openai import APIConnectionError, RateLimitError
+
+from app.services.deployment_pool import Backend, DeploymentPool
+
+_REQUEST = httpx.Request("POST", "https://example.openai.azure.com/openai/responses")
+
+
+def _rate_limited(retry_after="7"):
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=_REQUEST)
+    return RateLimitError("Too many requests", response=response, body=None)
+
+
+def _pool():
+    ptu = Backend(model="gpt-5.2", deployment="ptu", client=None, region="swedencentral", weight=2)
+    paygo_a = Backend(model="gpt-5.2", deployment="paygo", client=None, region="eastus2", priority=1)
+    paygo_b = Backend(model="gpt-5.2", deployment="paygo", client=None, region="westus3", priority=1)
+    mini = Backend(model="gpt-5-mini", deployment="mini", client=None)
+    return DeploymentPool([ptu, paygo_a, paygo_b, mini]), ptu, paygo_a, paygo_b
+
+
+def test_prefers_lowest_priority_tier_then_least_loaded():
+    """The PTU tier wins while healthy; within a tier, load per weight decides."""
+    pool, ptu, paygo_a, paygo_b = _pool()
+    assert pool.select("gpt-5.2") is ptu
+
+    ptu.cooldown_until = float("inf")
+    paygo_a.in_flight = 3
+    assert pool.select("gpt-5.2") is paygo_b
+
+
+@pytest.mark.asyncio
+async def test_throttled_backend_spills_over_and_cools_down():
+    """A 429 moves the call to the next tier and honours retry-after."""
+    pool, ptu, paygo_a, paygo_b = _pool()
+
+    async def call(backend):
+        if backend is ptu:
+            raise _rate_limited("7")
+        return backend.name
+
+    backend, result = await pool.call("gpt-5.2", call)
+
+    assert backend.priority == 1
+    assert result == backend.name
+    assert backend.in_flight == 1 and ptu.in_flight == 0
+    assert not ptu.available(ptu.cooldown_until - 6)
+    assert pool.select("gpt-5.2") is not ptu
+
+    pool.release(backend)
+    assert backend.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_all_backends_failing_raises_last_error():
+    """Connection failures back off each backend; the last error surfaces."""
+    pool, ptu, paygo_a, paygo_b = _pool()
+    attempts = []
+
+    async def call(backend):
+        attempts.append(backend)
+        raise APIConnectionError(request=_REQUEST)
+
+    with pytest.raises(APIConnectionError):
+        await pool.call("gpt-5.2", call)
+
+    assert set(attempts) == {ptu, paygo_a, paygo_b}
+    assert all(b.failures == 1 and b.in_flight == 0 for b in attempts)
+
+
+@pytest.mark.asyncio
+async def test_preferred_backend_is_kept_while_healthy():
+    """Chained rounds stay on the backend that stored the previous response."""
+    pool, ptu, paygo_a, paygo_b = _pool()
+
+    async def call(backend):
+        return None
+
+    backend, _ = await pool.call("gpt-5.2", call, preferred=paygo_b)
+    assert backend is paygo_b
+
+
+@pytest.mark.asyncio
+async def test_unknown_model_raises_lookup_error():
+    pool, *_ = _pool()
+
+    async def call(backend):
+        return None
+
+    with pytest.raises(LookupError):
+        await pool.call("gpt-4o", call)
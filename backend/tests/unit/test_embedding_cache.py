@@ -0,0 +1,89 @@
+# Unit tests for the content-hash embedding cache
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache, EmbeddingDiskStore, embedding_key
+
+
+def test_memory_tier_is_lru_of_float32_arrays():
+    cache = EmbeddingCache("text-embedding-3-small", max_entries=2)
+    cache.put("a", [0.1, 0.2, 0.3])
+    cache.put("b", [0.4, 0.5, 0.6])
+    assert cache.get("a") is not None  # "a" becomes most recent
+    cache.put("c", [0.7, 0.8, 0.9])
+
+    assert cache.get("b") is None
+    vector = cache.get("a")
+    assert vector.dtype == np.float32
+    np.testing.assert_allclose(vector, [0.1, 0.2, 0.3], rtol=1e-6)
+
+
+def test_disk_tier_survives_restart_and_is_namespaced(tmp_path):
+    """Vectors written by one process are read back (memory-mapped) by the next."""
+    first = EmbeddingCache("deployment-a", max_entries=10, disk_dir=str(tmp_path))
+    first.put("hello", [1.0, 2.0, 3.0, 4.0])
+    first.put("world", [5.0, 6.0, 7.0, 8.0])
+
+    restarted = EmbeddingCache("deployment-a", max_entries=10, disk_dir=str(tmp_path))
+    assert len(restarted.disk) == 2
+    np.testing.assert_array_equal(restarted.get("world"), [5.0, 6.0, 7.0, 8.0])
+
+    other = EmbeddingCache("deployment-b", max_entries=10, disk_dir=str(tmp_path))
+    assert other.get("hello") is None
+
+
+def test_disk_tier_sees_records_appended_by_another_worker(tmp_path):
+    path = tmp_path / "embeddings.f32"
+    reader = EmbeddingDiskStore(path)
+    writer = EmbeddingDiskStore(path)
+
+    writer.append(embedding_key("shared"), np.array([1.5, 2.5], dtype=np.float32))
+    np.testing.assert_array_equal(reader.get(embedding_key("shared")), [1.5, 2.5])
+
+
+@pytest.mark.asyncio
+async def test_put_many_appends_the_batch_in_one_write(tmp_path, monkeypatch):
+    cache = EmbeddingCache("deployment-a", max_entries=10, disk_dir=str(tmp_path))
+    await cache.put_many([("warm", [0.0, 0.0])])
+
+    writes = []
+    real_write = os.write
+
+    def recording_write(fd, data):
+        writes.append(threading.current_thread() is threading.main_thread())
+        return real_write(fd, data)
+
+    monkeypatch.setattr(os, "write", recording_write)
+    vectors = await cache.put_many([("a", [1.0, 2.0]), ("b", [3.0, 4.0]), ("a", [1.0, 2.0])])
+
+    assert writes == [False]  # one write, off the event loop thread
+    assert [v.tolist() for v in vectors] == [[1.0, 2.0], [3.0, 4.0], [1.0, 2.0]]
+    restarted = EmbeddingCache("deployment-a", max_entries=10, disk_dir=str(tmp_path))
+    assert len(restarted.disk) == 3
+    np.testing.assert_array_equal(restarted.get("b"), [3.0, 4.0])
+
+
+def test_torn_record_is_dropped(tmp_path):
+    path = tmp_path / "embeddings.f32"
+    store = EmbeddingDiskStore(path)
+    store.append(embedding_key("ok"), np.array([1.0, 2.0], dtype=np.float32))
+    store.close()
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 7)
+
+    reopened = EmbeddingDiskStore(path)
+    assert len(reopened) == 1
+    reopened.append(embedding_key("next"), np.array([3.0, 4.0], dtype=np.float32))
+    np.testing.assert_array_equal(reopened.get(embedding_key("next")), [3.0, 4.0])
+
+
+def test_pack_batches_respects_input_and_token_limits():
+    from app.services.embedding_batcher import pack_batches
+
+    texts = ["x" * 40, "y" * 40, "z" * 40, "w"]  # ~10 tokens each, then 1
+    assert pack_batches(texts, max_inputs=10, max_tokens=20) == [texts[:2], texts[2:]]
+    assert pack_batches(texts, max_inputs=3, max_tokens=1000) == [texts[:3], texts[3:]]
+    assert pack_batches(["x" * 400], max_inputs=10, max_tokens=20) == [["x" * 400]]
@@ -0,0 +1,88 @@
+# Unit tests for the chat history page cache
+import asyncio
+
+import pytest
+
+from app.services.history_cache import HistoryCache, HistoryCacheBackend, etag_matches
+
+
+class FakeSharedBackend(HistoryCacheBackend):
+    def __init__(self):
+        self.hashes = {}
+
+    async def get(self, conversation_id, page):
+        return self.hashes.get(conversation_id, {}).get(page)
+
+    async def set(self, conversation_id, page, value, ttl_seconds):
+        self.hashes.setdefault(conversation_id, {})[page] = value
+
+    async def invalidate(self, conversation_id):
+        self.hashes.pop(conversation_id, None)
+
+
+def test_etag_matching():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"a"')
+
+
+@pytest.mark.asyncio
+async def test_pages_shared_between_pods_and_invalidated_together():
+    """Another pod reads the shared copy; a write drops every page of the conversation."""
+    shared = FakeSharedBackend()
+    pod_a = HistoryCache(shared=shared)
+    pod_b = HistoryCache(shared=shared)
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        return b'{"messages":[]}'
+
+    first = await pod_a.get_or_load("s1", "50:", load)
+    await pod_a.get_or_load("s1", "50:cursor", load)
+    second = await pod_b.get_or_load("s1", "50:", load)
+    assert loads == 2
+    assert second == first
+
+    await pod_a.invalidate("s1")
+    assert await pod_a.get("s1", "50:") is None
+    assert await pod_a.get("s1", "50:cursor") is None
+    assert shared.hashes == {}
+
+
+@pytest.mark.asyncio
+async def test_load_racing_a_write_is_not_cached():
+    """A page read before a concurrent write finished must not outlive it."""
+    cache = HistoryCache()
+    loading = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_load():
+        loading.set()
+        await release.wait()
+        return b"old"
+
+    task = asyncio.create_task(cache.get_or_load("s1", "50:", slow_load))
+    await loading.wait()
+    await cache.invalidate("s1")
+    release.set()
+
+    assert (await task).body == b"old"
+    assert await cache.get("s1", "50:") is None
+
+
+@pytest.mark.asyncio
+async def test_size_bound_evicts_least_recently_used():
+    cache = HistoryCache(max_bytes=10)
+
+    async def load():
+        return b"123456"
+
+    await cache.get_or_load("s1", "p", load)
+    await cache.get_or_load("s2", "p", load)
+
+    assert cache.total_bytes == 6
+    assert await cache.get("s1", "p") is None
+    assert await cache.get("s2", "p") is not None
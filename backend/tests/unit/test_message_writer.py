@@ -0,0 +1,84 @@
+# Unit tests for write-behind message persistence
+import asyncio
+
+import pytest
+
+from app.services.message_writer import MessageWriter
+
+
+class BatchRepository:
+    def __init__(self, fail_times=0):
+        self.batches = []
+        self.fail_times = fail_times
+
+    async def save_messages(self, messages):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("database unavailable")
+        if any("\x00" in m["content"] for m in messages):
+            raise ValueError("A string literal cannot contain NUL (0x00) characters.")
+        self.batches.append([(m["conversation_id"], m["role"]) for m in messages])
+        return len(messages)
+
+
+@pytest.mark.asyncio
+async def test_messages_from_many_requests_share_one_batch():
+    """Writes queued within the flush interval go out as one batch, in order."""
+    repo = BatchRepository()
+    writer = MessageWriter(repo, batch_size=100, flush_interval_ms=10)
+
+    for session in ("a", "b", "c"):
+        writer.enqueue(session, "user", "question")
+        writer.enqueue(session, "assistant", "answer")
+    assert repo.batches == []
+
+    await asyncio.sleep(0.05)
+    assert repo.batches == [[
+        ("a", "user"), ("a", "assistant"),
+        ("b", "user"), ("b", "assistant"),
+        ("c", "user"), ("c", "assistant"),
+    ]]
+
+
+@pytest.mark.asyncio
+async def test_size_trigger_flushes_without_waiting_for_timer():
+    repo = BatchRepository()
+    writer = MessageWriter(repo, batch_size=2, flush_interval_ms=10_000)
+
+    writer.enqueue("a", "user", "q")
+    writer.enqueue("a", "assistant", "a")
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert repo.batches == [[("a", "user"), ("a", "assistant")]]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_and_drained_on_close():
+    repo = BatchRepository(fail_times=1)
+    writer = MessageWriter(repo, batch_size=100, flush_interval_ms=10_000)
+
+    writer.enqueue("a", "user", "q")
+    await writer.flush()
+    assert repo.batches == [] and len(writer) == 1
+
+    writer.enqueue("a", "assistant", "a")
+    await writer.close()
+    assert repo.batches == [[("a", "user"), ("a", "assistant")]]
+    assert len(writer) == 0
+
+
+@pytest.mark.asyncio
+async def test_rejected_message_is_dropped_without_blocking_the_batch():
+    """A row the database will never accept is isolated and dropped; the rest are written."""
+    repo = BatchRepository()
+    writer = MessageWriter(repo, batch_size=100, flush_interval_ms=10_000)
+
+    for session in ("a", "b", "c", "d"):
+        writer.enqueue(session, "user", "bad \x00 input" if session == "c" else "question")
+    await writer.flush()
+
+    assert len(writer) == 0
+    assert sorted(row for batch in repo.batches for row in batch) == [
+        ("a", "user"), ("b", "user"), ("d", "user"),
+    ]
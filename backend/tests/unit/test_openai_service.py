@@ -0,0 +1,450 @@
+# Unit tests for the Responses API streaming loop
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import NotFoundError
+
+from app.models.schemas import StreamChunkType
+from app.services.deployment_pool import Backend, DeploymentPool
+from app.services.openai_service import OpenAIService
+
+
+def _function_call_events(call_id, name, arguments):
+    item = SimpleNamespace(type="function_call", call_id=call_id, name=name, arguments=arguments)
+    return [
+        SimpleNamespace(type="response.output_item.added", item=item),
+        SimpleNamespace(type="response.output_item.done", item=item),
+    ]
+
+
+def _text_events(text):
+    return [SimpleNamespace(type="response.output_text.delta", delta=text)]
+
+
+class FakeStream:
+    """Async iterator over a fixed list of Responses API events."""
+
+    def __init__(self, events, response_id="resp_1", usage=None):
+        completed = SimpleNamespace(
+            type="response.completed", response=SimpleNamespace(id=response_id, usage=usage)
+        )
+        self._events = list(events) + [completed]
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for event in self._events:
+            yield event
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeResponses:
+    def __init__(self, rounds, usage=None):
+        self._rounds = list(rounds)
+        self._usage = usage
+        self.calls = []
+        self.streams = []
+
+    async def create(self, **kwargs):
+        self.calls.append({**kwargs, "input": list(kwargs["input"])})
+        stream = FakeStream(
+            self._rounds.pop(0), response_id=f"resp_{len(self.calls)}", usage=self._usage
+        )
+        self.streams.append(stream)
+        return stream
+
+
+def _make_service(rounds, usage=None):
+    service = OpenAIService.__new__(OpenAIService)
+    service.client = SimpleNamespace(responses=FakeResponses(rounds, usage=usage))
+    service.model = "gpt-5.2"
+    service.pool = DeploymentPool([
+        Backend(model="gpt-5.2", deployment="gpt-5.2", client=service.client),
+    ])
+    return service
+
+
+async def _collect(agen):
+    return [chunk async for chunk in agen]
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently_and_keep_call_order():
+    """Tool calls in one round overlap, but results are fed back in call order."""
+    service = _make_service([
+        _function_call_events("call_a", "slow", "{}")
+        + _function_call_events("call_b", "fast", "{}"),
+        _text_events("done"),
+    ])
+    delays = {"slow": 0.2, "fast": 0.05}
+
+    async def executor(name, args):
+        await asyncio.sleep(delays[name])
+        return f"{name}-result"
+
+    start = time.perf_counter()
+    chunks = await _collect(service.stream_chat_with_thinking(
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "name": "slow"}, {"type": "function", "name": "fast"}],
+        tool_executor=executor,
+    ))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < sum(delays.values())
+
+    # Progress chunks arrive in completion order
+    progress = [c for c in chunks if c.metadata and "tool_call_id" in c.metadata]
+    assert [c.metadata["tool_call_id"] for c in progress] == ["call_b", "call_a"]
+    assert [c.metadata["tool_calls_completed"] for c in progress] == [1, 2]
+
+    # Second round input keeps the original call_id order
+    second_input = service.client.responses.calls[1]["input"]
+    tool_items = [i for i in second_input if i.get("type")]
+    assert [(i["type"], i["call_id"]) for i in tool_items] == [
+        ("function_call", "call_a"),
+        ("function_call_output", "call_a"),
+        ("function_call", "call_b"),
+        ("function_call_output", "call_b"),
+    ]
+    assert chunks[-2].type == StreamChunkType.CONTENT
+    assert chunks[-1].type == StreamChunkType.DONE
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_while_queued_gives_up_its_place(monkeypatch):
+    """A client that disconnects at the queued chunk must not keep a slot."""
+    from app.services import openai_service
+    from app.services.admission import AdmissionController
+
+    controller = AdmissionController(max_in_flight=1)
+    monkeypatch.setattr(openai_service, "admission_controller", controller)
+    holder = controller.enqueue("gpt-5.2")
+    service = _make_service([_text_events("never")])
+
+    agen = service.stream_chat_with_thinking(messages=[{"role": "user", "content": "hi"}])
+    assert (await agen.__anext__()).type == StreamChunkType.QUEUED
+    await agen.aclose()
+    assert controller.snapshot()["gpt-5.2"] == {"in_flight": 1, "queued": 0, "limit": 1}
+
+    holder.release()
+    assert controller.enqueue("gpt-5.2").admitted
+
+
+@pytest.mark.asyncio
+async def test_reasoning_step_number_marks_each_summary_part():
+    """Only the first delta of a summary part carries its step number."""
+    def delta(text, summary_index):
+        return SimpleNamespace(
+            type="response.reasoning_summary_text.delta", item_id="rs_1",
+            summary_index=summary_index, delta=text,
+        )
+
+    service = _make_service([[delta("a", 0), delta("b", 0), delta("c", 1)]])
+    chunks = await _collect(service.stream_chat_with_thinking(messages=[{"role": "user", "content": "hi"}]))
+
+    thinking = [(c.content, c.metadata) for c in chunks if c.type == StreamChunkType.THINKING]
+    assert thinking == [("a", {"step_number": 1}), ("b", None), ("c", {"step_number": 2})]
+
+
+@pytest.mark.asyncio
+async def test_usage_is_summed_across_tool_rounds():
+    """The done chunk carries the real token usage of every round combined."""
+    usage = SimpleNamespace(
+        input_tokens=100,
+        output_tokens=40,
+        total_tokens=140,
+        input_tokens_details=SimpleNamespace(cached_tokens=64),
+        output_tokens_details=SimpleNamespace(reasoning_tokens=25),
+    )
+    service = _make_service([
+        _function_call_events("call_a", "lookup", "{}"),
+        _text_events("answer"),
+    ], usage=usage)
+
+    async def executor(name, args):
+        return "result"
+
+    chunks = await _collect(service.stream_chat_with_thinking(
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "name": "lookup"}],
+        tool_executor=executor,
+    ))
+
+    done = chunks[-1]
+    assert done.type == StreamChunkType.DONE
+    assert done.metadata["usage"] == {
+        "input_tokens": 200,
+        "cached_input_tokens": 128,
+        "output_tokens": 80,
+        "reasoning_tokens": 50,
+        "total_tokens": 280,
+    }
+
+
+@pytest.mark.asyncio
+async def test_tool_call_timeout_is_reported_to_model(monkeypatch):
+    """A tool exceeding the per-call timeout yields an error output, not a failure."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "tool_call_timeout_seconds", 0.01)
+    service = _make_service([
+        _function_call_events("call_a", "hang", "{}"),
+        _text_events("ok"),
+    ])
+
+    async def executor(name, args):
+        await asyncio.sleep(1)
+
+    chunks = await _collect(service.stream_chat_with_thinking(
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "name": "hang"}],
+        tool_executor=executor,
+    ))
+
+    progress = [c for c in chunks if c.metadata and "tool_call_id" in c.metadata]
+    assert progress[0].metadata["tool_success"] is False
+    output = service.client.responses.calls[1]["input"][-1]
+    assert output["type"] == "function_call_output"
+    assert "timed out" in output["output"]
+
+
+@pytest.mark.asyncio
+async def test_eager_dispatch_starts_tools_before_stream_completes(monkeypatch):
+    """In eager mode a tool call starts while later stream events are still arriving."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "tool_call_eager_dispatch", True)
+    started = asyncio.Event()
+
+    class SlowTailStream(FakeStream):
+        async def _iter(self):
+            for event in self._events[:-1]:
+                yield event
+            # The model keeps writing after emitting the call
+            await asyncio.wait_for(started.wait(), timeout=1)
+            yield self._events[-1]
+
+    service = _make_service([])
+    rounds = [
+        SlowTailStream(_function_call_events("call_a", "lookup", "{}")),
+        FakeStream(_text_events("answer")),
+    ]
+
+    async def create(**kwargs):
+        service.client.responses.calls.append({**kwargs, "input": list(kwargs["input"])})
+        return rounds.pop(0)
+
+    service.client.responses.create = create
+
+    async def executor(name, args):
+        started.set()
+        return "result"
+
+    chunks = await _collect(service.stream_chat_with_thinking(
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "name": "lookup"}],
+        tool_executor=executor,
+    ))
+
+    assert started.is_set()
+    assert not any(c.type == StreamChunkType.ERROR for c in chunks)
+    output = service.client.responses.calls[1]["input"][-1]
+    assert output == {"type": "function_call_output", "call_id": "call_a", "output": "result"}
+
+
+@pytest.mark.asyncio
+async def test_chained_rounds_send_only_tool_outputs(monkeypatch):
+    """With chaining enabled, later rounds reference the stored response."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "responses_chain_tool_rounds", True)
+    service = _make_service([
+        _function_call_events("call_a", "lookup", "{}"),
+        _text_events("answer"),
+    ])
+
+    async def executor(name, args):
+        return "result"
+
+    await _collect(service.stream_chat_with_thinking(
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "name": "lookup"}],
+        tool_executor=executor,
+    ))
+
+    first, second = service.client.responses.calls
+    assert first["store"] is True
+    assert "previous_response_id" not in first
+    assert second["previous_response_id"] == "resp_1"
+    assert second["input"] == [
+        {"type": "function_call_output", "call_id": "call_a", "output": "result"}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chained_round_falls_back_to_full_transcript(monkeypatch):
+    """An expired previous_response_id triggers a resend of the full transcript."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "responses_chain_tool_rounds", True)
+    service = _make_service([
+        _function_call_events("call_a", "lookup", "{}"),
+        _text_events("answer"),
+    ])
+    create = service.client.responses.create
+
+    async def flaky_create(**kwargs):
+        if kwargs.get("previous_response_id"):
+            request = httpx.Request("POST", "https://example.openai.azure.com/responses")
+            raise NotFoundError(
+                "Previous response not found",
+                response=httpx.Response(404, request=request),
+                body=None,
+            )
+        return await create(**kwargs)
+
+    service.client.responses.create = flaky_create
+
+    async def executor(name, args):
+        return "result"
+
+    chunks = await _collect(service.stream_chat_with_thinking(
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "name": "lookup"}],
+        tool_executor=executor,
+    ))
+
+    assert not any(c.type == StreamChunkType.ERROR for c in chunks)
+    retried = service.client.responses.calls[1]
+    assert "previous_response_id" not in retried
+    assert [i.get("type", i.get("role")) for i in retried["input"]] == [
+        "user", "function_call", "function_call_output"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_closes_response_and_cancels_tools(monkeypatch):
+    """Closing the generator mid-stream closes the upstream HTTP stream and in-flight tools."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "tool_call_eager_dispatch", True)
+    service = _make_service([
+        _function_call_events("call_a", "hang", "{}") + _text_events("still streaming"),
+    ])
+    cancelled = asyncio.Event()
+
+    async def executor(name, args):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    agen = service.stream_chat_with_thinking(
+        messages=[{"role": "user", "content": "hi"}],
+        tools=[{"type": "function", "name": "hang"}],
+        tool_executor=executor,
+    )
+    first = await agen.__anext__()
+    assert first.content == "still streaming"
+    await asyncio.sleep(0)  # let the eager tool task start
+    await agen.aclose()
+    await asyncio.sleep(0)
+
+    assert service.client.responses.streams[0].closed
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_queued_event_precedes_stream_when_at_capacity(monkeypatch):
+    """A call over the in-flight limit emits a queued event, then runs once admitted."""
+    from app.services import openai_service as module
+    from app.services.admission import AdmissionController
+
+    controller = AdmissionController(max_in_flight=1)
+    monkeypatch.setattr(module, "admission_controller", controller)
+    holder = controller.enqueue("gpt-5.2")
+
+    service = _make_service([_text_events("hello")])
+    agen = service.stream_chat_with_thinking(messages=[{"role": "user", "content": "hi"}])
+
+    queued = await agen.__anext__()
+    assert queued.type == StreamChunkType.QUEUED
+    assert queued.metadata["position"] == 1
+
+    holder.release()
+    rest = await _collect(agen)
+    assert [c.content for c in rest if c.type == StreamChunkType.CONTENT] == ["hello"]
+    assert controller.snapshot()["gpt-5.2"]["in_flight"] == 0
+
+
+class FakeEmbeddings:
+    """Embeds each input as [len(text), request number]."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(list(kwargs["input"]))
+        await asyncio.sleep(0)
+        return SimpleNamespace(data=[
+            SimpleNamespace(index=i, embedding=[float(len(text)), float(len(self.calls))])
+            for i, text in enumerate(kwargs["input"])
+        ])
+
+
+def _make_embedding_service(monkeypatch):
+    from app.services import openai_service as module
+    from app.services.embedding_batcher import EmbeddingCoalescer
+    from app.services.embedding_cache import EmbeddingCache
+
+    monkeypatch.setattr(module, "embedding_cache", EmbeddingCache("test-embedding"))
+    service = OpenAIService.__new__(OpenAIService)
+    service.client = SimpleNamespace(embeddings=FakeEmbeddings())
+    service.embedding_coalescer = EmbeddingCoalescer(service._embed_uncached, window_ms=5)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_repeated_embedding_is_served_from_cache(monkeypatch):
+    service = _make_embedding_service(monkeypatch)
+
+    first = await service.create_embedding("popular query")
+    assert await service.create_embedding("popular query") == first
+    assert service.client.embeddings.calls == [["popular query"]]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_embeddings_are_coalesced(monkeypatch):
+    """Queries from concurrent requests share one embeddings call."""
+    service = _make_embedding_service(monkeypatch)
+
+    vectors = await asyncio.gather(
+        service.create_embedding("a"),
+        service.create_embedding("bb"),
+        service.create_embedding("a"),
+    )
+
+    assert service.client.embeddings.calls == [["a", "bb"]]
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+
+
+@pytest.mark.asyncio
+async def test_create_embeddings_packs_requests(monkeypatch):
+    """Bulk embedding respects the per-request input limit and skips duplicates."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "embedding_batch_max_inputs", 2)
+    service = _make_embedding_service(monkeypatch)
+
+    vectors = await service.create_embeddings(["a", "bb", "a", "ccc", "dddd"])
+
+    assert service.client.embeddings.calls == [["a", "bb"], ["ccc", "dddd"]]
+    assert [v[0] for v in vectors] == [1.0, 2.0, 1.0, 3.0, 4.0]
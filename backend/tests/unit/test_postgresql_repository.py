@@ -1,8 +1,13 @@
 import pytest
 import asyncio
+import json
+import threading
+from collections import OrderedDict
 from app.repositories.postgresql_repository import PostgreSQLRepository
 from app.models.db_engine import db_engine
 from app.core.config import settings
+from app.services.history_cache import history_cache
+from app.services.message_writer import MessageWriter
 
 
 @pytest.fixture
@@ -156,3 +161,301 @@ async def test_update_conversation(setup_db):
     
     assert result["title"] == "Updated Title"
     assert result["sessionId"] == "test-session-005"
+
+
+@pytest.mark.asyncio
+async def test_create_conversation_is_idempotent(setup_db):
+    """A second create returns the existing row instead of failing."""
+    repo = PostgreSQLRepository()
+    
+    first = await repo.create_conversation(user_id="test-user-006", session_id="test-session-006")
+    second = await repo.create_conversation(user_id="test-user-006", session_id="test-session-006")
+    
+    assert first["id"] == second["id"] == "test-session-006"
+    assert first["createdAt"] == second["createdAt"]
+
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch):
+    """In-memory SQLite standing in for PostgreSQL (same upsert syntax)."""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.models.db_models import Base
+    
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    
+    monkeypatch.setattr(db_engine, "engine", engine)
+    monkeypatch.setattr(db_engine, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    history_cache.clear()
+    yield statements
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_create_conversation_single_statement_upsert(sqlite_db):
+    """A new conversation costs one INSERT; an existing one is read back."""
+    repo = PostgreSQLRepository()
+    
+    created = await repo.create_conversation(user_id="u1", session_id="s1", title="First")
+    assert created["id"] == "s1"
+    assert created["title"] == "First"
+    assert len(sqlite_db) == 1
+    assert "ON CONFLICT DO NOTHING" in sqlite_db[0]
+    
+    existing = await repo.create_conversation(user_id="u1", session_id="s1", title="Second")
+    assert existing["title"] == "First"
+
+
+@pytest.mark.asyncio
+async def test_ensure_conversation_skips_database_for_known_ids(sqlite_db):
+    """Only the first turn of a session touches the database."""
+    repo = PostgreSQLRepository(known_conversations_max=2)
+    
+    await repo.ensure_conversation(user_id="u1", session_id="s1")
+    await repo.ensure_conversation(user_id="u1", session_id="s1")
+    assert len(sqlite_db) == 1
+    
+    # Evicted from the bounded cache: checked again (still idempotent)
+    await repo.ensure_conversation(user_id="u1", session_id="s2")
+    await repo.ensure_conversation(user_id="u1", session_id="s3")
+    sqlite_db.clear()
+    await repo.ensure_conversation(user_id="u1", session_id="s1")
+    assert len(sqlite_db) == 1
+    
+    # A deleted conversation is created again on its next turn
+    assert await repo.delete_conversation("s1")
+    await repo.ensure_conversation(user_id="u1", session_id="s1")
+    assert (await repo.create_conversation(user_id="u1", session_id="s1"))["messageCount"] == 0
+
+
+@pytest.mark.asyncio
+async def test_known_ids_are_only_touched_on_the_event_loop(sqlite_db):
+    """The unlocked known-id LRU is never changed from a database thread."""
+    threads = set()
+    
+    class RecordingDict(OrderedDict):
+        def __setitem__(self, key, value):
+            threads.add(threading.get_ident())
+            super().__setitem__(key, value)
+        
+        def pop(self, *args):
+            threads.add(threading.get_ident())
+            return super().pop(*args)
+    
+    repo = PostgreSQLRepository()
+    repo._known_conversations = RecordingDict()
+    await repo.ensure_conversation(user_id="u1", session_id="s1")
+    assert await repo.delete_conversation("s1")
+    
+    assert threads == {threading.get_ident()}
+
+
+@pytest.mark.asyncio
+async def test_turn_saved_after_another_pod_deleted_the_conversation(sqlite_db):
+    """A conversation this pod still thinks exists is recreated, not silently lost."""
+    pod_a, pod_b = PostgreSQLRepository(), PostgreSQLRepository()
+    await pod_a.ensure_conversation(user_id="u1", session_id="s1")
+    await pod_a.ensure_conversation(user_id="u1", session_id="s2")
+    await pod_b.delete_conversation("s1")
+    await pod_b.delete_conversation("s2")
+    
+    writer = MessageWriter(pod_a)
+    writer.enqueue("s1", "user", "hi", user_id="u1")
+    writer.enqueue("s2", "user", "hi")  # owner unknown: cannot be recreated
+    await writer.flush()
+    
+    messages = await pod_a.get_conversation_messages("s1")
+    assert [m["content"] for m in messages] == ["hi"]
+    assert (await pod_a.create_conversation(user_id="u1", session_id="s1"))["messageCount"] == 1
+    
+    # s2 is forgotten, so its next turn creates it again
+    assert "s2" not in pod_a._known_conversations
+    await pod_a.ensure_conversation(user_id="u1", session_id="s2")
+    assert await pod_a._get_conversation("s2") is not None
+
+
+@pytest.mark.asyncio
+async def test_history_keyset_pagination(sqlite_db, monkeypatch):
+    """Pages follow (timestamp, id) newest first, including rows sharing a timestamp."""
+    from datetime import datetime, timedelta
+    from fastapi import HTTPException
+    from app.api.v1.endpoints import chat as chat_endpoint
+    
+    repo = PostgreSQLRepository()
+    monkeypatch.setattr(chat_endpoint, "repository", repo)
+    await repo.create_conversation(user_id="u1", session_id="s1")
+    
+    start = datetime(2026, 1, 1)
+    await repo.save_messages([
+        {
+            "id": f"m{i}",
+            "conversation_id": "s1",
+            "role": "user",
+            "content": str(i),
+            "thinking_steps": None,
+            "usage": None,
+            # m2 and m3 share a timestamp
+            "timestamp": start + timedelta(seconds=min(i, 2)),
+        }
+        for i in range(5)
+    ])
+    
+    pages, cursor = [], None
+    while True:
+        response = await chat_endpoint.get_chat_history("s1", limit=2, cursor=cursor, if_none_match=None)
+        page = json.loads(response.body)
+        pages.append([m["id"] for m in page["messages"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert pages == [["m4", "m3"], ["m2", "m1"], ["m0"]]
+    
+    with pytest.raises(HTTPException) as exc_info:
+        await chat_endpoint.get_chat_history("s1", limit=2, cursor="not-a-cursor", if_none_match=None)
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_thinking_steps_loaded_only_on_request(sqlite_db, monkeypatch):
+    """History pages skip the thinking table unless asked; a single message includes it."""
+    from fastapi import HTTPException
+    from app.api.v1.endpoints import chat as chat_endpoint
+    
+    repo = PostgreSQLRepository()
+    monkeypatch.setattr(chat_endpoint, "repository", repo)
+    await repo.create_conversation(user_id="u1", session_id="s1")
+    steps = [{"step_number": 1, "reasoning": "why"}]
+    saved = await repo.save_message(conversation_id="s1", role="assistant", content="hi", thinking_steps=steps)
+    assert saved["thinkingSteps"] == steps
+    sqlite_db.clear()
+    
+    page = await chat_endpoint.get_chat_history("s1", limit=50, cursor=None, if_none_match=None)
+    assert "thinkingSteps" not in json.loads(page.body)["messages"][0]
+    assert not any("message_thinking" in sql for sql in sqlite_db)
+    
+    page = await chat_endpoint.get_chat_history(
+        "s1", limit=50, cursor=None, include_thinking=True, if_none_match=None
+    )
+    assert json.loads(page.body)["messages"][0]["thinkingSteps"] == steps
+    
+    message = await chat_endpoint.get_chat_message("s1", saved["id"])
+    assert message["thinkingSteps"] == steps
+    with pytest.raises(HTTPException) as exc_info:
+        await chat_endpoint.get_chat_message("s1", "missing")
+    assert exc_info.value.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_list_conversations_keyset_pagination(sqlite_db, monkeypatch):
+    """A user's conversations are listed most recently updated first, a page at a time."""
+    from app.api.v1.endpoints import chat as chat_endpoint
+    
+    repo = PostgreSQLRepository()
+    monkeypatch.setattr(chat_endpoint, "repository", repo)
+    for i in range(3):
+        await repo.create_conversation(user_id="u1", session_id=f"c{i}")
+    await repo.create_conversation(user_id="someone-else", session_id="other")
+    
+    user = {"user_id": "u1"}
+    first = await chat_endpoint.list_conversations(limit=2, cursor=None, user=user)
+    second = await chat_endpoint.list_conversations(limit=2, cursor=first["next_cursor"], user=user)
+    
+    assert [c["id"] for c in first["conversations"]] == ["c2", "c1"]
+    assert [c["id"] for c in second["conversations"]] == ["c0"]
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_history_served_from_cache_until_written(sqlite_db, monkeypatch):
+    """Repeat reads skip the database and revalidate with 304; a write invalidates."""
+    from app.api.v1.endpoints import chat as chat_endpoint
+    
+    repo = PostgreSQLRepository()
+    monkeypatch.setattr(chat_endpoint, "repository", repo)
+    await repo.create_conversation(user_id="u1", session_id="s1")
+    await repo.save_message(conversation_id="s1", role="user", content="hi")
+    
+    first = await chat_endpoint.get_chat_history("s1", limit=50, cursor=None, if_none_match=None)
+    etag = first.headers["etag"]
+    sqlite_db.clear()
+    
+    revalidated = await chat_endpoint.get_chat_history("s1", limit=50, cursor=None, if_none_match=etag)
+    assert revalidated.status_code == 304
+    assert sqlite_db == []
+    
+    # Written the way chat turns are, through the write-behind queue
+    writer = MessageWriter(repo)
+    writer.enqueue("s1", "assistant", "hello")
+    await writer.flush()
+    changed = await chat_endpoint.get_chat_history("s1", limit=50, cursor=None, if_none_match=etag)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [m["content"] for m in json.loads(changed.body)["messages"]] == ["hello", "hi"]
+
+
+@pytest.mark.asyncio
+async def test_history_json_built_by_postgresql_matches_to_dict(setup_db):
+    """The json_agg fast path returns exactly what to_dict() would, page by page."""
+    from datetime import datetime, timedelta
+    
+    repo = PostgreSQLRepository()
+    await repo.create_conversation(user_id="test-user-007", session_id="test-session-007")
+    start = datetime(2026, 1, 1, 0, 0, 0, 1)
+    await repo.save_messages([
+        {
+            "id": f"m{i}",
+            "conversation_id": "test-session-007",
+            "role": "assistant",
+            "content": f'answer "{i}" \\u00e9',
+            "thinking_steps": [{"step_number": 1, "reasoning": "why"}] if i % 2 else None,
+            "usage": {"input_tokens": i} if i % 2 else None,
+            "timestamp": start + timedelta(seconds=i),
+        }
+        for i in range(5)
+    ])
+    
+    for include_thinking in (False, True):
+        body, last_key = await repo.get_conversation_messages_json(
+            "test-session-007", limit=3, include_thinking=include_thinking
+        )
+        expected = await repo.get_conversation_messages(
+            "test-session-007", limit=3, include_thinking=include_thinking
+        )
+        assert json.loads(body) == expected
+        assert last_key == (expected[-1]["timestamp"], "m2")
+    
+    before = (datetime.fromisoformat(last_key[0]), last_key[1])
+    body, last_key = await repo.get_conversation_messages_json("test-session-007", limit=3, before=before)
+    assert [m["id"] for m in json.loads(body)] == ["m1", "m0"]
+    assert last_key is None
+
+
+@pytest.mark.asyncio
+async def test_history_json_timestamp_matches_to_dict_without_microseconds(setup_db):
+    """A whole-second timestamp is formatted the same way by both paths."""
+    from datetime import datetime
+    
+    repo = PostgreSQLRepository()
+    await repo.create_conversation(user_id="test-user-008", session_id="test-session-008")
+    await repo.save_messages([{
+        "id": "m0",
+        "conversation_id": "test-session-008",
+        "role": "user",
+        "content": "hi",
+        "timestamp": datetime(2026, 1, 1, 12, 0, 0),
+    }])
+    
+    body, _ = await repo.get_conversation_messages_json("test-session-008")
+    expected = await repo.get_conversation_messages("test-session-008")
+    assert json.loads(body) == expected
+    assert expected[0]["timestamp"] == "2026-01-01T12:00:00.000000"
@@ -0,0 +1,96 @@
+# Unit tests for the inbound rate limiter
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from app.core.config import settings
+from app.core.rate_limit import InMemoryRateLimitBackend, RateLimitMiddleware, client_identity
+
+
+def _client(per_minute=60, burst=2):
+    app = FastAPI()
+
+    @app.post("/api/v1/chat/completions")
+    async def chat():
+        return {"ok": True}
+
+    @app.post("/api/v1/rag/query")
+    async def rag():
+        return {"ok": True}
+
+    @app.get("/api/v1/chat/history/{session_id}")
+    async def history(session_id: str):
+        return {"ok": True}
+
+    @app.get("/api/v1/health/")
+    async def health():
+        return {"ok": True}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        backend=InMemoryRateLimitBackend(),
+        per_minute=per_minute,
+        burst=burst,
+    )
+    return TestClient(app)
+
+
+@pytest.mark.asyncio
+async def test_bucket_allows_burst_then_refills():
+    backend = InMemoryRateLimitBackend()
+
+    results = [await backend.acquire("k", rate_per_second=1.0, capacity=2) for _ in range(3)]
+
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert 0 < results[2][1] <= 1.0
+
+
+def test_exceeding_burst_returns_429_with_retry_after():
+    client = _client(per_minute=60, burst=2)
+
+    statuses = [client.post("/api/v1/chat/completions").status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    limited = client.post("/api/v1/chat/completions")
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    assert limited.json()["error"] == "Too Many Requests"
+
+
+def test_buckets_are_per_route_group_and_client():
+    client = _client(per_minute=60, burst=1)
+
+    assert client.post("/api/v1/chat/completions").status_code == 200
+    assert client.post("/api/v1/chat/completions").status_code == 429
+    # Other groups and unlimited routes (including chat reads) are unaffected
+    assert client.post("/api/v1/rag/query").status_code == 200
+    assert client.get("/api/v1/chat/history/s1").status_code == 200
+    assert client.get("/api/v1/health/").status_code == 200
+    # Another verified user has their own bucket
+    other = jwt.encode({"sub": "someone-else"}, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+    assert client.post("/api/v1/chat/completions", headers={"Authorization": f"Bearer {other}"}).status_code == 200
+
+
+def test_unverified_api_keys_do_not_get_fresh_buckets():
+    client = _client(per_minute=60, burst=1)
+
+    assert client.post("/api/v1/chat/completions", headers={"X-API-Key": "a"}).status_code == 200
+    assert client.post("/api/v1/chat/completions", headers={"X-API-Key": "b"}).status_code == 429
+
+
+def _scope(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"type": "http", "client": (peer, 50000), "headers": headers}
+
+
+def test_forwarded_for_is_only_trusted_from_configured_proxies(monkeypatch):
+    # Direct connection: a spoofed header does not change the identity
+    assert client_identity(_scope("203.0.113.7", "1.1.1.1")) == "ip:203.0.113.7"
+
+    monkeypatch.setattr(settings, "rate_limit_trusted_proxies", "10.0.0.0/8, 192.0.2.1")
+    assert client_identity(_scope("203.0.113.7", "1.1.1.1")) == "ip:203.0.113.7"
+    # Via trusted proxies: the last hop none of them appended is the client
+    assert client_identity(_scope("10.1.2.3", "1.1.1.1, 198.51.100.9")) == "ip:198.51.100.9"
+    assert client_identity(_scope("10.1.2.3", "1.1.1.1, 198.51.100.9, 192.0.2.1")) == "ip:198.51.100.9"
+    assert client_identity(_scope("10.1.2.3")) == "ip:10.1.2.3"
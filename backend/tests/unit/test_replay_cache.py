@@ -0,0 +1,103 @@
+# Unit tests for the exact-match SSE replay cache
+import os
+import time
+
+import pytest
+
+from app.models.schemas import ChatRequest
+from app.services.replay_cache import ReplayCache, ReplayEntry, replay_cache_key
+
+
+def _request(**overrides):
+    body = {
+        "messages": [{"role": "user", "content": "Explain quantum computing"}],
+        "reasoning_effort": "low",
+        "verbosity": "low",
+    }
+    body.update(overrides)
+    return ChatRequest(**body)
+
+
+def _entry(text):
+    return ReplayEntry(
+        frames=[f'data: {{"type":"content","content":"{text}","metadata":null}}\n\n'.encode()],
+        done_metadata={"total_thinking_steps": 0, "content_length": len(text)},
+        assistant_content=text,
+    )
+
+
+def test_key_ignores_session_and_timestamps():
+    """Only output-affecting fields participate in the key."""
+    a = _request(session_id="one")
+    b = _request(session_id="two")
+    assert replay_cache_key(a) == replay_cache_key(b)
+
+    assert replay_cache_key(_request(reasoning_effort="high")) != replay_cache_key(a)
+    assert replay_cache_key(_request(max_tokens=100)) != replay_cache_key(a)
+    assert replay_cache_key(_request(enable_web_search=True)) != replay_cache_key(a)
+    assert replay_cache_key(
+        _request(mcp_servers=[{"url": "http://tools.local/mcp"}])
+    ) != replay_cache_key(a)
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_evicts_by_total_bytes():
+    """Oldest entries are evicted once the byte budget is exceeded."""
+    first, second = _entry("a" * 40), _entry("b" * 40)
+    cache = ReplayCache(max_bytes=first.size_bytes + second.size_bytes - 1)
+
+    await cache.put("first", first)
+    await cache.put("second", second)
+
+    assert await cache.get("first") is None
+    assert (await cache.get("second")).assistant_content == "b" * 40
+    assert cache.total_bytes == second.size_bytes
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_not_replayed():
+    """Entries older than the TTL are dropped on read."""
+    cache = ReplayCache(ttl_seconds=-1)
+    await cache.put("key", _entry("stale"))
+    assert await cache.get("key") is None
+    assert cache.total_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_disk_tier_survives_memory_eviction(tmp_path):
+    """A disk-backed entry is promoted back into memory on lookup."""
+    cache = ReplayCache(disk_dir=str(tmp_path))
+    await cache.put("abcdef", _entry("persisted"))
+    cache.clear()
+
+    entry = await cache.get("abcdef")
+    assert entry is not None
+    assert entry.frames == _entry("persisted").frames
+    assert cache.total_bytes == entry.size_bytes
+
+
+@pytest.mark.asyncio
+async def test_expired_disk_file_is_deleted_on_lookup(tmp_path):
+    """A lookup that finds an expired file on disk removes it."""
+    cache = ReplayCache(disk_dir=str(tmp_path))
+    await cache.put("abcdef", _entry("stale"))
+    cache.clear()
+    cache.ttl_seconds = -1
+
+    assert await cache.get("abcdef") is None
+    assert not cache._disk_path("abcdef").exists()
+
+
+@pytest.mark.asyncio
+async def test_writes_sweep_files_older_than_ttl(tmp_path):
+    """Expired files are removed even if their key is never looked up again."""
+    cache = ReplayCache(ttl_seconds=60, disk_dir=str(tmp_path))
+    await cache.put("aaaaaa", _entry("old"))
+    old_path = cache._disk_path("aaaaaa")
+    os.utime(old_path, (time.time() - 120, time.time() - 120))
+
+    cache._last_sweep = 0.0
+    await cache.put("bbbbbb", _entry("new"))
+
+    assert not old_path.exists()
+    assert cache._disk_path("bbbbbb").exists()
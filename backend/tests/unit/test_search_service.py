@@ -0,0 +1,52 @@
+# Unit tests for bulk RAG indexing
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from app.models.schemas import IndexBatchRequest
+from app.services import search_service as search_module
+from app.services.search_service import SearchService, upload_chunks
+
+
+def test_upload_chunks_respect_count_and_size_limits():
+    documents = [{"id": str(i), "content": "x" * 100} for i in range(7)]
+
+    by_count = list(upload_chunks(documents, max_documents=3, max_bytes=10_000))
+    by_size = list(upload_chunks(documents, max_documents=100, max_bytes=250))
+
+    assert [len(chunk) for chunk in by_count] == [3, 3, 1]
+    assert [len(chunk) for chunk in by_size] == [2, 2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_only_fails_its_own_documents(monkeypatch):
+    """Documents are uploaded in service-sized batches; one rejected batch does not fail the rest."""
+    uploads = []
+
+    async def create_embeddings(texts):
+        return [[0.0] for _ in texts]
+
+    async def upload_documents(documents):
+        uploads.append([doc["id"] for doc in documents])
+        if len(uploads) == 2:
+            raise RuntimeError("request too large")
+        return [SimpleNamespace(key=doc["id"], succeeded=True) for doc in documents]
+
+    monkeypatch.setattr(search_module.openai_service, "create_embeddings", create_embeddings)
+    service = SearchService.__new__(SearchService)
+    service.client = SimpleNamespace(upload_documents=upload_documents)
+    monkeypatch.setattr(search_module, "upload_chunks", lambda batch: upload_chunks(batch, max_documents=2))
+
+    results = await service.index_documents(
+        [{"id": f"d{i}", "content": "text", "title": "t"} for i in range(5)]
+    )
+
+    assert uploads == [["d0", "d1"], ["d2", "d3"], ["d4"]]
+    assert results == {"d0": True, "d1": True, "d2": False, "d3": False, "d4": True}
+
+
+def test_batch_request_is_capped():
+    documents = [{"id": str(i), "content": "c", "title": "t"} for i in range(1001)]
+    with pytest.raises(ValidationError):
+        IndexBatchRequest(documents=documents)
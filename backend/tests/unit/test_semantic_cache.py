@@ -0,0 +1,81 @@
+# Unit tests for the semantic response cache
+import numpy as np
+
+from app.models.schemas import StreamChunk, StreamChunkType
+from app.services.semantic_cache import SemanticCache, semantic_cache_key
+
+
+def _chunks(text):
+    return [
+        StreamChunk(type=StreamChunkType.THINKING, content="think "),
+        StreamChunk(type=StreamChunkType.THINKING, content="more"),
+        StreamChunk(type=StreamChunkType.CONTENT, content=text),
+    ]
+
+
+def _key(messages, **overrides):
+    params = dict(
+        model_id="gpt-5.2",
+        reasoning_effort="low",
+        verbosity="low",
+        show_thinking=True,
+        max_tokens=16000,
+    )
+    params.update(overrides)
+    return semantic_cache_key(messages, **params)
+
+
+def test_cache_key_separates_settings_and_context():
+    """Model settings and earlier turns are part of the exact partition."""
+    messages = [{"role": "user", "content": "How do I reset my password?"}]
+    partition, query = _key(messages)
+
+    assert query == "How do I reset my password?"
+    assert _key(messages, reasoning_effort="high")[0] != partition
+    assert _key(messages, model_id="gpt-5-mini")[0] != partition
+
+    with_context = [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "hi"}] + messages
+    other_partition, other_query = _key(with_context)
+    assert other_query == query
+    assert other_partition != partition
+
+
+def test_lookup_hits_similar_vector_above_threshold():
+    """A near-identical query vector replays the stored (compacted) chunks."""
+    cache = SemanticCache(max_entries=4, ttl_seconds=60, threshold=0.9)
+    cache.store("p", np.array([1.0, 0.0, 0.0], dtype=np.float32), _chunks("answer"))
+
+    hit = cache.lookup("p", np.array([0.99, 0.05, 0.0], dtype=np.float32))
+    assert hit is not None
+    assert [(c.type, c.content) for c in hit] == [
+        (StreamChunkType.THINKING, "think more"),
+        (StreamChunkType.CONTENT, "answer"),
+    ]
+
+    assert cache.lookup("p", np.array([0.0, 1.0, 0.0], dtype=np.float32)) is None
+    assert cache.lookup("other", np.array([1.0, 0.0, 0.0], dtype=np.float32)) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_expired_entries_are_ignored():
+    """Entries past their TTL never hit."""
+    cache = SemanticCache(max_entries=2, ttl_seconds=-1, threshold=0.5)
+    cache.store("p", np.array([1.0, 0.0], dtype=np.float32), _chunks("stale"))
+    assert cache.lookup("p", np.array([1.0, 0.0], dtype=np.float32)) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    """When full, the least recently used slot is replaced."""
+    cache = SemanticCache(max_entries=2, ttl_seconds=60, threshold=0.99)
+    a = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+    b = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+    c = np.array([0.0, 0.0, 1.0], dtype=np.float32)
+
+    cache.store("p", a, _chunks("a"))
+    cache.store("p", b, _chunks("b"))
+    assert cache.lookup("p", a) is not None  # a is now most recently used
+    cache.store("p", c, _chunks("c"))
+
+    assert cache.lookup("p", a) is not None
+    assert cache.lookup("p", b) is None
+    assert cache.lookup("p", c)[-1].content == "c"
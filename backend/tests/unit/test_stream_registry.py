@@ -0,0 +1,92 @@
+# Unit tests for resumable SSE streams
+import asyncio
+
+import pytest
+
+from app.services.stream_registry import StreamRegistry
+
+
+async def _frames(count, delay=0.0, cancelled=None):
+    try:
+        for i in range(count):
+            if delay:
+                await asyncio.sleep(delay)
+            yield f"data: {i}\n\n".encode()
+    except asyncio.CancelledError:
+        if cancelled is not None:
+            cancelled.set()
+        raise
+
+
+def _ids(blob):
+    return [line.split(b": ", 1)[1].decode() for line in blob.split(b"\n") if line.startswith(b"id: ")]
+
+
+@pytest.mark.asyncio
+async def test_frames_are_tagged_with_event_ids():
+    """Every frame carries an id of the form <stream-id>-<seq>."""
+    registry = StreamRegistry(buffer_frames=16, grace_seconds=1)
+    session = registry.start("s1", _frames(3))
+
+    blob = b"".join([chunk async for chunk in session.subscribe()])
+
+    assert _ids(blob) == [f"{session.stream_id}-{seq}" for seq in (1, 2, 3)]
+    assert blob.count(b"data: ") == 3
+
+
+@pytest.mark.asyncio
+async def test_resume_replays_missed_frames_then_live_tail():
+    """A reconnect with Last-Event-ID continues where the client left off."""
+    registry = StreamRegistry(buffer_frames=16, grace_seconds=5)
+    session = registry.start("s1", _frames(6, delay=0.01))
+
+    reader = session.subscribe()
+    first = await reader.__anext__()
+    last_id = _ids(first)[-1]
+    await reader.aclose()  # client drops the connection
+
+    await asyncio.sleep(0.03)  # generation keeps running meanwhile
+    resumed, seq = registry.resume("s1", last_id)
+    assert resumed is session
+
+    rest = b"".join([chunk async for chunk in resumed.subscribe(after_seq=seq)])
+    seqs = [int(event_id.rsplit("-", 1)[1]) for event_id in _ids(rest)]
+    assert seqs == list(range(seq + 1, 7))
+
+
+@pytest.mark.asyncio
+async def test_ids_from_another_stream_do_not_resume():
+    """An event id from an earlier turn is not a position in the current stream."""
+    registry = StreamRegistry(buffer_frames=16, grace_seconds=1)
+    registry.start("s1", _frames(1))
+
+    assert registry.resume("s1", "someotherid-3") is None
+    assert registry.resume("unknown", "x-1") is None
+
+
+@pytest.mark.asyncio
+async def test_generation_cancelled_when_no_reader_returns():
+    """Without a reconnect inside the grace period the generation is cancelled."""
+    registry = StreamRegistry(buffer_frames=16, grace_seconds=0.02)
+    cancelled = asyncio.Event()
+    session = registry.start("s1", _frames(1000, delay=0.01, cancelled=cancelled))
+
+    reader = session.subscribe()
+    await reader.__anext__()
+    await reader.aclose()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert registry.resume("s1", f"{session.stream_id}-1") is None
+
+
+@pytest.mark.asyncio
+async def test_resume_past_evicted_frames_reports_gap():
+    """A reader too far behind the ring buffer gets an error instead of a silent gap."""
+    registry = StreamRegistry(buffer_frames=2, grace_seconds=1)
+    session = registry.start("s1", _frames(5))
+    await session.task
+
+    blob = b"".join([chunk async for chunk in session.subscribe(after_seq=1)])
+
+    assert b'"type":"error"' in blob
+    assert b"ResumeGap" in blob
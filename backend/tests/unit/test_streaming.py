@@ -0,0 +1,163 @@
+# Unit tests for SSE streaming helpers
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.models.schemas import StreamChunk, StreamChunkType
+from app.utils.streaming import FastChunk, coalesce_chunks, encode_sse
+
+
+def _chunk(type_, content="", metadata=None):
+    return StreamChunk(type=type_, content=content, metadata=metadata)
+
+
+async def _source(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def _collect(agen):
+    return [(c.type, c.content) for c in [chunk async for chunk in agen]]
+
+
+@pytest.mark.asyncio
+async def test_merges_same_type_and_flushes_on_type_change():
+    """Consecutive deltas merge; a type change or metadata chunk flushes."""
+    items = [
+        _chunk(StreamChunkType.THINKING, "a"),
+        _chunk(StreamChunkType.THINKING, "b"),
+        _chunk(StreamChunkType.THINKING, "[Tool call] x()", {"tool_name": "x"}),
+        _chunk(StreamChunkType.CONTENT, "c"),
+        _chunk(StreamChunkType.CONTENT, "d"),
+        _chunk(StreamChunkType.THINKING, "e"),
+    ]
+    result = await _collect(coalesce_chunks(_source(items), max_bytes=1024, window_ms=1000))
+
+    assert result == [
+        (StreamChunkType.THINKING, "ab"),
+        (StreamChunkType.THINKING, "[Tool call] x()"),
+        (StreamChunkType.CONTENT, "cd"),
+        (StreamChunkType.THINKING, "e"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_flushes_at_byte_threshold():
+    """A run is emitted once it reaches max_bytes."""
+    items = [_chunk(StreamChunkType.CONTENT, "xx") for _ in range(5)]
+    result = await _collect(coalesce_chunks(_source(items), max_bytes=4, window_ms=1000))
+    assert [content for _, content in result] == ["xxxx", "xxxx", "xx"]
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_window_expires_during_stall():
+    """Buffered text is not held back while the source is stalled."""
+    received = []
+
+    async def stalled():
+        yield _chunk(StreamChunkType.CONTENT, "early")
+        await asyncio.sleep(0.2)
+        yield _chunk(StreamChunkType.CONTENT, "late")
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    async for chunk in coalesce_chunks(stalled(), max_bytes=1024, window_ms=10):
+        received.append((chunk.content, loop.time() - start))
+
+    assert [content for content, _ in received] == ["early", "late"]
+    assert received[0][1] < 0.15
+
+
+@pytest.mark.asyncio
+async def test_zero_window_passes_chunks_through():
+    """Coalescing can be disabled."""
+    items = [_chunk(StreamChunkType.CONTENT, "a"), _chunk(StreamChunkType.CONTENT, "b")]
+    result = await _collect(coalesce_chunks(_source(items), window_ms=0))
+    assert [content for _, content in result] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_source_errors_propagate():
+    """Exceptions raised by the source surface to the consumer."""
+    async def failing():
+        yield _chunk(StreamChunkType.CONTENT, "partial")
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await _collect(coalesce_chunks(failing(), window_ms=10))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("window_ms", [0, 10])
+async def test_closing_consumer_cancels_source(window_ms):
+    """Abandoning the coalesced stream tears down the upstream generator."""
+    finalized = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield _chunk(StreamChunkType.CONTENT, "x")
+                await asyncio.sleep(0.01)
+        finally:
+            finalized.set()
+
+    chunks = coalesce_chunks(endless(), window_ms=window_ms)
+    await chunks.__anext__()
+    await chunks.aclose()
+
+    assert finalized.is_set()
+
+
+@pytest.mark.asyncio
+async def test_closing_consumer_closes_source_blocked_on_full_queue():
+    """Upstream cleanup finishes before aclose() returns, even with a full queue."""
+    finalized = asyncio.Event()
+    produced = 0
+
+    async def fast():
+        nonlocal produced
+        try:
+            while True:
+                produced += 1
+                yield _chunk(StreamChunkType.CONTENT, "x", {"seq": produced})
+        finally:
+            finalized.set()
+
+    chunks = coalesce_chunks(fast(), window_ms=10, queue_size=1)
+    await chunks.__anext__()
+    # The consumer stops reading; let the producer block on queue.put
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert produced <= 3
+
+    await chunks.aclose()
+    assert finalized.is_set()
+
+
+@pytest.mark.asyncio
+async def test_byte_threshold_counts_encoded_bytes():
+    """Multi-byte text is flushed by its UTF-8 size, not its length."""
+    items = [_chunk(StreamChunkType.CONTENT, "\u4f60\u597d") for _ in range(3)]
+    result = await _collect(coalesce_chunks(_source(items), max_bytes=6, window_ms=1000))
+    assert [content for _, content in result] == ["\u4f60\u597d"] * 3
+
+
+@pytest.mark.parametrize("chunk", [
+    StreamChunk(type=StreamChunkType.CONTENT, content="plain"),
+    StreamChunk(type=StreamChunkType.THINKING, content='quotes " and \\ backslash\nnewline\ttab'),
+    StreamChunk(type=StreamChunkType.CONTENT, content="unicode: café ✓ 日本語 \u2028"),
+    StreamChunk(type=StreamChunkType.THINKING, content="[Tool call] x()", metadata={"tool_name": "x", "n": 1}),
+    StreamChunk(type=StreamChunkType.DONE, content="", metadata={"nested": {"a": [1, 2.5, None, True]}}),
+    StreamChunk(type=StreamChunkType.ERROR, content="boom", metadata={"at": datetime(2026, 1, 2, 3, 4, 5)}),
+])
+def test_encode_sse_matches_pydantic_serialization(chunk):
+    """The fast encoder produces exactly what model_dump_json() would."""
+    expected = f"data: {chunk.model_dump_json()}\n\n".encode("utf-8")
+    assert encode_sse(chunk) == expected
+
+    fast = FastChunk(chunk.type, chunk.content, chunk.metadata)
+    assert encode_sse(fast) == expected
+    assert fast.to_model() == chunk
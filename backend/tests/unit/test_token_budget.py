@@ -0,0 +1,113 @@
+# Unit tests for per-user and per-tenant token budgets
+from datetime import date
+
+import pytest
+
+from app.services.token_budget import TokenBudgetExceeded, TokenBudgetService, period_end
+
+
+class FakeLedger:
+    """In-memory stand-in for TokenUsageRepository."""
+
+    def __init__(self, fail=False):
+        self.rows = {}
+        self.batches = []
+        self.fail = fail
+
+    async def add_usage(self, deltas):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append(dict(deltas))
+        for key, (input_tokens, output_tokens) in deltas.items():
+            used_input, used_output = self.rows.get(key, (0, 0))
+            self.rows[key] = (used_input + input_tokens, used_output + output_tokens)
+        return {key: self.rows[key] for key in deltas}
+
+    async def get_usage(self, keys):
+        return {key: self.rows.get(key, (0, 0)) for key in keys}
+
+
+@pytest.mark.asyncio
+async def test_budget_rejects_once_spent():
+    """A user over the daily output limit is rejected; other users are not."""
+    budget = TokenBudgetService(limits={("user", "day"): (0, 100)})
+
+    await budget.check("alice")
+    budget.charge("alice", None, input_tokens=500, output_tokens=100)
+
+    with pytest.raises(TokenBudgetExceeded) as exc_info:
+        await budget.check("alice")
+    assert (exc_info.value.scope, exc_info.value.period, exc_info.value.kind) == ("user", "day", "output")
+    assert exc_info.value.retry_after_seconds >= 1
+    await budget.check("bob")
+
+
+@pytest.mark.asyncio
+async def test_tenant_budget_is_shared_by_its_users():
+    budget = TokenBudgetService(limits={("tenant", "month"): (1000, 0)})
+
+    budget.charge("alice", "contoso", input_tokens=600, output_tokens=0)
+    budget.charge("bob", "contoso", input_tokens=400, output_tokens=0)
+
+    with pytest.raises(TokenBudgetExceeded):
+        await budget.check("carol", "contoso")
+    await budget.check("dave", "fabrikam")
+
+
+@pytest.mark.asyncio
+async def test_charges_are_flushed_in_one_batch():
+    """Many charges become one upsert per ledger row, and other pods' usage is picked up."""
+    ledger = FakeLedger()
+    budget = TokenBudgetService(limits={("user", "day"): (0, 1000)}, ledger=ledger)
+
+    for _ in range(10):
+        budget.charge("alice", None, input_tokens=10, output_tokens=20)
+    assert ledger.batches == []
+
+    await budget.flush()
+    assert len(ledger.batches) == 1
+    (key, delta), = ledger.batches[0].items()
+    assert delta == (100, 200)
+
+    # Another pod charged alice meanwhile; the next flush returns the total
+    ledger.rows[key] = (ledger.rows[key][0], ledger.rows[key][1] + 750)
+    budget.charge("alice", None, input_tokens=0, output_tokens=50)
+    await budget.flush()
+
+    with pytest.raises(TokenBudgetExceeded):
+        await budget.check("alice")
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_usage_pending():
+    ledger = FakeLedger(fail=True)
+    budget = TokenBudgetService(limits={("user", "day"): (0, 100)}, ledger=ledger)
+
+    budget.charge("alice", None, input_tokens=0, output_tokens=60)
+    await budget.flush()
+    budget.charge("alice", None, input_tokens=0, output_tokens=60)
+
+    with pytest.raises(TokenBudgetExceeded):
+        await budget.check("alice")
+
+    ledger.fail = False
+    await budget.flush()
+    (delta,) = ledger.batches[0].values()
+    assert delta == (0, 120)
+
+
+@pytest.mark.asyncio
+async def test_remaining_reports_each_budget():
+    budget = TokenBudgetService(limits={("user", "day"): (1000, 0), ("tenant", "month"): (0, 500)})
+    budget.charge("alice", "contoso", input_tokens=250, output_tokens=100)
+
+    budgets = {(b["scope"], b["period"]): b for b in await budget.remaining("alice", "contoso")}
+    assert set(budgets) == {("user", "day"), ("tenant", "month")}
+    assert budgets[("user", "day")]["input_remaining"] == 750
+    assert budgets[("user", "day")]["output_limit"] is None
+    assert budgets[("tenant", "month")]["output_remaining"] == 400
+
+
+def test_period_end_rolls_over_month():
+    assert period_end("month", date(2026, 12, 1)) == date(2027, 1, 1)
+    assert period_end("day", date(2026, 2, 28)) == date(2026, 3, 1)
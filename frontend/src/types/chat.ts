@@ -11,6 +11,7 @@ export enum StreamChunkType {
   CONTENT = 'content',
   DONE = 'done',
   ERROR = 'error',
+  QUEUED = 'queued',
 }
 
 export interface ThinkingStep {